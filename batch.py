@@ -0,0 +1,207 @@
+import evaluation
+from checkers import EMPTY, BLACK_PAWN, WHITE_PAWN, BLACK_KING, WHITE_KING
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only this module needs it
+    np = None
+"""
+This file implements a batch version of gameai.heuristics() with NumPy.
+Many positions are stacked in one int8 array of shape (batch, N, N), where
+every cell holds the code of its piece, as a checkers.Board keeps it:
+
+    0: empty          1: black pawn     2: white pawn
+    3: black king     4: white king
+
+and heuristics() scores all of them in one vectorized pass, using per-square
+tables for the king distances and the safe distances. The capture term
+follows all the capture chains of all the positions at once, one jump
+deeper per step.
+
+The tree search uses it to score the children of its frontier nodes (the
+nodes one move away from the depth limit) in bulk, and it is meant for the
+offline evaluation of large sets of stored positions as well.
+"""
+
+# the diagonal directions: bottom-left, bottom-right, top-left, top-right
+_DIRECTIONS = ((+1, -1), (+1, +1), (-1, -1), (-1, +1))
+
+_tables = {}
+
+def available():
+    """
+    Returns True if NumPy can be imported.
+    """
+    return np is not None
+
+def get_tables(length):
+    """
+    Returns the (cached) per-square weight tables of a board length: the
+    safe distances and the distances of the black and the white pawns to
+    their king rows, as used by gameai.heuristics().
+    """
+    tables = _tables.get(length)
+    if tables is None:
+        rows = np.arange(length).reshape(length, 1).repeat(length, 1)
+        tables = (np.array(evaluation.get_distances(length), dtype = np.int64),
+                  rows + 1, length - (rows + 1))
+        _tables[length] = tables
+    return tables
+
+def encode(board):
+    """
+    Returns the given board as a (N, N) int8 array of piece codes.
+    """
+    length = board.get_length()
+    position = np.zeros((length, length), dtype = np.int8)
+    for (row, col, piece) in board.get_pieces():
+        position[row, col] = piece.code()
+    return position
+
+def stack(boards):
+    """
+    Returns the given boards as a (batch, N, N) int8 array of piece codes.
+    """
+    return np.stack([encode(board) for board in boards])
+
+def children(position, undos):
+    """
+    Returns the positions reached from the given (N, N) position by each of
+    the moves given by their undo tokens (see checkers.Board.make_move) as
+    a (len(undos), N, N) array. The moves are applied to copies of the
+    array, the board itself is not used.
+    """
+    result = np.repeat(position[np.newaxis], len(undos), axis = 0)
+    for (i, (frm, to, piece, promoted, captured)) in enumerate(undos):
+        king = (piece.is_king() and not promoted) or promoted
+        result[i, frm[0], frm[1]] = EMPTY
+        result[i, to[0], to[1]] = \
+            (BLACK_PAWN if piece.is_black() else WHITE_PAWN) \
+                + (2 if king else 0)
+        for (row, col, capture) in captured:
+            result[i, row, col] = EMPTY
+    return result
+
+def captures(positions):
+    """
+    Returns two arrays (bc, wc) with the capture terms of the black and the
+    white pieces of every position, i.e. the total length of all the capture
+    paths of the pieces of that color, as tools.get_captures() finds them.
+    All the paths of all the positions grow together, one jump per step.
+    """
+    (batch, length) = positions.shape[0], positions.shape[1]
+    flat = positions.reshape(batch, length * length)
+    bc = np.zeros(batch, dtype = np.int64)
+    wc = np.zeros(batch, dtype = np.int64)
+    if length * length > 64:
+        # the jumped pieces do not fit in a 64 bit mask, search one by one
+        for b in range(batch):
+            for square in np.nonzero(flat[b])[0]:
+                value = _capture_value(flat[b], length, int(square))
+                if flat[b, square] in (BLACK_PAWN, BLACK_KING):
+                    bc[b] += value
+                else:
+                    wc[b] += value
+        return (bc, wc)
+    (b, cur) = np.nonzero(flat)
+    code = flat[b, cur]
+    black = (code == BLACK_PAWN) | (code == BLACK_KING)
+    king = code >= BLACK_KING
+    origin = cur.copy()
+    captured = np.zeros(len(b), dtype = np.uint64)
+    n = np.ones(len(b), dtype = np.int64)
+    while len(b):
+        (r, c) = (cur // length, cur % length)
+        extended = np.zeros(len(b), dtype = bool)
+        grown = []
+        for (x, y) in _DIRECTIONS:
+            (r2, c2) = (r + 2 * x, c + 2 * y)
+            ok = (king | (black if x > 0 else ~black)) \
+                    & (r2 >= 0) & (r2 < length) & (c2 >= 0) & (c2 < length)
+            mid = np.where(ok, (r + x) * length + (c + y), 0)
+            land = np.where(ok, r2 * length + c2, 0)
+            other = flat[b, mid]
+            ok &= (other != EMPTY) & \
+                    (((other == BLACK_PAWN) | (other == BLACK_KING)) != black)
+            ok &= ((captured >> mid.astype(np.uint64)) & np.uint64(1)) == 0
+            ok &= (flat[b, land] == EMPTY) | (land == origin) \
+                    | (((captured >> land.astype(np.uint64)) \
+                        & np.uint64(1)) == 1)
+            extended |= ok
+            grown.append((b[ok], land[ok], \
+                          king[ok] | np.where(black[ok], \
+                                              r2[ok] == length - 1, \
+                                              r2[ok] == 0), \
+                          black[ok], \
+                          captured[ok] | (np.uint64(1) \
+                                          << mid[ok].astype(np.uint64)), \
+                          origin[ok], n[ok] + 1))
+        done = ~extended & (n > 1)
+        np.add.at(bc, b[done & black], n[done & black])
+        np.add.at(wc, b[done & ~black], n[done & ~black])
+        (b, cur, king, black, captured, origin, n) = \
+            [np.concatenate(v) for v in zip(*grown)]
+    return (bc, wc)
+
+def _capture_value(cells, length, square):
+    """
+    Returns the capture term of one piece of a flat position, see
+    evaluation.capture_value().
+    """
+    is_black = cells[square] in (BLACK_PAWN, BLACK_KING)
+    last = length - 1 if is_black else 0
+    total = 0
+    stack = [(square // length, square % length, \
+              cells[square] >= BLACK_KING, frozenset(), 1)]
+    while stack:
+        (r, c, is_king, captured, n) = stack.pop()
+        extended = False
+        for (x, y) in _DIRECTIONS:
+            if not is_king and (x > 0) != is_black:
+                continue
+            (r2, c2) = (r + 2 * x, c + 2 * y)
+            if not (0 <= r2 < length and 0 <= c2 < length):
+                continue
+            mid = (r + x) * length + (c + y)
+            land = r2 * length + c2
+            other = cells[mid]
+            if mid in captured or other == EMPTY \
+                    or (other in (BLACK_PAWN, BLACK_KING)) == is_black:
+                continue
+            if cells[land] != EMPTY and land != square \
+                    and land not in captured:
+                continue
+            extended = True
+            stack.append((r2, c2, is_king or r2 == last, \
+                          captured | {mid}, n + 1))
+        if not extended and n > 1:
+            total += n
+    return total
+
+def heuristics(positions, turns):
+    """
+    Returns the heuristics of every position of a (batch, N, N) array as a
+    float array, each one from the point of view of its color in turns,
+    which is either one color for all, or a sequence of colors.
+    """
+    if np is None:
+        raise ImportError("The batch evaluation needs NumPy.")
+    positions = np.asarray(positions, dtype = np.int8)
+    (distance, black_row, white_row) = get_tables(positions.shape[1])
+    bpawn = positions == BLACK_PAWN
+    wpawn = positions == WHITE_PAWN
+    bp = bpawn.sum(axis = (1, 2))
+    wp = wpawn.sum(axis = (1, 2))
+    bk = (positions == BLACK_KING).sum(axis = (1, 2))
+    wk = (positions == WHITE_KING).sum(axis = (1, 2))
+    bkd = (bpawn * black_row).sum(axis = (1, 2))
+    wkd = (wpawn * white_row).sum(axis = (1, 2))
+    bsd = (bpawn * distance).sum(axis = (1, 2)).astype(np.float64)
+    wsd = (wpawn * distance).sum(axis = (1, 2)).astype(np.float64)
+    (bc, wc) = captures(positions)
+    black = evaluation.weigh('black', bp, wp, bk, wk, bc, wc, \
+                             bkd, wkd, bsd, wsd)
+    white = evaluation.weigh('white', bp, wp, bk, wk, bc, wc, \
+                             bkd, wkd, bsd, wsd)
+    if isinstance(turns, str):
+        return black if turns == 'black' else white
+    return np.where(np.asarray(turns) == 'black', black, white)
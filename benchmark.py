@@ -0,0 +1,165 @@
+import json
+import time
+import argparse
+import platform
+import main
+import gameai as ai
+import transposition
+import selfplay
+import searchstats
+from checkers import Board, Piece
+"""
+This file implements a benchmark of the tree search: a fixed set of test
+positions is searched by every engine configuration to fixed depths, and
+the wall time, the number of nodes, the effective branching factor and the
+best move of every search are reported as JSON, so the results of two
+versions of the engine can be compared. A move is written like in the
+records of selfplay.py, e.g. "c2-d3" or "e5xc3xa5".
+
+The engine configurations are:
+
+    minimax:    minimax_search()
+    alphabeta:  alphabeta_search() without any table or move ordering
+    table:      alphabeta_search() with a transposition table
+    deepening:  iterative_deepening() to the depth, with a transposition
+                table, the move orderer and the incremental evaluator,
+                i.e. the search of get_next_move()
+
+The effective branching factor is nodes ** (1 / depth), so it is only
+comparable between searches of the same depth.
+
+Run "python benchmark.py --depths 2,4,6 --out bench.json" to benchmark all
+the configurations (minimax only up to depth 4 by default).
+"""
+
+# The test positions: either the moves played from the starting position,
+# or the squares of every kind of piece ('b', 'w' for the pawns and 'B',
+# 'W' for the kings) with the color to move.
+POSITIONS = [
+    {'name': 'opening', 'moves': []},
+    {'name': 'midgame', 'moves': ['c2-d3', 'f5-e6', 'b3-c2', 'f3-e4', \
+                                  'd3xf5', 'g6xe4', 'c2-d1', 'g4-f5', \
+                                  'b1-c2', 'g2-f3', 'a2-b1', 'f7-e8', \
+                                  'c4-d3', 'h1-g2', 'b5-c4', 'g8-f7']},
+    # white must choose between a single and a double jump
+    {'name': 'tactical', 'moves': ['c2-d3', 'f3-e4', 'b1-c2', 'g2-f3', \
+                                   'a2-b1', 'h1-g2', 'c4-d5', 'f5-e6', \
+                                   'd3xf5']},
+    {'name': 'endgame', 'pieces': {'b': ['c4'], 'B': ['e6'], \
+                                   'w': ['f5', 'g8'], 'W': ['d3']}, \
+     'turn': 'black'},
+]
+
+CONFIGS = ('minimax', 'alphabeta', 'table', 'deepening')
+
+def make_position(position, length = 8):
+    """
+    Returns the tuple (board, turn) of a test position.
+    """
+    board = Board(length)
+    if 'pieces' in position:
+        for (symbol, squares) in position['pieces'].items():
+            piece = Piece('black' if symbol in 'bB' else 'white', \
+                          symbol.isupper())
+            for square in squares:
+                (row, col) = main.indexify(square)
+                board.place(row, col, piece)
+        return (board, position['turn'])
+    main.initialize(board)
+    turn = 'black'
+    for move in position['moves']:
+        if 'x' in move:
+            main.apply_capture(board, move.split('x'))
+        else:
+            main.apply_move(board, tuple(move.split('-')))
+        turn = 'white' if turn == 'black' else 'black'
+    return (board, turn)
+
+def search(config, board, turn, depth):
+    """
+    Searches the position with the given configuration to the given depth,
+    and returns the tuple (move, score, nodes).
+    """
+    state = (board, turn, 0)
+    if config == 'deepening':
+        stats = searchstats.SearchStats()
+        (move, score) = ai.iterative_deepening(state, maxdepth = depth, \
+                            table = transposition.TranspositionTable(), \
+                            stats = stats)
+        return (move, score, stats.nodes)
+    if config == 'minimax':
+        context = ai.SearchContext()
+        (move, score) = ai.minimax_search(state, depth, context)
+    elif config == 'alphabeta':
+        context = ai.SearchContext()
+        (move, score) = ai.alphabeta_search(state, depth, context = context)
+    elif config == 'table':
+        context = ai.SearchContext(transposition.TranspositionTable())
+        (move, score) = ai.alphabeta_search(state, depth, context = context)
+    else:
+        raise ValueError("Unknown engine configuration: " + str(config))
+    return (move, score, context.nodes)
+
+def run(configs = CONFIGS, depths = (2, 4, 6), minimax_depth = 4, \
+        positions = POSITIONS, repeat = 1):
+    """
+    Runs every configuration on every position to every depth (minimax
+    only up to minimax_depth) and returns the list of the results, each one
+    a dictionary. The time is the best of the given number of runs.
+    """
+    results = []
+    for position in positions:
+        for config in configs:
+            for depth in depths:
+                if config == 'minimax' and depth > minimax_depth:
+                    continue
+                best = None
+                for i in range(repeat):
+                    (board, turn) = make_position(position)
+                    start = time.perf_counter()
+                    (move, score, nodes) = search(config, board, turn, depth)
+                    seconds = time.perf_counter() - start
+                    if best is None or seconds < best:
+                        best = seconds
+                length = board.get_length()
+                results.append({
+                    'position': position['name'], 'config': config, \
+                    'depth': depth, 'seconds': round(best, 6), \
+                    'nodes': nodes, \
+                    'nodes_per_second': round(nodes / best, 1) \
+                                            if best > 0 else None, \
+                    'branching': round(nodes ** (1.0 / depth), 3) \
+                                     if nodes else None, \
+                    'move': selfplay.write_move(move, length) \
+                                if move != 'pass' else move, \
+                    'score': score})
+    return results
+
+def _main():
+    parser = argparse.ArgumentParser(description = "Benchmarks the tree" \
+                                     + " search on fixed test positions.")
+    parser.add_argument('--configs', default = ','.join(CONFIGS))
+    parser.add_argument('--depths', default = '2,4,6')
+    parser.add_argument('--minimax-depth', type = int, default = 4)
+    parser.add_argument('--repeat', type = int, default = 1)
+    parser.add_argument('--out', default = '-', \
+                        help = "the JSON file of the results, - for stdout")
+    args = parser.parse_args()
+    configs = [c.strip() for c in args.configs.split(',')]
+    for config in configs:
+        if config not in CONFIGS:
+            parser.error("unknown configuration: " + config)
+    depths = [int(d) for d in args.depths.split(',')]
+    report = {'python': platform.python_version(), \
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'), \
+              'results': run(configs, depths, args.minimax_depth, \
+                             repeat = args.repeat)}
+    text = json.dumps(report, indent = 1)
+    if args.out == '-':
+        print(text)
+    else:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+
+if __name__ == '__main__':
+    _main()
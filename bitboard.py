@@ -0,0 +1,409 @@
+import main
+import movegen
+from checkers import Board
+from checkers import PIECES, EMPTY, BLACK_PAWN, WHITE_PAWN
+"""
+This file implements a bitboard backed checkers board. Instead of a list of
+lists of piece codes, the BitBoard keeps three integers: the occupancy of
+the black pieces, the occupancy of the white pieces and the set of kings.
+Only the playable (dark) squares are stored, i.e. the squares (row, col)
+where row + col is odd, which are the squares used by main.initialize().
+
+The dark squares are laid out row by row, half a row per N bits, and one
+unused "ghost" bit is inserted after every even row. With this layout all
+four diagonal steps are plain shifts by the same amount for every square:
+
+    down-left:  << half         down-right: << half + 1
+    up-left:    >> half + 1     up-right:   >> half
+
+and a step that would leave the board from an edge column always lands on
+a ghost bit, which is masked away. That lets us generate the moves and the
+jumps of a whole side with a couple of shift-and-mask operations.
+
+The bitboard speeds up the move generation (see perft.py), not the tree
+search of gameai, whose time goes to the evaluation of the positions, which
+reads the pieces square by square; so the engine keeps the list board.
+"""
+
+# The diagonal directions, in the same order as tools.get_moves() and
+# tools.get_jumps() visit them: bottom-left, bottom-right, top-left, top-right.
+DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT = 0, 1, 2, 3
+
+_layouts = {}
+
+def get_layout(length):
+    """
+    Returns the (cached) bit layout of a board of the given length. The
+    layout is a dictionary holding the bit index of every dark square, the
+    reverse mapping, the square index (row * length + col, as used by the
+    packed moves of movegen) and the string position of every bit, the shift
+    for every direction, the mask of all valid bits and the masks of the two
+    king rows.
+    """
+    layout = _layouts.get(length)
+    if layout is None:
+        half = length // 2
+        bit_of = [[None for c in range(length)] for r in range(length)]
+        square_of = {}
+        index_of = {}
+        name_of = {}
+        mask = 0
+        for r in range(length):
+            for c in range(1 if r % 2 == 0 else 0, length, 2):
+                bit = r * half + c // 2 + r // 2
+                bit_of[r][c] = bit
+                square_of[bit] = (r, c)
+                index_of[bit] = r * length + c
+                name_of[bit] = main.deindexify(r, c)
+                mask |= 1 << bit
+        bottom = sum([1 << bit_of[length - 1][c] \
+                      for c in range(0, length, 2)])
+        top = sum([1 << bit_of[0][c] for c in range(1, length, 2)])
+        layout = {
+            'bit_of': bit_of,
+            'square_of': square_of,
+            'index_of': index_of,
+            'name_of': name_of,
+            'mask': mask,
+            'shifts': (half, half + 1, -(half + 1), -half),
+            'black_king_row': bottom,
+            'white_king_row': top,
+        }
+        _layouts[length] = layout
+    return layout
+
+def shift(bits, amount):
+    """
+    Shifts the given bits to the left for a positive amount and to the right
+    for a negative amount.
+    """
+    return bits << amount if amount > 0 else bits >> -amount
+
+def iter_bits(bits):
+    """
+    Yields the indices of the set bits, from the lowest to the highest.
+    """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def directions(is_black, is_king):
+    """
+    Returns the directions a piece may move to. Black pawns move downwards,
+    white pawns move upwards and kings move both ways.
+    """
+    if is_king:
+        return (DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT)
+    return (DOWN_LEFT, DOWN_RIGHT) if is_black else (UP_LEFT, UP_RIGHT)
+
+class BitBoard(Board):
+    """
+    This class encapsulates a bitboard backed Board. It offers the same
+    interface as checkers.Board (get, place, remove, is_free, display etc.),
+    so it can be used everywhere a Board is used, but it only stores the
+    playable dark squares. Placing a piece on a light square is an error.
+
+    On top of the Board interface, a BitBoard generates the moves and the
+    captures of a whole side at once with get_hints(), which returns exactly
+    what main.get_hints() returns for a checkers.Board in the same position.
+    """
+
+    def __init__(self, length = 8):
+        """
+        The default size of the board is 8x8. Since only the dark squares are
+        stored, the length of a bit board must be an even number.
+        """
+        if length > 1 and length % 2 == 0:
+            self._length = length
+            self._layout = get_layout(length)
+            self._black = 0  # occupancy of the black pieces
+            self._white = 0  # occupancy of the white pieces
+            self._kings = 0  # the kings of both colors
+        else:
+            raise ValueError("The length of a bit board must be an even" \
+                             + " number, at least 2.")
+
+    def get_cells(self):
+        """
+        Returns the cells in the board, built as a NxN list of lists of piece
+        codes.
+        """
+        return [[self.get_code(r, c) for c in range(self._length)] \
+                    for r in range(self._length)]
+
+    def get_masks(self):
+        """
+        Returns the black, white and king occupancy as a tuple of integers.
+        """
+        return (self._black, self._white, self._kings)
+
+    def is_free(self, row, col):
+        """
+        Returns True if the given position (i.e. tuple) is free.
+        """
+        bit = self._layout['bit_of'][row][col]
+        return bit is None or not ((self._black | self._white) >> bit) & 1
+
+    def place(self, row, col, piece):
+        """
+        Places a piece at the position given by the row-column index.
+        Placing None clears the position.
+        """
+        bit = self._layout['bit_of'][row][col]
+        if bit is None:
+            raise ValueError("A piece can only be placed on a dark square.")
+        self.remove(row, col)
+        if piece is not None:
+            if piece.is_black():
+                self._black |= 1 << bit
+            else:
+                self._white |= 1 << bit
+            if piece.is_king():
+                self._kings |= 1 << bit
+
+    def get(self, row, col):
+        """
+        Gets the piece located at the position indexed by the row-column value.
+        """
+        return PIECES[self.get_code(row, col)]
+
+    def get_code(self, row, col):
+        """
+        Gets the code of the piece located at the position indexed by the
+        row-column value (EMPTY if there is none).
+        """
+        bit = self._layout['bit_of'][row][col]
+        if bit is None:
+            return EMPTY
+        king = 2 if (self._kings >> bit) & 1 else 0
+        if (self._black >> bit) & 1:
+            return BLACK_PAWN + king
+        if (self._white >> bit) & 1:
+            return WHITE_PAWN + king
+        return EMPTY
+
+    def remove(self, row, col):
+        """
+        Removes a piece from the position given by the row-column index.
+        """
+        bit = self._layout['bit_of'][row][col]
+        if bit is not None:
+            clear = ~(1 << bit)
+            self._black &= clear
+            self._white &= clear
+            self._kings &= clear
+
+    def get_squares(self, color = None):
+        """
+        Returns the occupied squares as a bit mask of square indices (bit
+        row * length + col, not the bit layout of the board), only the
+        squares of the given color if there is one.
+        """
+        if color is None:
+            bits = self._black | self._white
+        else:
+            bits = self._black if color == 'black' else self._white
+        index_of = self._layout['index_of']
+        squares = 0
+        for bit in iter_bits(bits):
+            squares |= 1 << index_of[bit]
+        return squares
+
+    def get_pieces(self, color = None):
+        """
+        Returns the pieces on the board as a list of (row, col, piece) tuples,
+        row by row, only the pieces of the given color if there is one.
+        """
+        if color is None:
+            bits = self._black | self._white
+        else:
+            bits = self._black if color == 'black' else self._white
+        square_of = self._layout['square_of']
+        pieces = []
+        for bit in iter_bits(bits):
+            (row, col) = square_of[bit]
+            code = (BLACK_PAWN if (self._black >> bit) & 1 else WHITE_PAWN) \
+                        + (2 if (self._kings >> bit) & 1 else 0)
+            pieces.append((row, col, PIECES[code]))
+        return pieces
+
+    def get_counts(self):
+        """
+        Returns the number of pieces of every code as a tuple indexed by the
+        codes, where the EMPTY item is the number of free playable squares.
+        """
+        black = self._black & ~self._kings
+        white = self._white & ~self._kings
+        free = self._layout['mask'] & ~(self._black | self._white)
+        return tuple(bin(bits).count('1') for bits in \
+                     (free, black, white, self._black & self._kings, \
+                      self._white & self._kings))
+
+    def is_empty(self):
+        """
+        Returns True if the whole board is empty.
+        """
+        return not (self._black | self._white)
+
+    def is_full(self):
+        """
+        Returns True if all the playable squares are filled up.
+        """
+        return (self._black | self._white) == self._layout['mask']
+
+    def get_moves(self, color):
+        """
+        Returns all the simple moves of the given color as a list of bit index
+        tuples (from, to). The moves are generated for all the pieces at once
+        by shifting the movers towards every direction and masking with the
+        empty squares. The list is ordered like main.get_all_moves() orders
+        its result, i.e. by the position of the piece and then by direction.
+        """
+        layout = self._layout
+        shifts = layout['shifts']
+        own = self._black if color == 'black' else self._white
+        empty = layout['mask'] & ~(self._black | self._white)
+        pawn_dirs = directions(color == 'black', False)
+        found = []
+        for d in (DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT):
+            movers = own if d in pawn_dirs else own & self._kings
+            targets = shift(movers, shifts[d]) & empty
+            for to in iter_bits(targets):
+                found.append((to - shifts[d], d, to))
+        found.sort()
+        return [(frm, to) for (frm, d, to) in found]
+
+    def has_moves(self, color):
+        """
+        Returns True if the given color has any simple move, without listing
+        them.
+        """
+        layout = self._layout
+        shifts = layout['shifts']
+        own = self._black if color == 'black' else self._white
+        empty = layout['mask'] & ~(self._black | self._white)
+        pawn_dirs = directions(color == 'black', False)
+        for d in (DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT):
+            movers = own if d in pawn_dirs else own & self._kings
+            if shift(movers, shifts[d]) & empty:
+                return True
+        return False
+
+    def get_jumpers(self, color):
+        """
+        Returns the bits of all the pieces of the given color which have at
+        least one jump, i.e. the starting squares of all the captures.
+        """
+        layout = self._layout
+        shifts = layout['shifts']
+        own = self._black if color == 'black' else self._white
+        opp = self._white if color == 'black' else self._black
+        empty = layout['mask'] & ~(self._black | self._white)
+        pawn_dirs = directions(color == 'black', False)
+        jumpers = 0
+        for d in (DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT):
+            movers = own if d in pawn_dirs else own & self._kings
+            land = shift(shift(movers, shifts[d]) & opp, shifts[d]) & empty
+            jumpers |= shift(land, -2 * shifts[d])
+        return jumpers
+
+    def get_chains(self, bit, is_sorted = False):
+        """
+        Returns all the capturing paths of the piece located at the given bit
+        as lists of bits. The jumped pieces are taken off the board while the
+        chain goes on, and a pawn reaching its king row continues as a king,
+        just like tools.search_path() does. Returns an empty list if the piece
+        has no jump.
+        The chains are followed with a stack on the occupancy masks, and a
+        path is only built once it is complete, from a chain of (bit,
+        previous) pairs.
+        """
+        layout = self._layout
+        shifts = layout['shifts']
+        name_of = layout['name_of']
+        is_black = bool((self._black >> bit) & 1)
+        king_row = layout['black_king_row'] if is_black \
+                        else layout['white_king_row']
+        # the moving piece leaves its square while it jumps, and every
+        # jumped piece is taken off the board
+        empty = (layout['mask'] & ~(self._black | self._white)) | (1 << bit)
+        opp = self._white if is_black else self._black
+        paths = []
+        stack = [(bit, bool((self._kings >> bit) & 1), opp, empty, \
+                  (bit, None), True)]
+        while stack:
+            (cur, is_king, opp, empty, trail, first) = stack.pop()
+            landings = []
+            for d in directions(is_black, is_king):
+                mid = shift(1 << cur, shifts[d]) & opp
+                if mid and shift(mid, shifts[d]) & empty:
+                    landings.append((cur + 2 * shifts[d], cur + shifts[d]))
+            if first and is_sorted:
+                landings.sort(key = lambda v: name_of[v[0]])
+            if not landings:
+                if not first:
+                    path = []
+                    while trail is not None:
+                        (b, trail) = trail
+                        path.append(b)
+                    paths.append(path[::-1])
+                continue
+            for (to, mid) in reversed(landings):
+                stack.append((to, is_king or bool((king_row >> to) & 1), \
+                              opp & ~(1 << mid), empty | (1 << mid), \
+                              (to, trail), False))
+        return paths
+
+    def get_hints(self, color, is_sorted = False):
+        """
+        Returns a tuple of moves and captures of the given color, in terms of
+        string positions, exactly like main.get_hints() does. If there is any
+        capture, the moves are not generated at all.
+        """
+        name_of = self._layout['name_of']
+        jumpers = self.get_jumpers(color)
+        if jumpers:
+            captures = []
+            for bit in iter_bits(jumpers):
+                for path in self.get_chains(bit, is_sorted):
+                    captures.append([name_of[b] for b in path])
+            return ([], main.sort_captures(captures, is_sorted))
+        moves = [(name_of[frm], name_of[to]) \
+                     for (frm, to) in self.get_moves(color)]
+        if is_sorted:
+            moves.sort()
+        return (moves, [])
+
+    def generate(self, color):
+        """
+        Returns a tuple (moves, captures) of the packed moves of the given
+        color (see movegen), in the same order as get_hints(). The captures
+        which take the same pieces and end on the same square are the same
+        packed move, only the first one is kept.
+        """
+        layout = self._layout
+        index_of = layout['index_of']
+        king_row = layout['black_king_row'] if color == 'black' \
+                        else layout['white_king_row']
+        jumpers = self.get_jumpers(color)
+        if jumpers:
+            captures = []
+            for bit in iter_bits(jumpers):
+                is_king = (self._kings >> bit) & 1
+                for path in self.get_chains(bit):
+                    captured = 0
+                    crowned = False
+                    for (frm, to) in zip(path, path[1:]):
+                        captured |= 1 << index_of[(frm + to) // 2]
+                        if not is_king and (king_row >> to) & 1:
+                            crowned = True
+                    move = movegen.pack(index_of[bit], index_of[path[-1]], \
+                                        captured, crowned)
+                    if move not in captures:
+                        captures.append(move)
+            return ([], captures)
+        return ([movegen.pack(index_of[frm], index_of[to], 0, \
+                              not (self._kings >> frm) & 1 \
+                                  and bool((king_row >> to) & 1)) \
+                     for (frm, to) in self.get_moves(color)], [])
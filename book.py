@@ -0,0 +1,181 @@
+import sys
+import mmap
+import array
+import struct
+import bisect
+import main
+import movegen
+import gameai
+import transposition
+from checkers import Board
+"""
+This file implements an opening book: the best move of every position of
+the first plies of the game, found offline by deep searches and looked up
+by gameai.get_next_move() before any search.
+
+The book is built from the starting position of main.initialize(): every
+position reached by any moves within the given number of plies is searched
+to a fixed depth by gameai.iterative_deepening(), and its best move and
+score are kept. A position reached by different move orders is searched
+once, since the positions are known by their Zobrist keys (see
+transposition.hash_board()), which are the same from one run to another.
+
+The file is a header followed by two sections, both sorted by key:
+
+    header:     b'CKOB', version (uint16), board length (uint16),
+                number of entries (uint32)
+    keys:       the Zobrist key of every position (uint64)
+    records:    the score (float32) and the packed move (see movegen) in
+                (17 + length * length + 7) // 8 bytes, of every position
+
+all little endian. The keys are read once when the book is opened, and a
+lookup is a binary search in them followed by one read of the memory
+mapped record.
+
+Run "python book.py 4 8 opening.book" to build the book of the first 4
+plies searched to depth 8.
+"""
+
+MAGIC = b'CKOB'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHI')
+_SCORE = struct.Struct('<f')
+
+def move_size(length):
+    """
+    Returns the number of bytes of a packed move in the book of a board of
+    the given length.
+    """
+    return (17 + length * length + 7) // 8
+
+def get_positions(plies, length = 8):
+    """
+    Returns the positions reached from the starting position within the
+    given number of plies (not counting the positions where the game is
+    over), as a dictionary key -> (board, turn), each with its own board.
+    """
+    board = Board(length)
+    main.initialize(board)
+    positions = {}
+    level = [(board, 'black')]
+    for ply in range(plies):
+        following = []
+        for (board, turn) in level:
+            key = transposition.hash_board(board, turn)
+            if key in positions:
+                continue
+            (actions, ttype, terminal) = movegen.get_actions(board, turn)
+            if terminal:
+                continue
+            positions[key] = (board, turn)
+            other = 'white' if turn == 'black' else 'black'
+            for a in actions:
+                child = Board(length)
+                for (row, col, piece) in board.get_pieces():
+                    child.place(row, col, piece)
+                child.make_move(a)
+                following.append((child, other))
+        level = following
+    return positions
+
+def build(path, plies = 4, depth = 8, length = 8, verbose = False):
+    """
+    Builds the book of the positions of the first given number of plies,
+    each one searched to the given depth, and writes it to the given file.
+    The searches of each color share one transposition table, like the
+    turns of a game do.
+    """
+    positions = get_positions(plies, length)
+    tables = {'black': transposition.TranspositionTable(), \
+              'white': transposition.TranspositionTable()}
+    entries = []
+    for (i, (key, (board, turn))) in enumerate(sorted(positions.items())):
+        (move, score) = gameai.iterative_deepening((board, turn, 0), \
+                                maxdepth = depth, table = tables[turn])
+        entries.append((key, move, score))
+        if verbose:
+            print("{:d}/{:d}: {:s} {:s} {:.3f}".format(i + 1, \
+                    len(positions), turn, \
+                    str(movegen.to_notation(move, length)), score))
+    size = move_size(length)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, length, len(entries)))
+        keys = array.array('Q', [key for (key, move, score) in entries])
+        if sys.byteorder != 'little':
+            keys.byteswap()
+        f.write(keys.tobytes())
+        for (key, move, score) in entries:
+            f.write(_SCORE.pack(score))
+            f.write(move.to_bytes(size, 'little'))
+
+class OpeningBook(object):
+    """
+    This class encapsulates a book file opened for lookups. It can be used
+    as a context manager, which closes the file at the end.
+    """
+
+    def __init__(self, path):
+        """
+        Opens the book file at the given path.
+        """
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, \
+                              access = mmap.ACCESS_READ)
+        (magic, version, length, count) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Not an opening book file: " + str(path))
+        self._length = length
+        self._keys = array.array('Q')
+        self._keys.frombytes(self._map[_HEADER.size:_HEADER.size + 8 * count])
+        if sys.byteorder != 'little':
+            self._keys.byteswap()
+        self._size = move_size(length)
+        self._records = _HEADER.size + 8 * count
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def probe(self, board, turn):
+        """
+        Returns the tuple (move, score) of the position for the color to
+        move, or None if the position is not in the book. The move is only
+        returned if it is legal on the board, so another position with the
+        same key is never played into.
+        """
+        self.lookups += 1
+        if board.get_length() != self._length:
+            return None
+        key = transposition.hash_board(board, turn)
+        i = bisect.bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+        offset = self._records + i * (_SCORE.size + self._size)
+        score = _SCORE.unpack_from(self._map, offset)[0]
+        start = offset + _SCORE.size
+        move = int.from_bytes(self._map[start:start + self._size], 'little')
+        if not movegen.is_legal(board, turn, move):
+            return None
+        self.hits += 1
+        return (move, score)
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+if __name__ == '__main__':
+    plies = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    path = sys.argv[3] if len(sys.argv) > 3 else 'opening.book'
+    build(path, plies, depth, verbose = True)
@@ -1,3 +1,7 @@
+# The codes of the pieces, as the board cells keep them. The code of a black
+# piece is odd, and the code of a king is at least BLACK_KING.
+EMPTY, BLACK_PAWN, WHITE_PAWN, BLACK_KING, WHITE_KING = 0, 1, 2, 3, 4
+
 class Board(object):
     """
     This class encapsulates a Board object. A board can be of two sizes, small
@@ -35,14 +39,24 @@ class Board(object):
         """
         The default size of the board is 8x8. It allocates the cells according
         to the given length of the board. i.e. It will create a NxN list of
-        lists of None if the provided length is N.
+        lists of EMPTY if the provided length is N. A cell keeps the code of
+        its piece (see the codes above), the Piece objects are only made by
+        get().
+        
+        The board also keeps the occupied squares of each color as a bit mask
+        (bit row * length + col) and the number of pieces of every code, so
+        the whole-board queries only visit the occupied squares.
         """
         if length > 1:
             self._length = length  # the length of the board
             # running a loop to build a 2D list into cell 
             # (i.e. list of lists)
-            self._cell = [[None for c in range(self._length)] \
+            self._cell = [[EMPTY for c in range(self._length)] \
                                 for r in range(self._length)]
+            self._black = 0  # the squares of the black pieces
+            self._white = 0  # the squares of the white pieces
+            # the number of pieces of every code, and of free squares
+            self._counts = [length * length, 0, 0, 0, 0]
         else:
             raise ValueError("The minimum allowed length of a board is 2.")
     
@@ -54,7 +68,7 @@ class Board(object):
     
     def get_cells(self):
         """
-        Returns the cells in the board.
+        Returns the cells in the board, as a NxN list of lists of piece codes.
         """
         return self._cell
     
@@ -62,20 +76,36 @@ class Board(object):
         """
         Resturns True if the given position (i.e. tuple) is free.
         """
-        return self._cell[row][col] is None
+        return self._cell[row][col] == EMPTY
         
     def place(self, row, col, piece):
         """
         Places a piece at the position given by the row-column index.
         This does not check any validity condition.
         """
-        self._cell[row][col] = piece
+        self.remove(row, col)
+        if piece is not None:
+            code = piece.code()
+            self._cell[row][col] = code
+            if code & 1:
+                self._black |= 1 << (row * self._length + col)
+            else:
+                self._white |= 1 << (row * self._length + col)
+            self._counts[EMPTY] -= 1
+            self._counts[code] += 1
         
     def get(self, row, col):
         """
         Gets the piece located at the position indexed by the row-column value.
         Does not check any validity condition.
         """
+        return PIECES[self._cell[row][col]]
+    
+    def get_code(self, row, col):
+        """
+        Gets the code of the piece located at the position indexed by the
+        row-column value (EMPTY if there is none).
+        """
         return self._cell[row][col]
     
     def remove(self, row, col):
@@ -83,27 +113,98 @@ class Board(object):
         Removes a piece from the position given by the row-column index.
         This does not check any validity condition.
         """
-        self._cell[row][col] = None
+        code = self._cell[row][col]
+        if code != EMPTY:
+            self._cell[row][col] = EMPTY
+            clear = ~(1 << (row * self._length + col))
+            self._black &= clear
+            self._white &= clear
+            self._counts[code] -= 1
+            self._counts[EMPTY] += 1
+    
+    def get_squares(self, color = None):
+        """
+        Returns the occupied squares as a bit mask (bit row * length + col),
+        only the squares of the given color if there is one.
+        """
+        if color is None:
+            return self._black | self._white
+        return self._black if color == 'black' else self._white
+    
+    def get_pieces(self, color = None):
+        """
+        Returns the pieces on the board as a list of (row, col, piece) tuples,
+        row by row, only the pieces of the given color if there is one. Only
+        the occupied squares are visited.
+        """
+        squares = self.get_squares(color)
+        pieces = []
+        while squares:
+            low = squares & -squares
+            (row, col) = divmod(low.bit_length() - 1, self._length)
+            pieces.append((row, col, PIECES[self._cell[row][col]]))
+            squares ^= low
+        return pieces
+    
+    def get_counts(self):
+        """
+        Returns the number of pieces of every code as a tuple indexed by the
+        codes, where the EMPTY item is the number of free squares.
+        """
+        return tuple(self._counts)
         
+    def make_move(self, move):
+        """
+        Makes a packed move (see movegen): moves the piece from its square to
+        the end square, takes off every captured piece and turns the piece
+        into a king if the move crowns it. This does not check any validity
+        condition.
+        Returns an undo token (from, to, piece, promoted, captured) which is
+        given to unmake_move() to take the move back, where from and to are
+        row-column tuples, piece is the moved piece as it was before the move
+        and captured is a list of (row, col, piece) tuples of the jumped
+        pieces.
+        """
+        length = self._length
+        (row, col) = divmod(move & 0xff, length)
+        (row_to, col_to) = divmod((move >> 8) & 0xff, length)
+        piece = self.get(row, col)
+        captured = []
+        self.remove(row, col)
+        mask = move >> 17
+        while mask:
+            low = mask & -mask
+            (row_mid, col_mid) = divmod(low.bit_length() - 1, length)
+            captured.append((row_mid, col_mid, self.get(row_mid, col_mid)))
+            self.remove(row_mid, col_mid)
+            mask ^= low
+        promoted = bool(move & 0x10000)
+        self.place(row_to, col_to, piece.as_king() if promoted else piece)
+        return ((row, col), (row_to, col_to), piece, promoted, captured)
+
+    def unmake_move(self, undo):
+        """
+        Takes back a move made by make_move(), given its undo token. The moved
+        piece goes back to its square (as it was before the move, i.e. a pawn
+        if it was promoted) and all the captured pieces are placed back.
+        """
+        (frm, to, piece, promoted, captured) = undo
+        self.remove(to[0], to[1])
+        self.place(frm[0], frm[1], piece)
+        for (row, col, capture) in captured:
+            self.place(row, col, capture)
+
     def is_empty(self):
         """
         Returns True if the whole board is empty.
         """
-        for r in range(self._length):
-            for c in range(self._length):
-                if not self.is_free(r,c):
-                    return False
-        return True
+        return not (self._black | self._white)
     
     def is_full(self):
         """
         Returns True if the whole board is filled up.
         """
-        for r in range(self._length):
-            for c in range(self._length):
-                if self.is_free(r, c):
-                    return False
-        return True
+        return self._counts[EMPTY] == 0
     
     def display(self, count = None):
         """
@@ -127,8 +228,8 @@ class Board(object):
             str_ += chr(97 + r) + ' |'
             for c in range(0, self._length):
                 str_ += ' ' + \
-                    (str(self._cell[r][c]) \
-                         if self._cell[r][c] is not None else ' ') + ' |'
+                    (str(self.get(r, c)) \
+                         if not self.is_free(r, c) else ' ') + ' |'
             str_ += vline
         return str_
     
@@ -142,28 +243,65 @@ class Piece(object):
     """
     This class encapsulates a Piece object. In the Checkers game a piece is 
     a small piece which is colored black on once side and white on the other.
+    
+    There are only four different pieces, and a Piece is immutable, so
+    Piece(color, is_king) always returns one of four shared instances (see
+    PIECES), which a board builds from the codes it keeps. A pawn is turned
+    into a king by placing Piece.as_king() instead.
     """
     
     """ The symbols for the pieces: black and white circles. """
     symbols = ['b', 'w']
-    
-    # the flag to denote if a piece is a king
-    _is_king = False
     symbols_king = ['B', 'W']
     
-    def __init__(self, color = 'black', is_king = False):
+    __slots__ = ('_code', '_color', '_is_black', '_is_king')
+    
+    _instances = {}
+    
+    def __new__(cls, color = 'black', is_king = False):
         """
         The default color is always black, i.e. 'black'.
         """
         if color.isalpha():
             color = color.lower()
             if color == 'black' or color == 'white':
-                self._color = color
-                self._is_king  = is_king
+                is_king = bool(is_king)
+                piece = cls._instances.get((color, is_king))
+                if piece is None:
+                    piece = object.__new__(cls)
+                    code = (BLACK_PAWN if color == 'black' else WHITE_PAWN) \
+                                + (2 if is_king else 0)
+                    object.__setattr__(piece, '_code', code)
+                    object.__setattr__(piece, '_color', color)
+                    object.__setattr__(piece, '_is_black', color == 'black')
+                    object.__setattr__(piece, '_is_king', is_king)
+                    cls._instances[(color, is_king)] = piece
+                return piece
             else:
                 raise ValueError("A piece must be \'black\' or \'white\'.")
         else:
             raise ValueError("A piece must be \'black\' or \'white\'.")
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("A piece is immutable.")
+    
+    def __reduce__(self):
+        """
+        Pickles a piece by its color, so it unpickles to the shared piece.
+        """
+        return (Piece, (self._color, self._is_king))
+    
+    def __copy__(self):
+        return self
+    
+    def __deepcopy__(self, memo):
+        return self
+        
+    def code(self):
+        """
+        Returns the code of the piece, as a board cell keeps it.
+        """
+        return self._code
         
     def color(self):
         """
@@ -175,46 +313,49 @@ class Piece(object):
         """
         Returns a boolean True if the piece is black.
         """
-        return self._color == 'black'
+        return self._is_black
     
     def is_white(self):
         """
         Returns a boolean True if the piece is white.
         """
-        return self._color == 'white'
+        return not self._is_black
     
     def is_king(self):
         """
         Returns a boolean True if the piece is a king.
         """
         return self._is_king
-    
         
-    def turn_king(self):
+    def as_king(self):
         """
-        Turns this piece into a king from pawn.
+        Returns the king of the color of this piece.
         """
-        self._is_king = True
+        return PIECES[BLACK_KING if self._is_black else WHITE_KING]
         
-    def turn_pawn(self):
+    def as_pawn(self):
         """
-        Turns this piece from king to pawn.
+        Returns the pawn of the color of this piece.
         """
-        self.is_king = False
+        return PIECES[BLACK_PAWN if self._is_black else WHITE_PAWN]
         
     def __str__(self):
         """
         String represetation of a piece.
         """
         if self._is_king:
-            return self.symbols_king[0] if self._color == 'black' \
+            return self.symbols_king[0] if self._is_black \
                         else self.symbols_king[1]
         else:
-            return self.symbols[0] if self._color == 'black' \
+            return self.symbols[0] if self._is_black \
                         else self.symbols[1]
         
     def __repr__(self):
         """
         The function for the REPL printing.
         """
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
+
+# The shared pieces, indexed by their codes (None for EMPTY).
+PIECES = (None, Piece('black'), Piece('white'), Piece('black', True), \
+          Piece('white', True))
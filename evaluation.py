@@ -0,0 +1,259 @@
+from checkers import EMPTY, BLACK_KING
+"""
+This file implements an incremental version of gameai.heuristics(). The
+heuristics function scans the whole board for every leaf of the tree search:
+it counts the pawns and the kings, sums their distances to the king row and
+to the safe places, and finds all the capture paths of every piece. The
+IncrementalEvaluator keeps all those sums as running totals instead, and a
+move only applies the difference made by the squares it changes.
+
+The capture term of a piece depends on the squares its capture search looks
+at (its "footprint"), which are usually the squares around it. The evaluator
+keeps the capture term of every piece together with its footprint, indexed
+by the squares of the footprint, and a move only drops the terms of the
+pieces watching one of the squares the move changed. The pieces without a
+capture term are kept in a set, so the next evaluation only searches them
+again, all the other terms are still exact.
+"""
+
+_distances = {}
+
+def get_distances(length):
+    """
+    Returns the (cached) table of the "safe distance" of every square, i.e.
+    half the distance from the farthest corner, as used by the heuristics.
+    """
+    table = _distances.get(length)
+    if table is None:
+        table = []
+        for row in range(length):
+            r = row if row > (length - (row + 1)) else (length - (row + 1))
+            table.append([int(((r ** 2.0 + \
+                               (col if col > (length - (col + 1)) \
+                                    else (length - (col + 1))) ** 2.0) \
+                               ** 0.5) / 2.0) for col in range(length)])
+        _distances[length] = table
+    return table
+
+def weigh(turn, bp, wp, bk, wk, bc, wc, bkd, wkd, bsd, wsd):
+    """
+    Combines the piece counts, capture counts, king distances and safe
+    distances of both colors into the utility value for the given color.
+    """
+    if turn == 'black':
+        black_count_heuristics = \
+                3.125 * (((bp + bk * 2.0) - (wp + wk * 2.0)) \
+                    / 1.0 + ((bp + bk * 2.0) + (wp + wk * 2.0)))
+        black_capture_heuristics = 1.0417 * ((bc - wc)/(1.0 + bc + wc))
+        black_kingdist_heuristics = 1.429 * ((bkd - wkd)/(1.0 + bkd + wkd))
+        black_safe_heuristics = 5.263 * ((bsd - wsd)/(1.0 + bsd + wsd))
+        return black_count_heuristics + black_capture_heuristics \
+                    + black_kingdist_heuristics + black_safe_heuristics
+    else:
+        white_count_heuristics = \
+                3.125 * (((wp + wk * 2.0) - (bp + bk * 2.0)) \
+                    / 1.0 + ((bp + bk * 2.0) + (wp + wk * 2.0)))
+        white_capture_heuristics = 1.0416 * ((wc - bc)/(1.0 + bc + wc))
+        white_kingdist_heuristics = 1.428 * ((wkd - bkd)/(1.0 + bkd + wkd))
+        white_safe_heuristics = 5.263 * ((wsd - bsd)/(1.0 + bsd + wsd))
+        return white_count_heuristics + white_capture_heuristics \
+                    + white_kingdist_heuristics + white_safe_heuristics
+
+def balanced(turn, bp, wp, bk, wk):
+    """
+    Returns the utility of a balanced position with the given material, i.e.
+    the material shared evenly by both colors and every other term even.
+    The heuristics are never 0 for an even position, so this is the score
+    of a draw on their scale.
+    """
+    (pawns, kings) = ((bp + wp) / 2.0, (bk + wk) / 2.0)
+    return weigh(turn, pawns, pawns, kings, kings, 0, 0, 0, 0, 0, 0)
+
+def capture_value(board, row, col):
+    """
+    Returns a tuple (value, footprint) for the piece at row, col. The value
+    is the total length of its capture paths, i.e. the same as
+        sum([len(v) for v in tools.get_captures(board, row, col)])
+    and the footprint is a bit mask (bit row * length + col) of all the
+    squares the search looked at. The paths are followed with a stack, the
+    jumped pieces being kept in a mask instead of taken off the board.
+    """
+    length = board.get_length()
+    code = board.get_code(row, col)
+    is_black = code & 1
+    last = length - 1 if is_black else 0
+    origin = row * length + col
+    footprint = 1 << origin
+    total = 0
+    stack = [(row, col, code >= BLACK_KING, 0, 1)]
+    while stack:
+        (r, c, is_king, captured, n) = stack.pop()
+        extended = False
+        for (x, y) in ((+1, -1), (+1, +1), (-1, -1), (-1, +1)):
+            if not is_king and (x > 0) != bool(is_black):
+                continue
+            (r2, c2) = (r + 2 * x, c + 2 * y)
+            if not (0 <= r2 < length and 0 <= c2 < length):
+                continue
+            mid = (r + x) * length + (c + y)
+            land = r2 * length + c2
+            footprint |= (1 << mid) | (1 << land)
+            if (captured >> mid) & 1:
+                continue
+            other = board.get_code(r + x, c + y)
+            if other == EMPTY or (other & 1) == is_black:
+                continue
+            if land != origin and not (captured >> land) & 1 \
+                    and not board.is_free(r2, c2):
+                continue
+            extended = True
+            stack.append((r2, c2, is_king or r2 == last, \
+                          captured | (1 << mid), n + 1))
+        if not extended and n > 1:
+            total += n
+    return (total, footprint)
+
+def get_squares(mask):
+    """
+    Yields the squares (row * length + col) of the bits of a mask.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class IncrementalEvaluator(object):
+    """
+    This class encapsulates the running totals of the heuristics for one
+    board. Every move made on the board must be given to apply() and every
+    move taken back to revert(), in the same order, then evaluate() returns
+    what gameai.heuristics() returns for the board, at the cost of the
+    squares changed since the last evaluation.
+    """
+
+    def __init__(self, board):
+        """
+        Computes the totals for the current position of the board.
+        """
+        self._board = board
+        self._length = board.get_length()
+        self._distances = get_distances(self._length)
+        self._pieces = {}  # square -> (is_black, is_king)
+        # bp, wp, bk, wk, bkd, wkd, bsd, wsd like in gameai.heuristics()
+        self._totals = [0, 0, 0, 0, 0, 0, 0.0, 0.0]
+        self._captures = {}  # square -> (value, footprint, is_black)
+        self._watchers = {}  # square -> the squares of the footprints on it
+        self._dirty = set()  # the squares of the pieces without a term
+        self._bc, self._wc = 0, 0
+        self._frames = []  # one (dropped, added) tuple per applied move
+        for (row, col, piece) in board.get_pieces():
+            self._count(row, col, piece.is_black(), piece.is_king(), +1)
+
+    def _count(self, row, col, is_black, is_king, sign):
+        """
+        Adds (sign = +1) or takes off (sign = -1) a piece from the totals.
+        """
+        totals = self._totals
+        square = row * self._length + col
+        if sign > 0:
+            self._pieces[square] = (is_black, is_king)
+            if square not in self._captures:
+                self._dirty.add(square)
+        else:
+            del self._pieces[square]
+            self._dirty.discard(square)
+        if is_black:
+            if is_king:
+                totals[2] += sign
+            else:
+                totals[0] += sign
+                totals[4] += sign * (row + 1)
+                totals[6] += sign * self._distances[row][col]
+        else:
+            if is_king:
+                totals[3] += sign
+            else:
+                totals[1] += sign
+                totals[5] += sign * (self._length - (row + 1))
+                totals[7] += sign * self._distances[row][col]
+
+    def _keep(self, square, entry, sign):
+        """
+        Adds (sign = +1) or drops (sign = -1) the capture term of a piece.
+        """
+        watchers = self._watchers
+        if sign > 0:
+            self._captures[square] = entry
+            self._dirty.discard(square)
+            for watched in get_squares(entry[1]):
+                if watched in watchers:
+                    watchers[watched].add(square)
+                else:
+                    watchers[watched] = {square}
+        else:
+            del self._captures[square]
+            if square in self._pieces:
+                self._dirty.add(square)
+            for watched in get_squares(entry[1]):
+                watchers[watched].discard(square)
+        if entry[2]:
+            self._bc += sign * entry[0]
+        else:
+            self._wc += sign * entry[0]
+
+    def apply(self, undo):
+        """
+        Updates the totals for a move made on the board, given its undo
+        token (see checkers.Board.make_move).
+        """
+        (frm, to, piece, promoted, captured) = undo
+        length = self._length
+        is_black = piece.is_black()
+        was_king = piece.is_king() and not promoted
+        self._count(frm[0], frm[1], is_black, was_king, -1)
+        self._count(to[0], to[1], is_black, was_king or promoted, +1)
+        changed = [frm[0] * length + frm[1], to[0] * length + to[1]]
+        for (row, col, capture) in captured:
+            self._count(row, col, capture.is_black(), capture.is_king(), -1)
+            changed.append(row * length + col)
+        dropped = {}
+        for square in changed:
+            for owner in list(self._watchers.get(square, ())):
+                entry = self._captures[owner]
+                dropped[owner] = entry
+                self._keep(owner, entry, -1)
+        self._frames.append((dropped, []))
+
+    def revert(self, undo):
+        """
+        Updates the totals for a move taken back, given its undo token.
+        """
+        (frm, to, piece, promoted, captured) = undo
+        is_black = piece.is_black()
+        was_king = piece.is_king() and not promoted
+        (dropped, added) = self._frames.pop()
+        for square in added:
+            self._keep(square, self._captures[square], -1)
+        for (square, entry) in dropped.items():
+            self._keep(square, entry, +1)
+        for (row, col, capture) in captured:
+            self._count(row, col, capture.is_black(), capture.is_king(), +1)
+        self._count(to[0], to[1], is_black, was_king or promoted, -1)
+        self._count(frm[0], frm[1], is_black, was_king, +1)
+
+    def evaluate(self, turn):
+        """
+        Returns the heuristics of the board for the given color. Only the
+        capture terms dropped since the last evaluation are searched again.
+        """
+        length = self._length
+        for square in list(self._dirty):
+            (value, footprint) = capture_value(self._board, \
+                                    square // length, square % length)
+            self._keep(square, (value, footprint, self._pieces[square][0]), \
+                       +1)
+            if self._frames:
+                self._frames[-1][1].append(square)
+        (bp, wp, bk, wk, bkd, wkd, bsd, wsd) = self._totals
+        return weigh(turn, bp, wp, bk, wk, self._bc, self._wc, \
+                     bkd, wkd, bsd, wsd)
@@ -1,6 +1,11 @@
-import copy
-import tools
-import main as crank
+import time
+import itertools
+import batch
+import movegen
+import ordering
+import evaluation
+import transposition
+import searchstats
 
 """
     This file implements AI algorithms to find the next best move given 
@@ -11,6 +16,15 @@ import main as crank
     
     THIS AI MODULE ASSUMES get_hints(), apply_move() and apply_capture() 
     FUNCTIONS ARE CORRECTlY IMPLEMENTED.
+    
+    The actions of the search are packed integer moves (see movegen), they
+    are only written as string positions by the game play in main.
+    
+    The search runs on one mutable board: every transition makes its move
+    in place and the move is taken back once the child has been searched.
+    The alpha-beta search can remember the positions it has already searched
+    in a transposition table, then a state also carries the Zobrist key of
+    its position as a fourth item: (board, turn, depth, key).
 """
 
 def heuristics(state):
@@ -33,49 +47,26 @@ def heuristics(state):
     bc, wc = 0, 0
     bkd, wkd = 0, 0
     bsd, wsd = 0.0, 0.0
-    for row in range(length):
-        for col in range(length):
-            piece = board.get(row, col)
-            if piece:
-                r = row if row > (length - (row + 1)) else (length - (row + 1))
-                c = col if col > (length - (col + 1)) else (length - (col + 1))
-                d = int(((r ** 2.0 + c ** 2.0) ** 0.5) / 2.0)
-                if piece.color() == 'black':
-                    bc += sum([len(v) for v in \
-                               tools.get_captures(board, row, col)])
-                    if piece.is_king():
-                        bk += 1
-                    else:
-                        bp += 1
-                        bkd += row + 1
-                        bsd += d
-                else:
-                    wc += sum([len(v) for v in \
-                               tools.get_captures(board, row, col)])
-                    if piece.is_king():
-                        wk += 1
-                    else:
-                        wp += 1
-                        wkd += length - (row + 1)
-                        wsd += d
-    if turn == 'black':
-        black_count_heuristics = \
-                3.125 * (((bp + bk * 2.0) - (wp + wk * 2.0)) \
-                    / 1.0 + ((bp + bk * 2.0) + (wp + wk * 2.0)))
-        black_capture_heuristics = 1.0417 * ((bc - wc)/(1.0 + bc + wc))
-        black_kingdist_heuristics = 1.429 * ((bkd - wkd)/(1.0 + bkd + wkd))
-        black_safe_heuristics = 5.263 * ((bsd - wsd)/(1.0 + bsd + wsd))
-        return black_count_heuristics + black_capture_heuristics \
-                    + black_kingdist_heuristics + black_safe_heuristics
-    else:
-        white_count_heuristics = \
-                3.125 * (((wp + wk * 2.0) - (bp + bk * 2.0)) \
-                    / 1.0 + ((bp + bk * 2.0) + (wp + wk * 2.0)))
-        white_capture_heuristics = 1.0416 * ((wc - bc)/(1.0 + bc + wc))
-        white_kingdist_heuristics = 1.428 * ((wkd - bkd)/(1.0 + bkd + wkd))
-        white_safe_heuristics = 5.263 * ((wsd - bsd)/(1.0 + bsd + wsd))
-        return white_count_heuristics + white_capture_heuristics \
-                    + white_kingdist_heuristics + white_safe_heuristics
+    distances = evaluation.get_distances(length)
+    for (row, col, piece) in board.get_pieces():
+        d = distances[row][col]
+        if piece.is_black():
+            bc += evaluation.capture_value(board, row, col)[0]
+            if piece.is_king():
+                bk += 1
+            else:
+                bp += 1
+                bkd += row + 1
+                bsd += d
+        else:
+            wc += evaluation.capture_value(board, row, col)[0]
+            if piece.is_king():
+                wk += 1
+            else:
+                wp += 1
+                wkd += length - (row + 1)
+                wsd += d
+    return evaluation.weigh(turn, bp, wp, bk, wk, bc, wc, bkd, wkd, bsd, wsd)
                     
 def is_terminal(state, maxdepth = None):
     """
@@ -85,141 +76,659 @@ def is_terminal(state, maxdepth = None):
     board = state[0]
     turn = state[1]
     depth = state[2]
-    (moves, captures) = crank.get_hints(board, turn)
-    if maxdepth is not None:
-        return ((not moves) and (not captures)) or depth >= maxdepth
-    else:
-        return ((not moves) and (not captures))
+    if maxdepth is not None and depth >= maxdepth:
+        return True
+    return movegen.get_actions(board, turn)[2]
 
-def utility(state):
+def utility(state, maximizer = None):
     """
     This function computes the utility of a node, if that is
-    a terminal node.
+    a terminal node. The utility is seen from the maximizing color,
+    i.e. the color to move at the root of the search, which by default
+    is the color to move at the node.
     """
+    if maximizer is not None and maximizer != state[1]:
+        state = (state[0], maximizer) + tuple(state[2:])
     return heuristics(state)
 
-def transition(state, action, ttype):
+def evaluate(state, maximizer, context):
     """
-    This is the transition function. Given a board state and action,
-    it transitions to the next board state.
+    Returns the utility of a terminal node from the maximizing color, with
+    the incremental evaluator of the search if there is one.
     """
-    board = copy.deepcopy(state[0])
-    turn = state[1]
+    if context is not None and context.stats is not None:
+        stats = context.stats
+        stats.evaluations += 1
+        if stats.profile:
+            start = time.perf_counter()
+            if context.evaluator is not None:
+                score = context.evaluator.evaluate(maximizer)
+            else:
+                score = utility(state, maximizer)
+            stats.add_time(searchstats.EVALUATE, \
+                           time.perf_counter() - start)
+            return score
+    if context is not None and context.evaluator is not None:
+        return context.evaluator.evaluate(maximizer)
+    return utility(state, maximizer)
+
+def transition(state, action, context = None):
+    """
+    This is the transition function. Given a board state and action (a
+    packed move), it transitions to the next board state. The action is
+    made in place on the board of the state, so this returns the next state
+    together with the undo token to give to revert() once the next state is
+    searched.
+    """
+    board = state[0]
     depth = state[2]
-    if ttype == "move":
-        crank.apply_move(board, action)
-    elif ttype == "jump":
-        crank.apply_capture(board, action)
+    profile = context is not None and context.stats is not None \
+                  and context.stats.profile
+    if profile:
+        start = time.perf_counter()
+    undo = board.make_move(action)
+    if context is not None and context.evaluator is not None:
+        context.evaluator.apply(undo)
     turn = 'white' if state[1] == 'black' else 'black'
     depth += 1
-    return (board, turn, depth)
+    if len(state) > 3:
+        child = (board, turn, depth, \
+                 transposition.update_hash(state[3], board, undo))
+    else:
+        child = (board, turn, depth)
+    if profile:
+        context.stats.add_time(searchstats.TRANSITION, \
+                               time.perf_counter() - start)
+    return (child, undo)
 
-def maxvalue(state, maxdepth, alpha = None, beta = None):
+def revert(state, undo, context = None):
     """
-    The maxvalue function for the adversarial tree search.
+    Takes back the action made by transition(), given its undo token.
+    The time it takes is profiled as a part of the transitions.
+    """
+    profile = context is not None and context.stats is not None \
+                  and context.stats.profile
+    if profile:
+        start = time.perf_counter()
+    if context is not None and context.evaluator is not None:
+        context.evaluator.revert(undo)
+    state[0].unmake_move(undo)
+    if profile:
+        context.stats.add_time(searchstats.TRANSITION, \
+                               time.perf_counter() - start, 0)
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the tree search when its time or node budget runs out.
+    The moves made on the board are taken back while it goes up the tree.
+    """
+    pass
+
+class SearchContext(object):
+    """
+    This class holds what a tree search carries from node to node: the
+    transposition table, the move orderer, the incremental evaluator, the
+    time and node budget, the number of nodes visited so far, the
+    statistics of the search and the principal variation of the previous
+    iteration of an iterative deepening search.
+    """
+    
+    # the clock is checked once every this many nodes
+    CHECK_EVERY = 256
+
+    def __init__(self, table = None, deadline = None, max_nodes = None, \
+                 orderer = None, evaluator = None, use_batch = False, \
+                 tablebase = None, stats = None, stop = None):
+        """
+        The deadline is a time.time() value and max_nodes a number of nodes,
+        the search raises SearchTimeout when one of them is passed, or when
+        the given stop event (a threading.Event) is set. The
+        evaluator must be made for the board being searched. If use_batch
+        is True (it needs NumPy), the children of the frontier nodes are
+        scored together by batch.heuristics(). The positions found in the
+        given endgame tablebase (see tablebase.Tablebase) get their exact
+        score without any search. The search fills the given statistics
+        (see searchstats.SearchStats), if any.
+        """
+        self.table = table
+        self.tablebase = tablebase
+        self.stats = stats
+        self.orderer = orderer
+        self.evaluator = evaluator
+        self.use_batch = use_batch
+        self.deadline = deadline
+        self.stop = stop
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.pv = []
+        self.follow_pv = False
+        self.horizon = False  # True if some node was cut by the depth limit
+
+    def tick(self):
+        """
+        Counts a node, and stops the search if the budget has run out.
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchTimeout()
+        if self.nodes % self.CHECK_EVERY == 0:
+            if self.deadline is not None and time.time() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchTimeout()
+
+    def pv_move(self, ply):
+        """
+        Returns the move of the previous principal variation at the given
+        ply, as long as the search is still following that variation.
+        """
+        if self.follow_pv:
+            if ply < len(self.pv):
+                return self.pv[ply]
+            self.follow_pv = False
+        return None
+
+def probe(state, maxdepth, alpha, beta, context):
+    """
+    Looks the state up in the transposition table. Returns a tuple
+    (score, move) where score is not None if the stored entry is deep
+    enough to settle the node within the alpha-beta window, and move is the
+    best move stored for the position (or None).
+    """
+    if context is None or context.table is None or alpha is None \
+            or maxdepth is None:
+        return (None, None)
+    entry = context.table.probe(state[3])
+    stats = context.stats
+    if stats is not None:
+        stats.table_probes += 1
+    if entry is None:
+        return (None, None)
+    if stats is not None:
+        stats.table_hits += 1
+    (key, depth, bound, score, move, age) = entry
+    if depth >= maxdepth - state[2]:
+        if bound == transposition.EXACT \
+                or (bound == transposition.LOWER and score >= beta) \
+                or (bound == transposition.UPPER and score <= alpha):
+            if stats is not None:
+                stats.table_cutoffs += 1
+            return (score, move)
+    return (None, move)
+
+def record(state, maxdepth, alpha, beta, context, v, move):
+    """
+    Stores the value of a searched state in the transposition table, where
+    alpha and beta are the bounds the state was searched with.
+    """
+    if context is None or context.table is None or alpha is None \
+            or maxdepth is None:
+        return
+    if v <= alpha:
+        bound = transposition.UPPER
+    elif v >= beta:
+        bound = transposition.LOWER
+    else:
+        bound = transposition.EXACT
+    context.table.store(state[3], maxdepth - state[2], bound, v, move)
+
+def order(actions, first):
+    """
+    Returns the actions with the given action (e.g. the best move from the
+    transposition table) moved to the front.
+    """
+    if first is not None and first in actions:
+        return [first] + [a for a in actions if a != first]
+    return actions
+
+def expand(state, maxdepth, alpha, beta, context, maximizer = None):
+    """
+    The common first part of maxvalue and minvalue. Returns a tuple
+    (score, actions, ttype) where score is not None if the node needs no
+    search: the transposition table or the endgame tablebase settles it
+    (the score is from the maximizing color), or it is a terminal. 
+    Otherwise actions is an iterator over the ordered actions of the node,
+    which are generated lazily (see movegen.iter_actions): the hash move is
+    tried before the other actions are generated, so a cutoff by the hash
+    move saves the whole move generation.
     """
     board = state[0]
     turn = state[1]
-    if is_terminal(state, maxdepth):
-        return utility(state)
+    first = None
+    if context is not None:
+        context.tick()
+        if context.stats is not None and state[2] > context.stats.seldepth:
+            context.stats.seldepth = state[2]
+        (score, first) = probe(state, maxdepth, alpha, beta, context)
+        if score is not None:
+            # the stored score may come from a depth limited search as well
+            context.horizon = True
+            return (score, None, None)
+        if context.tablebase is not None:
+            score = context.tablebase.score(board, turn, \
+                                            maximizer or turn, state[2])
+            if score is not None:
+                return (score, None, None)
+    if maxdepth is not None and state[2] >= maxdepth:
+        if context is not None:
+            context.horizon = True
+        return (None, None, None)
+    policy = None
+    if context is not None:
+        first = context.pv_move(state[2]) or first
+        if context.orderer is not None:
+            policy = lambda actions, ttype: \
+                        context.orderer.order(actions, ttype, state[2])
+    actions = movegen.iter_actions(board, turn, first, policy)
+    if context is not None and context.stats is not None \
+            and context.stats.profile:
+        actions = context.stats.timed(searchstats.MOVEGEN, actions)
+    # the first action tells if the node is a terminal
+    head = next(actions, None)
+    if head is None:
+        return (None, None, None)
+    ttype = "jump" if movegen.is_capture(head) else "move"
+    return (None, itertools.chain([head], actions), ttype)
+
+def cutoff(state, maxdepth, context, action, ttype, index):
+    """
+    Tells the move orderer (if any) that the action caused a cutoff, and
+    counts it in the statistics (if any).
+    """
+    if context is not None and context.stats is not None:
+        context.stats.cutoff(state[2])
+    if context is not None and context.orderer is not None:
+        depth = maxdepth - state[2] if maxdepth is not None else 1
+        context.orderer.cutoff(action, ttype, state[2], depth, index)
+
+def frontier(state, actions, maxdepth, context, maximizer):
+    """
+    Scores all the children of a frontier node, i.e. a node one move away
+    from the depth limit, with one call to batch.heuristics(). Returns a
+    tuple (actions, leaves) where leaves is the list of the (child, known,
+    score) tuples of the actions, to give to leaf(), or None if the search
+    does not use batch evaluation or the node is not a frontier. A child
+    found in the endgame tablebase gets its exact score as known, and is
+    not scored by batch.heuristics(). The transposition table is probed
+    by leaf(), since the probe depends on the alpha-beta window.
+    """
+    if context is None or not context.use_batch or maxdepth is None \
+            or maxdepth - state[2] != 1:
+        return (actions, None)
+    actions = list(actions)
+    position = batch.encode(state[0])
+    children = []
+    undos = []
+    for a in actions:
+        (child, undo) = transition(state, a)
+        try:
+            known = None
+            if context.tablebase is not None:
+                known = context.tablebase.score(state[0], child[1], \
+                                                maximizer, child[2])
+        finally:
+            revert(state, undo)
+        children.append((child, known))
+        if known is None:
+            undos.append(undo)
+    scores = []
+    if undos:
+        start = time.perf_counter()
+        scores = batch.heuristics(batch.children(position, undos), \
+                                  maximizer).tolist()
+        if context.stats is not None and context.stats.profile:
+            context.stats.add_time(searchstats.EVALUATE, \
+                                   time.perf_counter() - start, len(undos))
+    scores = iter(scores)
+    return (actions, [(child, known, next(scores) if known is None \
+                                         else None) \
+                          for (child, known) in children])
+
+def leaf(child, maxdepth, alpha, beta, context, known, score):
+    """
+    Returns the score of a child of a frontier node (see frontier()) the way
+    expand() and evaluate() find it, the heuristics being already computed:
+    the node is counted against the budget, and the transposition table and
+    the endgame tablebase are tried first.
+    """
+    context.tick()
+    if context.stats is not None and child[2] > context.stats.seldepth:
+        context.stats.seldepth = child[2]
+    (found, move) = probe(child, maxdepth, alpha, beta, context)
+    if found is not None:
+        context.horizon = True
+        return found
+    if known is not None:
+        return known
+    context.horizon = True
+    if context.stats is not None:
+        context.stats.evaluations += 1
+    return score
+
+def maxvalue(state, maxdepth, alpha = None, beta = None, context = None):
+    """
+    The maxvalue function for the adversarial tree search.
+    """
+    (score, actions, ttype) = expand(state, maxdepth, alpha, beta, context, \
+                                     state[1])
+    if score is not None:
+        return score
+    if actions is None:
+        return evaluate(state, state[1], context)
     else:
+        (alpha_, beta_) = (alpha, beta)
         v = float('-inf')
-        (moves, captures) = crank.get_hints(board, turn)
-        if captures:
-            for a in captures:
-                v = max(v, minvalue(transition(state, a, "jump"), \
-                        maxdepth, alpha, beta))
-                if alpha is not None and beta is not None:
-                    if v >= beta:
-                        return v
-                    alpha = max(alpha, v)
-            return v
-        elif moves:
-            for a in moves:
-                v = max(v, minvalue(transition(state, a, "move"), \
-                        maxdepth, alpha, beta))
-                if alpha is not None and beta is not None:
-                    if v >= beta:
-                        return v
-                    alpha = max(alpha, v)
-            return v            
-
-def minvalue(state, maxdepth, alpha = None, beta = None):
+        best = None
+        (actions, leaves) = frontier(state, actions, maxdepth, context, \
+                                     state[1])
+        for (i, a) in enumerate(actions):
+            if leaves is not None:
+                (child, known, score) = leaves[i]
+                score = leaf(child, maxdepth, alpha, beta, context, known, \
+                             score)
+            else:
+                (child, undo) = transition(state, a, context)
+                try:
+                    score = minvalue(child, maxdepth, alpha, beta, context)
+                finally:
+                    revert(state, undo, context)
+            if context is not None:
+                context.follow_pv = False
+            if score > v:
+                (v, best) = (score, a)
+            if alpha is not None and beta is not None:
+                if v >= beta:
+                    cutoff(state, maxdepth, context, a, ttype, i)
+                    break
+                alpha = max(alpha, v)
+        record(state, maxdepth, alpha_, beta_, context, v, best)
+        return v
+
+def minvalue(state, maxdepth, alpha = None, beta = None, context = None):
     """
     The minvalue function for the adversarial tree search.
     """
-    board = state[0]
-    turn = state[1]
-    if is_terminal(state, maxdepth):
-        return utility(state)
+    (score, actions, ttype) = expand(state, maxdepth, alpha, beta, context, \
+                            'white' if state[1] == 'black' else 'black')
+    if score is not None:
+        return score
+    if actions is None:
+        return evaluate(state, 'white' if state[1] == 'black' else 'black', \
+                        context)
     else:
+        (alpha_, beta_) = (alpha, beta)
         v = float('inf')
-        (moves, captures) = crank.get_hints(board, turn)
-        if captures:
-            for a in captures:
-                v = min(v, maxvalue(transition(state, a, "jump"), \
-                                     maxdepth, alpha, beta))
-                if alpha is not None and beta is not None:
-                    if v <= alpha:
-                        return v
-                    beta = min(beta, v)
-            return v
-        elif moves:
-            for a in moves:
-                v = min(v, maxvalue(transition(state, a, "move"), \
-                                     maxdepth, alpha, beta))
-                if alpha is not None and beta is not None:
-                    if v <= alpha:
-                        return v
-                    beta = min(beta, v)
-            return v
-
-def minimax_search(state, maxdepth = None):
-    """
-    The depth limited minimax tree search.
+        best = None
+        (actions, leaves) = frontier(state, actions, maxdepth, context, \
+                            'white' if state[1] == 'black' else 'black')
+        for (i, a) in enumerate(actions):
+            if leaves is not None:
+                (child, known, score) = leaves[i]
+                score = leaf(child, maxdepth, alpha, beta, context, known, \
+                             score)
+            else:
+                (child, undo) = transition(state, a, context)
+                try:
+                    score = maxvalue(child, maxdepth, alpha, beta, context)
+                finally:
+                    revert(state, undo, context)
+            if context is not None:
+                context.follow_pv = False
+            if score < v:
+                (v, best) = (score, a)
+            if alpha is not None and beta is not None:
+                if v <= alpha:
+                    cutoff(state, maxdepth, context, a, ttype, i)
+                    break
+                beta = min(beta, v)
+        record(state, maxdepth, alpha_, beta_, context, v, best)
+        return v
+
+def search_root(state, actions, maxdepth, alpha = None, beta = None, \
+                context = None):
+    """
+    Scores every root action with the minvalue function and returns the
+    best (action, value) tuple, the first one in case of a tie. In the
+    alpha-beta search, alpha is raised to the best score found so far: the
+    later actions can then only fail low (and lose the tie) or score better
+    with their exact value, so the best action and its value are the same
+    as with a full window.
+    """
+    scores = []
+    for a in actions:
+        (child, undo) = transition(state, a, context)
+        try:
+            score = minvalue(child, maxdepth, alpha, beta, context)
+        finally:
+            revert(state, undo, context)
+        if context is not None:
+            context.follow_pv = False
+        scores.append((a, score))
+        if alpha is not None:
+            alpha = max(alpha, score)
+    return max(scores, key = lambda v: v[1])
+
+def minimax_search(state, maxdepth = None, context = None):
+    """
+    The depth limited minimax tree search. A context without a table or a
+    move orderer (e.g. SearchContext()) only counts the nodes visited.
     """
     board = state[0]
     turn = state[1]
-    (moves, captures) = crank.get_hints(board, turn)
-    if captures:
-        return max([(a, minvalue(transition(state, a, "jump"), maxdepth)) \
-                        for a in captures], key = lambda v: v[1])
-    elif moves:
-        return max([(a, minvalue(transition(state, a, "move"), maxdepth)) \
-                        for a in moves], key = lambda v: v[1])        
-    else: 
+    (actions, ttype, terminal) = movegen.get_actions(board, turn)
+    if terminal:
         return ("pass", -1)
+    return search_root(state, actions, maxdepth, context = context)
 
-def alphabeta_search(state, maxdepth = None):
+def alphabeta_search(state, maxdepth = None, table = None, context = None):
     """
     The depth limited alpha-beta tree search, it's 2-times faster than
-    the minimax search.
+    the minimax search. If a transposition table is given, the positions
+    reached by different move orders are searched only once, and the table
+    keeps them for the next searches. The scores in the table are from the
+    point of view of the color to move at the root, so a table must only
+    be shared by the searches of the same color.
     """
     board = state[0]
     turn = state[1]
-    (moves, captures) = crank.get_hints(board, turn)
+    (actions, ttype, terminal) = movegen.get_actions(board, turn)
+    if terminal:
+        return ("pass", -1)
     alpha = float('-inf')
     beta = float('inf')
-    if captures:
-        return max([\
-            (a, minvalue(transition(state, a, "jump"), \
-                         maxdepth, alpha, beta)) \
-                             for a in captures], key = lambda v: v[1])
-    elif moves:
-        return max([\
-            (a, minvalue(transition(state, a, "move"), \
-                         maxdepth, alpha, beta)) \
-                             for a in moves], key = lambda v: v[1])
+    if context is None:
+        context = SearchContext(table)
+    if context.table is not None:
+        state = (board, turn, state[2], transposition.hash_board(board, turn))
+    if context.orderer is not None:
+        actions = context.orderer.order(actions, ttype, state[2])
+    return search_root(state, order(actions, context.pv_move(0)), \
+                       maxdepth, alpha, beta, context)
+
+def principal_variation(state, context, maxdepth):
+    """
+    Follows the best moves stored in the transposition table from the given
+    state, and returns them as a list, at most maxdepth moves long.
+    """
+    if context.table is None:
+        return []
+    board = state[0]
+    turn = state[1]
+    key = transposition.hash_board(board, turn)
+    pv = []
+    undos = []
+    while len(pv) < maxdepth:
+        entry = context.table.probe(key)
+        if entry is None or entry[4] is None:
+            break
+        if entry[4] not in movegen.get_actions(board, turn)[0]:
+            break
+        pv.append(entry[4])
+        undo = board.make_move(entry[4])
+        undos.append(undo)
+        key = transposition.update_hash(key, board, undo)
+        turn = 'white' if turn == 'black' else 'black'
+    for undo in reversed(undos):
+        board.unmake_move(undo)
+    return pv
+
+def root_variation(state, context, move, maxdepth):
+    """
+    Returns the principal variation of a search from the given state, where
+    move is the best root move: the root is not stored in the transposition
+    table, so the variation goes on from the child of the move.
+    """
+    if move == "pass":
+        return []
+    board = state[0]
+    turn = 'white' if state[1] == 'black' else 'black'
+    undo = board.make_move(move)
+    try:
+        return [move] + principal_variation((board, turn, 1), context, \
+                                            maxdepth - 1)
+    finally:
+        board.unmake_move(undo)
+
+def iterative_deepening(state, seconds = None, max_nodes = None, \
+                        maxdepth = 64, table = None, orderer = None, \
+                        use_batch = False, tablebase = None, stats = None, \
+                        stop = None):
+    """
+    The iterative deepening alpha-beta search: searches to depth 1, 2, 3, ...
+    until the time budget (in seconds) or the node budget runs out, or
+    maxdepth is reached, and returns the (action, value) tuple of the last
+    completed depth. Every depth searches the principal variation of the
+    previous one first. If the whole game tree was searched before the
+    depth limit, a deeper search would not change anything so it stops.
+    The actions are ordered by the given move orderer (a new one if None),
+    which keeps its killer moves and history from one depth to the next.
+    A given orderer forgets its killer moves and ages its history first.
+    The leaves are scored by an incremental evaluator, or in bulk by
+    batch.heuristics() if use_batch is True. The positions of the given
+    endgame tablebase are scored exactly, so once all the root moves reach
+    it the search stops at depth 1. The given statistics (see
+    searchstats.SearchStats), if any, are filled by the search and get the
+    time and the nodes of every completed depth. A search running in
+    another thread is stopped by setting the given stop event, and returns
+    the result of the last completed depth. The entries of the table and
+    the history of the orderer are aged once by the search.
+    """
+    board = state[0]
+    turn = state[1]
+    start = time.time()
+    (actions, ttype, terminal) = movegen.get_actions(board, turn)
+    if terminal:
+        best = ("pass", -1)
+    elif len(actions) == 1:
+        best = (actions[0], utility(state, turn))
+    if terminal or len(actions) == 1:
+        if stats is not None:
+            (stats.move, stats.score) = best
+            stats.seconds = time.time() - start
+        return best
+    deadline = start + seconds if seconds is not None else None
+    if orderer is None:
+        orderer = ordering.MoveOrderer()
     else:
-        return ("pass", -1)
+        orderer.new_search()
+    context = SearchContext(table, deadline, max_nodes, orderer, \
+                            evaluation.IncrementalEvaluator(board), \
+                            use_batch, tablebase, stats, stop)
+    if table is not None:
+        table.new_search()
+    best = (actions[0], None)
+    depth = 1
+    while depth <= maxdepth:
+        context.follow_pv = True
+        context.horizon = False
+        (started, nodes) = (time.time(), context.nodes)
+        try:
+            best = alphabeta_search(state, depth, context = context)
+        except SearchTimeout:
+            break
+        context.pv = root_variation(state, context, best[0], depth)
+        if stats is not None:
+            stats.complete_depth(depth, time.time() - started, \
+                                 context.nodes - nodes, best[0], best[1])
+        if not context.horizon:
+            break
+        depth += 1
+    if stats is not None:
+        stats.nodes = context.nodes
+        (stats.move, stats.score) = best
+        stats.pv = context.pv
+        stats.seconds = time.time() - start
+    return best
+
+# The transposition tables kept between the turns, one for each color.
+tables = {}
 
-def get_next_move(board, turn):
+def get_table(turn):
     """
-    Use the AI to get the next best move.
-    Takes almost 6 seconds to find a move.
+    Returns the transposition table kept for the searches of the given
+    color, a new one the first time.
     """
+    if turn not in tables:
+        tables[turn] = transposition.TranspositionTable()
+    return tables[turn]
+
+# The move orderers kept between the turns, one for each color.
+orderers = {}
+
+def get_orderer(turn):
+    """
+    Returns the move orderer kept for the searches of the given color, a
+    new one the first time. Its history goes on from one search to the
+    next, aged by every search.
+    """
+    if turn not in orderers:
+        orderers[turn] = ordering.MoveOrderer()
+    return orderers[turn]
+
+# The endgame tablebase used by get_next_move(), e.g.
+#     gameai.endgame = tablebase.Tablebase('endgame.tb')
+endgame = None
+
+# The opening book looked up by get_next_move() before any search, e.g.
+#     gameai.opening = book.OpeningBook('opening.book')
+opening = None
+
+# The file where get_next_move() writes the statistics of every search as
+# one JSON line, e.g.
+#     gameai.stats_log = open('search.jsonl', 'a')
+stats_log = None
+
+# The parallel root search (see parallel.ParallelSearch) used by
+# get_next_move() when it has more than one worker, e.g.
+#     gameai.pool = parallel.ParallelSearch(4)
+pool = None
+
+def get_next_move(board, turn, seconds = 5.0, max_nodes = None, \
+                  stats = None):
+    """
+    Use the AI to get the next best move, as a packed move (see movegen).
+    Searches deeper and deeper until the time budget (5 seconds by default)
+    or the node budget runs out. A position of the opening book is not
+    searched at all. The search fills the given statistics, if any. If a
+    pool of more than one worker is set, and there is no node budget, the
+    root actions are searched in parallel on the pool instead.
+    """
+    if opening is not None:
+        found = opening.probe(board, turn)
+        if found is not None:
+            return found[0]
     state = (board, turn, 0)
+    if stats is None and stats_log is not None:
+        stats = searchstats.SearchStats()
     print("Thinking ...")
     # move = minimax_search(state, 5) # slow
-    move = alphabeta_search(state, 6) # fast
-    return move[0]
\ No newline at end of file
+    if pool is not None and pool.workers > 1 and max_nodes is None:
+        move = pool.deepen(state, seconds, stats = stats)
+    else:
+        move = iterative_deepening(state, seconds, max_nodes, \
+                                   table = get_table(turn), \
+                                   orderer = get_orderer(turn), \
+                                   tablebase = endgame, stats = stats) # fast
+    if stats_log is not None:
+        stats.write(stats_log, board.get_length(), turn = turn)
+    return move[0]
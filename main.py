@@ -1,8 +1,14 @@
 # Make all import
+import argparse
 import tools
+import bitboard
+import movegen
+import ponder
+import searchstats
 import gameai as ai
 from checkers import Piece
 from checkers import Board
+from checkers import BLACK_PAWN, WHITE_PAWN, BLACK_KING, WHITE_KING
 
 ###########################################################
 #
@@ -23,6 +29,9 @@ from checkers import Board
 #   get_all_moves(board, color, is_sorted = False):
 #       Get all the positions of all the pieces on the board that can be moved.
 #       return list of all move
+#   iter_all_moves(board, color):
+#       The same moves as get_all_moves(), one by one.
+#       yield move
 #   sort_captures(all_captures,is_sorted=False):
 #       Returns a sorted captures
 #   get_all_captures(board, color, is_sorted = False):
@@ -90,43 +99,39 @@ def initialize(board):
 def count_pieces(board):
     """
 Counts the total number of black and white pieces on the board.
-    use two for loop and three if
+    use the piece counters of the board
 return tuple of black and white
     """
-    row = col = board.get_length()
-    black, white = 0, 0
-    for r in range(row):
-        for c in range(col):
-            piece = board.get(r, c)
-            if piece:
-                if piece.is_black():
-                    black += 1
-                if piece.is_white():
-                    white += 1
-    return (black, white)
+    counts = board.get_counts()
+    return (counts[BLACK_PAWN] + counts[BLACK_KING], \
+            counts[WHITE_PAWN] + counts[WHITE_KING])
 
 def get_all_moves(board, color, is_sorted = False):
     """
 Get all the positions of all the pieces on the board that can be moved.
-    use three for loop and three if
+    use iter_all_moves and sort
 return list of all move
     """
-    row = col = board.get_length()
-    final_list = []
-    for r in range(row):
-        for c in range(col):
-            piece = board.get(r, c)
-            if piece:
-                if piece.color() == color:
-                    path_list = tools.get_moves(board, r, c, is_sorted)
-                    path_start = deindexify(r, c)
-                    for path in path_list:
-                        final_list.append((path_start, path))
+    final_list = list(iter_all_moves(board, color))
     
     if is_sorted == True:
         final_list.sort()
     return final_list
 
+def iter_all_moves(board, color):
+    """
+Yield the moves of get_all_moves() one at a time, piece by piece.
+    use the pieces of the color and two for loop
+yield move
+    
+    A piece's moves are only found once the moves of the pieces before it
+    have been used, so a caller that stops early saves the rest.
+    """
+    for (r, c, piece) in board.get_pieces(color):
+        path_start = deindexify(r, c)
+        for path in tools.get_moves(board, r, c):
+            yield (path_start, path)
+
 def sort_captures(all_captures,is_sorted=False):
     '''If is_sorted flag is True then the final list will be sorted by 
     the length of each sub-list and the sub-lists with the same length 
@@ -139,26 +144,21 @@ def sort_captures(all_captures,is_sorted=False):
 def get_all_captures(board, color, is_sorted = False):
     """
 Get the probability that all the pieces on the board can jump.
-    use three for loop and two if
+    use the pieces of the color and two for loop
 return sort_captures list
     """
-    row = col = board.get_length()
     final_list = []
-    for r in range(row):
-        for c in range(col):
-            piece = board.get(r, c)
-            if piece:
-                if piece.color() == color:
-                    path_list = tools.get_captures(board, r, c, is_sorted)
-                    for path in path_list:
-                        final_list.append(path) 
+    for (r, c, piece) in board.get_pieces(color):
+        path_list = tools.get_captures(board, r, c, is_sorted)
+        for path in path_list:
+            final_list.append(path) 
     return sort_captures(final_list, is_sorted)
 
 def apply_move(board, move):
     """
 Performs actual operations and moves that move the specified pieces.
     use the if and piece and board class
-No return
+return the undo token of Board.make_move()
     
     Raise this exception below:
         raise RuntimeError("Invalid move, please type" \
@@ -174,12 +174,13 @@ No return
     path_list = tools.get_moves(board, row, col, is_sorted = False)
     
     if move[1] in path_list:
+        length = board.get_length()
         piece = board.get(row, col)
-        if piece.is_black() and row_end == board.get_length()-1 \
-        or piece.is_white() and row_end == 0:
-            piece.turn_king()
-        board.remove(row, col)
-        board.place(row_end, col_end, piece)
+        crowned = not piece.is_king() and \
+                    row_end == (length - 1 if piece.is_black() else 0)
+        return board.make_move(movegen.pack(row * length + col, \
+                                            row_end * length + col_end, \
+                                            0, crowned))
     else:
         raise RuntimeError("Invalid move, please type" \
                          + " \'hints\' to get suggestions.")
@@ -188,7 +189,7 @@ def apply_capture(board, capture_path):
     """
 Performs actual operations and jumps to move the specified pieces.
     use one while loop and one if
-No return
+return the undo token of Board.make_move() for the whole path
     
     Raise this exception below:
         raise RuntimeError("Invalid jump/capture, please type" \
@@ -199,8 +200,10 @@ No return
             position in capture_path
         b. the destination position from a jump is not in the jumps list found
             from tools.get_jumps() function.            
+    If the path is invalid, the jumps already made are taken back.
     """
     counter = 0
+    undo = None
     while counter < len(capture_path)-1:
         path = [capture_path[counter], capture_path[counter + 1]]
         counter += 1
@@ -209,59 +212,61 @@ No return
         path_list = tools.get_jumps(board, row, col, is_sorted = False)
         
         if path[1] in path_list:
+            length = board.get_length()
             piece = board.get(row, col)
-            if piece.is_black() and row_end == board.get_length()-1 \
-            or piece.is_white() and row_end == 0:
-                piece.turn_king()
-            board.remove(row, col)
-            row_eat, col_eat = max(row, row_end)-1, max(col, col_end)-1
-            board.remove(row_eat, col_eat)
-            board.place(row_end, col_end, piece)
+            crowned = not piece.is_king() and \
+                        row_end == (length - 1 if piece.is_black() else 0)
+            step = board.make_move(movegen.pack(row * length + col, \
+                        row_end * length + col_end, \
+                        1 << (((row + row_end) // 2) * length \
+                              + (col + col_end) // 2), crowned))
+            # join the jumps into a single undo token
+            undo = step if undo is None else (undo[0], step[1], undo[2], \
+                        undo[3] or step[3], undo[4] + step[4])
         else:
+            if undo is not None:
+                board.unmake_move(undo)
             raise RuntimeError("Invalid jump/capture, please type" \
                              + " \'hints\' to get suggestions.")
+    return undo
             
 def get_hints(board, color, is_sorted = False):
     """
 Use movement and jump to get all the possibilities.
     use the get_all_moves and get_all_captures
 return tuple of move and jump
+    
+    A BitBoard generates the hints of a whole side with bitwise operations.
     """
-    move = get_all_moves(board, color, is_sorted)
+    if isinstance(board, bitboard.BitBoard):
+        return board.get_hints(color, is_sorted)
+    # the moves are not needed when there is a capture
     jump = get_all_captures(board, color, is_sorted)
     if jump:
         return ([], jump)
     else:
-        return (move, jump)
+        return (get_all_moves(board, color, is_sorted), jump)
         
 def get_winner(board, is_sorted = False):
     """
 Judge the outcome of the game.
-    use if and elif to judge and two for loop
+    use if and elif to judge and the piece counters
 return the black white and draw
+    
+    A side "has hints" if it has any legal move, which movegen.has_move()
+    tells without listing the moves.
     """
-    black_hint = get_hints(board, 'black', is_sorted)
-    white_hint = get_hints(board, 'white', is_sorted)
-    if black_hint != ([],[]) and white_hint == ([],[]):
+    black_hint = movegen.has_move(board, 'black')
+    white_hint = movegen.has_move(board, 'white')
+    if black_hint and not white_hint:
         return 'black'
-    elif black_hint == ([],[]) and white_hint != ([],[]):
+    elif not black_hint and white_hint:
         return 'white'
     else:
-        black_king,white_king = 0,0
-        black, white = 0,0
-        row = col = board.get_length()
-        for r in range(row):
-            for c in range(col):
-                piece = board.get(r, c)
-                if piece:
-                    if piece.is_black():
-                        black += 1
-                        if piece.is_king():
-                            black_king += 1
-                    else:
-                        white += 1
-                        if piece.is_king():
-                            white_king += 1
+        counts = board.get_counts()
+        black_king, white_king = counts[BLACK_KING], counts[WHITE_KING]
+        black = counts[BLACK_PAWN] + black_king
+        white = counts[WHITE_PAWN] + white_king
         if white_king == 1 and black_king == 1 and white == 1 and black == 1:
             return 'draw'
         else:
@@ -277,10 +282,11 @@ def is_game_finished(board, is_sorted = False):
 Just decide if the game is over.
     use one if
 return true or flase
+    
+    The game is over once a side has no legal move, see movegen.has_move().
     """
-    black_hint = get_hints(board, 'black', is_sorted)
-    white_hint = get_hints(board, 'white', is_sorted)
-    if black_hint == ([],[]) or white_hint == ([],[]):
+    if not movegen.has_move(board, 'black') \
+            or not movegen.has_move(board, 'white'):
         return True
     else:
         return False
@@ -349,30 +355,26 @@ def game_play_human():
                 if command and command[0] == 'move' and len(command) == 3:
                     if not captures:
                         action = (command[1], command[2])
-                        if action in moves:
-                            apply_move(board, action)
-                        else:
+                        if action not in moves:
                             raise RuntimeError(move_error)
                     else:
                         raise RuntimeError(hasjump_error)
                 elif command and command[0] == 'jump' and len(command) >= 3:
                     action = command[1:]
-                    if action in captures:
-                        apply_capture(board, action)
-                    else:
+                    if action not in captures:
                         raise RuntimeError(jump_error)
                 elif command and command[0] == 'apply' and len(command) == 2:
                     id_hint = int(command[1])
                     if moves and (1 <= id_hint <= len(moves)):
                         action = moves[id_hint - 1]
-                        apply_move(board, action)
                     elif captures and (1 <= id_hint <= len(captures)):
                         action = captures[id_hint - 1]
-                        apply_capture(board, action)
                     else:
                         raise ValueError(hint_error)
                 else:
                     raise RuntimeError(cmd_error + tools.usage)
+                # the action is a legal hint, it is played as a packed move
+                board.make_move(movegen.from_notation(board, action))
                 print("\t{:s} played {:s}.".format(turn, str(action)))
                 turn = my_color if turn == opponent_color else opponent_color
         except Exception as err:
@@ -425,6 +427,10 @@ def game_play_ai():
     turn = my_color if my_color == 'black' else opponent_color
     print("Black always plays first.\n")
     
+    # the ai searches the replies of the human while the human thinks
+    ponderer = ponder.Ponderer()
+    reached = None  # the depth of the last search of the ai
+    
     # loop until the game is finished
     while not is_game_finished(board):
         try:
@@ -435,17 +441,26 @@ def game_play_ai():
             board.display(piece_count)
             
             if turn == opponent_color: # if Turn of machine
-                move = ai.get_next_move(board, turn)
-                if type(move) == list: # move is a move
-                    apply_capture(board, move)
-                if type(move) == tuple: # move is a jump
-                    apply_move(board, move)
+                move = ponderer.get_move(board, turn, reached)
+                if move is None:
+                    stats = searchstats.SearchStats()
+                    move = ai.get_next_move(board, turn, stats = stats)
+                    if stats.depths:
+                        # a pondered move must be searched as deep
+                        reached = stats.depths[-1]['depth']
+                # the ai plays a packed move, it is only written out here
+                board.make_move(move)
                 
-                print("\t{:s} played {:s}.".format(turn, str(move)))
+                print("\t{:s} played {:s}.".format(turn, \
+                        str(movegen.to_notation(move, board.get_length()))))
                 turn = my_color # change the turn
                 continue
             # Get the command from user using input
-            command = input(prompt.format(turn)).strip().lower()
+            ponderer.start(board, turn, ai.get_table(opponent_color))
+            try:
+                command = input(prompt.format(turn)).strip().lower()
+            finally:
+                ponderer.stop()
             
             # Now decide on different commands
             if command == 'pass':
@@ -470,30 +485,26 @@ def game_play_ai():
                 if command and command[0] == 'move' and len(command) == 3:
                     if not captures:
                         action = (command[1], command[2])
-                        if action in moves:
-                            apply_move(board, action)
-                        else:
+                        if action not in moves:
                             raise RuntimeError(move_error)
                     else:
                         raise RuntimeError(hasjump_error)
                 elif command and command[0] == 'jump' and len(command) >= 3:
                     action = command[1:]
-                    if action in captures:
-                        apply_capture(board, action)
-                    else:
+                    if action not in captures:
                         raise RuntimeError(jump_error)
                 elif command and command[0] == 'apply' and len(command) == 2:
                     id_hint = int(command[1])
                     if moves and (1 <= id_hint <= len(moves)):
                         action = moves[id_hint - 1]
-                        apply_move(board, action)
                     elif captures and (1 <= id_hint <= len(captures)):
                         action = captures[id_hint - 1]
-                        apply_capture(board, action)
                     else:
                         raise ValueError(hint_error)
                 else:
                     raise RuntimeError(cmd_error + tools.usage)
+                # the action is a legal hint, it is played as a packed move
+                board.make_move(movegen.from_notation(board, action))
                 print("\t{:s} played {:s}.".format(turn, str(action)))
                 turn = my_color if turn == opponent_color else opponent_color
         except Exception as err:
@@ -516,8 +527,21 @@ def game_play_ai():
     # --- end of game play ai ---
 
 def main():
-    # game_play_human()
-    game_play_ai()
+    parser = argparse.ArgumentParser(description = "Plays checkers against" \
+                                     + " the AI.")
+    parser.add_argument('--workers', type = int, default = 1, \
+                        help = "the number of processes of the AI search")
+    args = parser.parse_args()
+    if args.workers > 1:
+        # the root actions are searched in parallel, see parallel.py
+        import parallel
+        ai.pool = parallel.ParallelSearch(args.workers)
+    try:
+        # game_play_human()
+        game_play_ai()
+    finally:
+        if ai.pool is not None:
+            ai.pool.shutdown()
 
 # main function, the program's entry point
 if __name__ == "__main__":
@@ -0,0 +1,267 @@
+import main
+import tools
+import bitboard
+"""
+This file implements the integer move representation used inside the
+engine. A square is the integer row * length + col, and a move (a simple
+move or a whole capture path) is packed into one integer:
+
+    bits 0-7:   the square the piece moves from
+    bits 8-15:  the square the piece ends on
+    bit 16:     set if a pawn is crowned during the move
+    bits 17-:   the mask of the captured squares (bit row * length + col)
+
+so a board may be at most 16x16. The move generator and the tree search
+only use packed moves; the string positions like 'c3' of the command line
+are made by to_notation() and parsed by from_notation(), at the edge.
+
+Two capture paths from the same square, over the same pieces and to the
+same square, lead to the same position, so they are the same packed move.
+"""
+
+def pack(frm, to, captured = 0, crowned = False):
+    """
+    Packs a move from its squares, the mask of its captured squares and its
+    crowning flag into one integer.
+    """
+    return frm | (to << 8) | ((1 << 16) if crowned else 0) | (captured << 17)
+
+def unpack(move):
+    """
+    Returns the tuple (frm, to, captured, crowned) of a packed move.
+    """
+    return (move & 0xff, (move >> 8) & 0xff, move >> 17, bool(move & 0x10000))
+
+def is_capture(move):
+    """
+    Returns True if the packed move captures at least one piece.
+    """
+    return move >> 17 != 0
+
+def count_captured(move):
+    """
+    Returns the number of pieces the packed move captures.
+    """
+    return bin(move >> 17).count('1')
+
+def to_path(move, length):
+    """
+    Returns the squares, as (row, col) tuples, the piece of a packed move
+    goes through. The jumps of a capture are found again from the captured
+    squares: every jump goes over one of them onto the square behind it.
+    """
+    (frm, to, captured, crowned) = unpack(move)
+    if not captured:
+        return [divmod(frm, length), divmod(to, length)]
+    stack = [(frm, captured, [divmod(frm, length)])]
+    while stack:
+        (square, left, path) = stack.pop()
+        if not left:
+            if square == to:
+                return path
+            continue
+        (row, col) = divmod(square, length)
+        for (x, y) in ((+1, -1), (+1, +1), (-1, -1), (-1, +1)):
+            (r2, c2) = (row + 2 * x, col + 2 * y)
+            mid = (row + x) * length + (col + y)
+            if 0 <= r2 < length and 0 <= c2 < length and (left >> mid) & 1:
+                stack.append((r2 * length + c2, left & ~(1 << mid), \
+                              path + [(r2, c2)]))
+    raise ValueError("The captured squares do not make a capture path.")
+
+def to_notation(move, length):
+    """
+    Returns a packed move as the command line writes it: a tuple of two
+    string positions for a simple move, a list of string positions for a
+    capture.
+    """
+    path = [main.deindexify(row, col) for (row, col) in to_path(move, length)]
+    return path if is_capture(move) else tuple(path)
+
+def from_notation(board, action):
+    """
+    Packs a move given in string positions, as a tuple or a list, for the
+    piece on the board. This does not check any validity condition.
+    """
+    length = board.get_length()
+    path = [main.indexify(position) for position in action]
+    (row, col) = path[0]
+    piece = board.get(row, col)
+    is_king = piece.is_king()
+    last = length - 1 if piece.is_black() else 0
+    captured = 0
+    crowned = False
+    for (row_to, col_to) in path[1:]:
+        if abs(row_to - row) == 2:
+            captured |= 1 << (((row + row_to) // 2) * length \
+                              + (col + col_to) // 2)
+        if not is_king and row_to == last:
+            is_king = crowned = True
+        (row, col) = (row_to, col_to)
+    return pack(path[0][0] * length + path[0][1], row * length + col, \
+                captured, crowned)
+
+def get_chains(board, row, col):
+    """
+    Returns the packed captures of the piece at row, col, found by
+    tools.iter_captures() without building the paths.
+    """
+    origin = row * board.get_length() + col
+    found = []
+    for (end, captured, crowned, trail) in \
+            tools.iter_captures(board, row, col):
+        move = pack(origin, end, captured, crowned)
+        if move not in found:
+            found.append(move)
+    return found
+
+def get_moves(board, color):
+    """
+    Returns the packed simple moves of the given color, piece by piece,
+    whether the color has a capture or not.
+    """
+    length = board.get_length()
+    steps = tools.get_tables(length)[0]
+    last = length - 1 if color == 'black' else 0
+    moves = []
+    for (row, col, piece) in board.get_pieces(color):
+        square = row * length + col
+        is_king = piece.is_king()
+        for (r, c, position) in steps[square][tools.piece_kind(piece)]:
+            if board.is_free(r, c):
+                moves.append(pack(square, r * length + c, 0, \
+                                  not is_king and r == last))
+    return moves
+
+def get_actions(board, color):
+    """
+    Returns a tuple (actions, ttype, terminal) for the given color to move:
+    the packed moves it may play, "jump" if they are captures or "move" if
+    they are simple moves, and True if there is no move at all. The pieces
+    are scanned once, and the simple moves are not generated any more once
+    a capture is found, since a capture must be played. The moves come in
+    the order of the board, piece by piece, like main.get_hints() gives them.
+    """
+    if isinstance(board, bitboard.BitBoard):
+        (moves, captures) = board.generate(color)
+    else:
+        length = board.get_length()
+        steps = tools.get_tables(length)[0]
+        last = length - 1 if color == 'black' else 0
+        moves = []
+        captures = []
+        for (row, col, piece) in board.get_pieces(color):
+            chains = get_chains(board, row, col)
+            if chains:
+                captures += chains
+            elif not captures:
+                square = row * length + col
+                is_king = piece.is_king()
+                for (r, c, position) in \
+                        steps[square][tools.piece_kind(piece)]:
+                    if board.is_free(r, c):
+                        moves.append(pack(square, r * length + c, 0, \
+                                          not is_king and r == last))
+    if captures:
+        return (captures, "jump", False)
+    return (moves, "move", not moves)
+
+def has_capture(board, color):
+    """
+    Returns True if the given color has a capture, i.e. a piece with a jump.
+    Stops at the first one found.
+    """
+    if isinstance(board, bitboard.BitBoard):
+        return bool(board.get_jumpers(color))
+    length = board.get_length()
+    jumps = tools.get_tables(length)[1]
+    opponent = board.get_squares('white' if color == 'black' else 'black')
+    occupied = board.get_squares()
+    for (row, col, piece) in board.get_pieces(color):
+        for (r_mid, c_mid, r, c, position) in \
+                jumps[row * length + col][tools.piece_kind(piece)]:
+            if (opponent >> (r_mid * length + c_mid)) & 1 \
+                    and not (occupied >> (r * length + c)) & 1:
+                return True
+    return False
+
+def has_move(board, color):
+    """
+    The "any legal move?" probe: returns True if the given color has any
+    move or capture. Stops at the first one found.
+    """
+    if isinstance(board, bitboard.BitBoard):
+        return bool(board.get_jumpers(color)) or board.has_moves(color)
+    length = board.get_length()
+    steps = tools.get_tables(length)[0]
+    occupied = board.get_squares()
+    for (row, col, piece) in board.get_pieces(color):
+        for (r, c, position) in \
+                steps[row * length + col][tools.piece_kind(piece)]:
+            if not (occupied >> (r * length + c)) & 1:
+                return True
+    return has_capture(board, color)
+
+def is_legal(board, color, move, capture = None):
+    """
+    Returns True if the packed move is a legal move of the given color, e.g.
+    a move found in a transposition table, which may come from another
+    position. A simple move is only legal if the color has no capture, the
+    capture flag tells it if it is already known.
+    """
+    length = board.get_length()
+    (frm, to, captured, crowned) = unpack(move)
+    if frm >= length * length or to >= length * length:
+        return False
+    (row, col) = divmod(frm, length)
+    piece = board.get(row, col)
+    if piece is None or piece.color() != color:
+        return False
+    if captured:
+        return move in get_chains(board, row, col)
+    if capture is None:
+        capture = has_capture(board, color)
+    if capture:
+        return False
+    last = length - 1 if color == 'black' else 0
+    for (r, c, position) in \
+            tools.get_tables(length)[0][frm][tools.piece_kind(piece)]:
+        if r * length + c == to:
+            return board.is_free(r, c) \
+                and move == pack(frm, to, 0, not piece.is_king() and r == last)
+    return False
+
+def iter_actions(board, color, first = None, order = None):
+    """
+    Yields the packed moves of the given color one by one, for a tree search
+    which may stop after the first one. The given first move (e.g. the best
+    move of a transposition table) is yielded before any other move is
+    generated, if it is legal. The other moves are generated and put in the
+    order of the ordering policy, a function order(actions, ttype) which
+    returns the given actions ordered (by default they come in the order of
+    the board), and then yielded. The policy needs all the moves, but
+    without one the captures are found piece by piece, as they are tried,
+    so a cutoff saves the capture search of the pieces after it.
+    """
+    capture = has_capture(board, color)
+    if first is not None and is_legal(board, color, first, capture):
+        yield first
+    if capture and order is None \
+            and not isinstance(board, bitboard.BitBoard):
+        # the list of the pieces is made before the board changes
+        for (row, col, piece) in board.get_pieces(color):
+            for a in get_chains(board, row, col):
+                if a != first:
+                    yield a
+        return
+    if capture:
+        (actions, ttype) = (get_actions(board, color)[0], "jump")
+    elif isinstance(board, bitboard.BitBoard):
+        (actions, ttype) = (board.generate(color)[0], "move")
+    else:
+        (actions, ttype) = (get_moves(board, color), "move")
+    if order is not None:
+        actions = order(actions, ttype)
+    for a in actions:
+        if a != first:
+            yield a
@@ -0,0 +1,220 @@
+from checkers import Board, PIECES, BLACK_PAWN, WHITE_PAWN
+from checkers import BLACK_KING, WHITE_KING
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the array functions need it
+    np = None
+"""
+This file implements two compact ways to write a position (a board and the
+color to move): a text notation like the FEN of the PDN standard, and a
+fixed-size binary record, with bulk conversions to and from NumPy arrays.
+
+The dark squares are numbered from 1, row by row from row 'a', so on an
+8x8 board the black pieces of main.initialize() stand on 1 to 12 and the
+white pieces on 21 to 32, like in the English draughts notation. The text
+notation gives the color to move, then the squares of the white and of the
+black pieces, a king being marked by a 'K':
+
+    B:W21,22,23,24,25,26,27,28,29,30,31,32:B1,2,3,4,5,6,7,8,9,10,11,12
+
+(a range like 1-12 is accepted when it is read). The binary record is three
+bit masks of the dark squares, bit i for square i + 1: the black pieces,
+the white pieces and the kings, each one in (squares + 7) // 8 bytes, little
+endian, followed by one byte for the color to move (0 for black, 1 for
+white). On an 8x8 board that is 3 x 32 bits and a byte, 13 bytes. Both
+forms are hashable, and equal for equal positions.
+
+The arrays are (batch, N, N) int8 arrays of piece codes, as batch.py uses
+them, with an array of the colors to move (0 or 1), so the records of a
+dataset can be scored by batch.heuristics() without building any Board.
+"""
+
+_tables = {}
+
+def get_tables(length):
+    """
+    Returns the (cached) tuple (squares, numbers) of a board length, where
+    squares is the list of the (row, col) tuples of the dark squares in the
+    order of their numbers, and numbers maps a row * length + col square
+    index to its number less one.
+    """
+    tables = _tables.get(length)
+    if tables is None:
+        squares = [(r, c) for r in range(length) for c in range(length) \
+                       if (r + c) % 2 == 1]
+        numbers = {r * length + c: i for (i, (r, c)) in enumerate(squares)}
+        tables = (squares, numbers)
+        _tables[length] = tables
+    return tables
+
+def record_size(length):
+    """
+    Returns the number of bytes of a binary record on a board of the given
+    length.
+    """
+    return 3 * mask_size(length) + 1
+
+def mask_size(length):
+    """
+    Returns the number of bytes of one mask of a binary record.
+    """
+    return (length * length // 2 + 7) // 8
+
+def to_fen(board, turn):
+    """
+    Returns the text notation of a position.
+    """
+    length = board.get_length()
+    numbers = get_tables(length)[1]
+    white = []
+    black = []
+    for (row, col, piece) in board.get_pieces():
+        square = ('K' if piece.is_king() else '') \
+                     + str(numbers[row * length + col] + 1)
+        (black if piece.is_black() else white).append(square)
+    return "{:s}:W{:s}:B{:s}".format('B' if turn == 'black' else 'W', \
+                                     ','.join(white), ','.join(black))
+
+def from_fen(text, length = 8, board = None):
+    """
+    Reads the text notation of a position, and returns the tuple (board,
+    turn). The pieces are placed on the given board (e.g. a BitBoard), which
+    must be empty, or on a new Board of the given length.
+    """
+    if board is None:
+        board = Board(length)
+    length = board.get_length()
+    squares = get_tables(length)[0]
+    fields = text.strip().rstrip('.').split(':')
+    if len(fields) != 3 or fields[0].upper() not in ('B', 'W'):
+        raise ValueError("Invalid position: " + text)
+    turn = 'black' if fields[0].upper() == 'B' else 'white'
+    for field in fields[1:]:
+        color = field[:1].upper()
+        if color not in ('B', 'W'):
+            raise ValueError("Invalid position: " + text)
+        for item in field[1:].split(','):
+            item = item.strip()
+            if not item:
+                continue
+            is_king = item[0].upper() == 'K'
+            if is_king:
+                item = item[1:]
+            (first, sep, last) = item.partition('-')
+            for number in range(int(first), int(last or first) + 1):
+                if not 1 <= number <= len(squares):
+                    raise ValueError("Invalid square: " + str(number))
+                code = (BLACK_PAWN if color == 'B' else WHITE_PAWN) \
+                           + (2 if is_king else 0)
+                (row, col) = squares[number - 1]
+                board.place(row, col, PIECES[code])
+    return (board, turn)
+
+def encode(board, turn):
+    """
+    Returns the binary record of a position as bytes.
+    """
+    length = board.get_length()
+    numbers = get_tables(length)[1]
+    black = white = kings = 0
+    for (row, col, piece) in board.get_pieces():
+        bit = 1 << numbers[row * length + col]
+        if piece.is_black():
+            black |= bit
+        else:
+            white |= bit
+        if piece.is_king():
+            kings |= bit
+    size = mask_size(length)
+    return black.to_bytes(size, 'little') + white.to_bytes(size, 'little') \
+               + kings.to_bytes(size, 'little') \
+               + (b'\x00' if turn == 'black' else b'\x01')
+
+def decode(record, length = 8, board = None):
+    """
+    Reads a binary record, and returns the tuple (board, turn). The pieces
+    are placed on the given board, which must be empty, or on a new Board
+    of the given length.
+    """
+    if board is None:
+        board = Board(length)
+    length = board.get_length()
+    squares = get_tables(length)[0]
+    size = mask_size(length)
+    if len(record) != 3 * size + 1:
+        raise ValueError("A record of a {:d}x{:d} board has {:d} bytes." \
+                         .format(length, length, 3 * size + 1))
+    black = int.from_bytes(record[:size], 'little')
+    white = int.from_bytes(record[size:2 * size], 'little')
+    kings = int.from_bytes(record[2 * size:3 * size], 'little')
+    occupied = black | white
+    while occupied:
+        low = occupied & -occupied
+        (row, col) = squares[low.bit_length() - 1]
+        code = (BLACK_PAWN if black & low else WHITE_PAWN) \
+                   + (2 if kings & low else 0)
+        board.place(row, col, PIECES[code])
+        occupied ^= low
+    return (board, 'black' if record[3 * size] == 0 else 'white')
+
+def encode_many(positions):
+    """
+    Returns the binary records of the given (board, turn) tuples, one after
+    the other, as bytes.
+    """
+    return b''.join(encode(board, turn) for (board, turn) in positions)
+
+def decode_many(data, length = 8):
+    """
+    Yields the (board, turn) tuples of the binary records of the given
+    bytes, one by one.
+    """
+    size = record_size(length)
+    view = memoryview(data)
+    for start in range(0, len(view) - size + 1, size):
+        yield decode(view[start:start + size], length)
+
+def to_arrays(data, length = 8):
+    """
+    Returns the tuple (positions, turns) of the binary records of the given
+    bytes, where positions is a (batch, N, N) int8 array of piece codes and
+    turns a (batch,) uint8 array (0 for black, 1 for white).
+    """
+    if np is None:
+        raise ImportError("The array conversions need NumPy.")
+    (squares, numbers) = get_tables(length)
+    size = mask_size(length)
+    records = np.frombuffer(data, dtype = np.uint8) \
+                  .reshape(-1, 3 * size + 1)
+    bits = [np.unpackbits(records[:, i * size:(i + 1) * size], axis = 1, \
+                          bitorder = 'little')[:, :len(squares)] \
+                for i in range(3)]
+    codes = bits[0] * BLACK_PAWN + bits[1] * WHITE_PAWN + bits[2] * 2
+    positions = np.zeros((len(records), length * length), dtype = np.int8)
+    positions[:, [r * length + c for (r, c) in squares]] = codes
+    return (positions.reshape(-1, length, length), records[:, -1].copy())
+
+def from_arrays(positions, turns):
+    """
+    Returns the binary records, as bytes, of a (batch, N, N) array of piece
+    codes and an array of the colors to move (0 or 1, or 'black' and
+    'white').
+    """
+    if np is None:
+        raise ImportError("The array conversions need NumPy.")
+    positions = np.asarray(positions, dtype = np.int8)
+    length = positions.shape[1]
+    squares = get_tables(length)[0]
+    flat = positions.reshape(len(positions), length * length) \
+               [:, [r * length + c for (r, c) in squares]]
+    black = (flat == BLACK_PAWN) | (flat == BLACK_KING)
+    white = (flat == WHITE_PAWN) | (flat == WHITE_KING)
+    kings = flat >= BLACK_KING
+    size = mask_size(length)
+    masks = [np.packbits(m, axis = 1, bitorder = 'little')[:, :size] \
+                 for m in (black, white, kings)]
+    turns = np.asarray(turns)
+    if turns.dtype.kind in 'US':
+        turns = turns == 'white'
+    turns = turns.astype(np.uint8).reshape(-1, 1)
+    return np.concatenate(masks + [turns], axis = 1).tobytes()
@@ -0,0 +1,98 @@
+import movegen
+"""
+This file implements the move ordering of the alpha-beta tree search in
+gameai. Alpha-beta prunes the most when the best action of a node is tried
+first, so the actions of a node are tried in this order:
+    a. the hash move, i.e. the best move stored in the transposition table
+        or the move of the previous principal variation,
+    b. the captures, the ones taking the most pieces first,
+    c. the killer moves of the ply, i.e. the simple moves which caused a
+        cutoff at the same ply in a sibling node,
+    d. the other simple moves, by their history score. The history score of
+        a move grows every time it causes a cutoff, more so when the cutoff
+        is found high in the tree.
+Among the actions with the same rank, the original order is kept.
+"""
+
+class MoveOrderer(object):
+    """
+    This class encapsulates the move ordering state of a search: the killer
+    moves of every ply and the history table. It also counts the cutoffs, and
+    how many of them were caused by the first action tried, which tells how
+    good the ordering is (the closer to 1.0, the better).
+    """
+
+    # the number of killer moves kept for every ply
+    KILLERS = 2
+
+    def __init__(self):
+        """
+        Starts with no killer move and an empty history table.
+        """
+        self.killers = []
+        self.history = {}
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+
+    def order(self, actions, ttype, ply):
+        """
+        Returns the actions of a node at the given ply, ordered. The hash
+        move is put first by the search itself (see movegen.iter_actions()).
+        """
+        self.nodes += 1
+        killers = self.killers[ply] if ply < len(self.killers) else []
+        history = self.history
+
+        def rank(a):
+            if ttype == "jump":
+                return (0, -movegen.count_captured(a))
+            if a in killers:
+                return (1, killers.index(a))
+            return (2, -history.get(a & 0xffff, 0))
+
+        return sorted(actions, key = rank)
+
+    def cutoff(self, action, ttype, ply, depth, index):
+        """
+        Records that the given action, tried in the given index, caused a
+        cutoff at the given ply with the given remaining depth.
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_cutoffs += 1
+        if ttype == "jump":
+            return
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[self.KILLERS:]
+        key = action & 0xffff  # the from and to squares
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+    def new_search(self):
+        """
+        Forgets the killer moves and ages the history table, so the next
+        search prefers what it finds itself.
+        """
+        self.killers = []
+        for key in list(self.history):
+            self.history[key] //= 2
+            if not self.history[key]:
+                del self.history[key]
+
+    def first_cutoff_rate(self):
+        """
+        Returns the ratio of the cutoffs caused by the first action tried.
+        """
+        return self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def report(self):
+        """
+        Returns the counters as a dictionary.
+        """
+        return {'nodes': self.nodes, 'cutoffs': self.cutoffs, \
+                'first_cutoffs': self.first_cutoffs, \
+                'first_cutoff_rate': self.first_cutoff_rate()}
@@ -0,0 +1,219 @@
+import time
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import evaluation
+import ordering
+import gameai as ai
+import movegen
+"""
+This file implements a parallel root search over a process pool. The root
+actions are searched with the "Young Brothers Wait" rule: the first action
+(the eldest brother) is searched alone in this process, which gives a good
+alpha bound, then all the other actions are searched at the same time by
+the worker processes.
+
+The best score found so far is shared with the workers through a shared
+memory value. A worker reads it when it starts an action, so the later
+actions are searched with a tighter alpha-beta window and get cut off
+sooner. An action which cannot beat the shared alpha fails low and only
+returns a bound, and an action which can beat it returns its exact score,
+so the best action and its score are always the same as the serial search
+(alphabeta_search or minimax_search) returns, ties going to the first one.
+
+Every search running on a pool has its own shared value: the pool keeps a
+shared array of them, and a search takes a free slot of the array for its
+whole length, so searches from several threads do not mix their bounds.
+When all the slots are taken, a search waits for one.
+
+get_next_move() of gameai searches with a pool when one is set, e.g.
+    gameai.pool = parallel.ParallelSearch(4)
+with iterative deepening under its time budget, see deepen().
+"""
+
+_shared_alphas = None
+
+def _init_worker(shared_alphas):
+    """
+    Keeps the shared alpha values in the worker process.
+    """
+    global _shared_alphas
+    _shared_alphas = shared_alphas
+
+def _search_action(board, turn, action, maxdepth, alphabeta, slot, \
+                   deadline):
+    """
+    Scores one root action in a worker process, or returns None if the
+    deadline is passed. The window is opened just below the shared alpha
+    of the slot of the search, so an action with the same score as the
+    best one so far still gets its exact score and the tie is broken as in
+    the serial search.
+    """
+    state = (board, turn, 0)
+    if not alphabeta:
+        context = ai.SearchContext(deadline = deadline)
+        (child, undo) = ai.transition(state, action)
+        try:
+            return ai.minvalue(child, maxdepth, context = context)
+        except ai.SearchTimeout:
+            return None
+    context = ai.SearchContext(deadline = deadline, \
+                    orderer = ordering.MoveOrderer(), \
+                    evaluator = evaluation.IncrementalEvaluator(board))
+    (child, undo) = ai.transition(state, action, context)
+    alpha = _shared_alphas[slot]
+    try:
+        score = ai.minvalue(child, maxdepth, \
+                            math.nextafter(alpha, -math.inf), math.inf, \
+                            context)
+    except ai.SearchTimeout:
+        return None
+    with _shared_alphas.get_lock():
+        if score > _shared_alphas[slot]:
+            _shared_alphas[slot] = score
+    return score
+
+class ParallelSearch(object):
+    """
+    This class encapsulates a pool of worker processes for the root search.
+    The pool is kept from one search to the next, so the processes are only
+    started once. Up to slots searches may run on it at the same time. It
+    can be used as a context manager, which shuts the pool down at the end.
+    """
+
+    def __init__(self, workers = None, slots = 8):
+        """
+        Starts the given number of worker processes, by default as many as
+        there are processors.
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self._alphas = multiprocessing.Array('d', [-math.inf] * slots)
+        self._free = list(range(slots))
+        self._slots = threading.Condition()
+        self._executor = ProcessPoolExecutor(self.workers, \
+                                             initializer = _init_worker, \
+                                             initargs = (self._alphas,))
+
+    def _take_slot(self):
+        """
+        Returns a free slot of the shared alphas, once there is one.
+        """
+        with self._slots:
+            while not self._free:
+                self._slots.wait()
+            return self._free.pop()
+
+    def _give_slot(self, slot):
+        """
+        Gives a slot back.
+        """
+        with self._slots:
+            self._free.append(slot)
+            self._slots.notify()
+
+    def search(self, state, maxdepth, alphabeta = True, deadline = None, \
+               first = None):
+        """
+        The depth limited parallel tree search. Returns the best (action,
+        value) tuple like alphabeta_search(), or minimax_search() if
+        alphabeta is False. The given first action (e.g. the best one of a
+        shallower search) is the eldest brother. Raises gameai.SearchTimeout
+        if the deadline (a time.time() value) is passed.
+        """
+        board = state[0]
+        turn = state[1]
+        (actions, ttype, terminal) = movegen.get_actions(board, turn)
+        if terminal:
+            return ("pass", -1)
+        actions = ai.order(actions, first)
+        slot = self._take_slot()
+        try:
+            if alphabeta:
+                # the eldest brother is searched first, alone
+                with self._alphas.get_lock():
+                    self._alphas[slot] = -math.inf
+                context = ai.SearchContext(deadline = deadline, \
+                        orderer = ordering.MoveOrderer(), \
+                        evaluator = evaluation.IncrementalEvaluator(board))
+                (child, undo) = ai.transition(state, actions[0], context)
+                try:
+                    eldest = ai.minvalue(child, maxdepth, -math.inf, \
+                                         math.inf, context)
+                finally:
+                    ai.revert(state, undo, context)
+                with self._alphas.get_lock():
+                    self._alphas[slot] = eldest
+                scores = [eldest]
+                rest = actions[1:]
+            else:
+                scores = []
+                rest = actions
+            futures = [self._executor.submit(_search_action, board, turn, \
+                                             a, maxdepth, alphabeta, slot, \
+                                             deadline) \
+                           for a in rest]
+            scores += [f.result() for f in futures]
+        finally:
+            self._give_slot(slot)
+        if None in scores:
+            raise ai.SearchTimeout()
+        return max(zip(actions, scores), key = lambda v: v[1])
+
+    def deepen(self, state, seconds = None, maxdepth = 64, stats = None):
+        """
+        The parallel iterative deepening search: searches to depth 1, 2, 3,
+        ... until the time budget (in seconds) runs out or maxdepth is
+        reached, and returns the (action, value) tuple of the last completed
+        depth, like gameai.iterative_deepening() without a table. The best
+        action of every depth is the eldest brother of the next one. The
+        given statistics (see searchstats.SearchStats), if any, get the
+        move, the score and the time of every completed depth.
+        """
+        board = state[0]
+        turn = state[1]
+        start = time.time()
+        deadline = start + seconds if seconds is not None else None
+        (actions, ttype, terminal) = movegen.get_actions(board, turn)
+        if terminal:
+            best = ("pass", -1)
+        elif len(actions) == 1:
+            best = (actions[0], ai.utility(state, turn))
+        else:
+            best = (actions[0], None)
+            for depth in range(1, maxdepth + 1):
+                started = time.time()
+                try:
+                    best = self.search(state, depth, deadline = deadline, \
+                                       first = best[0])
+                except ai.SearchTimeout:
+                    break
+                if stats is not None:
+                    stats.complete_depth(depth, time.time() - started, 0, \
+                                         best[0], best[1])
+        if stats is not None:
+            (stats.move, stats.score) = best
+            stats.pv = [best[0]] if best[0] != "pass" else []
+            stats.seconds = time.time() - start
+        return best
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+def parallel_search(state, maxdepth, workers = None, alphabeta = True):
+    """
+    Runs one parallel search with a pool of the given number of workers.
+    To run many searches, keep a ParallelSearch instead, so the worker
+    processes are not started again for every search.
+    """
+    with ParallelSearch(workers) as search:
+        return search.search(state, maxdepth, alphabeta)
@@ -0,0 +1,334 @@
+import re
+import sys
+import gzip
+import argparse
+import main
+import movegen
+import notation
+from checkers import Board
+"""
+This file implements the reading and the writing of game records in PDN
+(Portable Draughts Notation) as a pipeline of generators, so archives of
+millions of games are read in constant memory, one game at a time:
+
+    games = read_games(open_pdn('archive.pdn.gz'))
+    for (position, move, result) in iter_positions(games):
+        ...
+
+A game is a set of tag pairs, e.g. [Event "..."], [Result "1-0"] or
+[FEN "B:W21,...:B1,..."] for a game which does not start from the starting
+position, followed by the moves and the result. The squares are the
+numbers of the dark squares from 1 to 32 (see notation), a simple move is
+written "11-15" and a capture "15x24", or "15x24x31" with the squares it
+goes through. A capture written with its two ends only is found among the
+legal captures. Comments {...}, variations (...), move numbers, NAGs like
+$1 and the marks like "!" or "?" are skipped. The result is written from
+the color which moves first (black): "1-0" is a win of black, "0-1" a win
+of white, "1/2-1/2" a draw and "*" an unknown result.
+
+Every game is replayed with packed moves (see movegen) on a board, by
+default a checkers.Board, and the positions are given as the binary
+records of notation (notation.decode() makes them a board again), so a
+position stays valid when the game goes on. A game with an illegal move
+is skipped, or raises ValueError.
+
+The games can be written back with comments on their moves, e.g. the
+evaluations of the engine, see write_game() and annotate().
+
+Run "python pdn.py games.pdn.gz" to count the games and the positions of
+a file.
+"""
+
+# The results, from the color which moves first.
+RESULTS = {'1-0': 'black', '2-0': 'black', '0-1': 'white', '0-2': 'white', \
+           '1/2-1/2': 'draw', '1-1': 'draw', '*': None}
+
+_MOVE = re.compile(r'^(\d+)([-x]\d+)+$')
+_TAG = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]$')
+
+class Game(object):
+    """
+    This class encapsulates one game record: the tag pairs (a dictionary),
+    the moves as they are written in the file, the result token, and the
+    comments by move (a dictionary from the index of a move to its text,
+    where -1 is the comment before the first move).
+    """
+
+    def __init__(self, tags = None, moves = None, result = '*', \
+                 comments = None):
+        self.tags = tags if tags is not None else {}
+        self.moves = moves if moves is not None else []
+        self.result = result
+        self.comments = comments if comments is not None else {}
+
+    def get_result(self):
+        """
+        Returns the winner ('black', 'white' or 'draw') of the game, or None
+        if it is not known. The result tag is used if the moves are not
+        followed by a result.
+        """
+        result = self.result
+        if result == '*':
+            result = self.tags.get('Result', '*')
+        return RESULTS.get(result)
+
+def open_pdn(path):
+    """
+    Opens a PDN file for reading as text, whether it is compressed by gzip
+    or not ('-' is the standard input).
+    """
+    if path == '-':
+        return sys.stdin
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt', encoding = 'utf-8', errors = 'replace')
+    return open(path, 'r', encoding = 'utf-8', errors = 'replace')
+
+def read_games(lines):
+    """
+    Yields the games of the given lines (e.g. an open file) one by one.
+    Only the game being read is kept in memory.
+    """
+    game = Game()
+    started = False  # True once the game has a tag or a move
+    depth = 0  # the depth of the variations being skipped
+    comment = None  # the text of the comment being read, if any
+    for line in lines:
+        line = line.strip()
+        if comment is None and depth == 0 and line.startswith('['):
+            match = _TAG.match(line)
+            if match:
+                if game.moves or game.result != '*':
+                    yield game
+                    game = Game()
+                game.tags[match.group(1)] = match.group(2).replace('\\"', '"')
+                started = True
+                continue
+        if comment is None and depth == 0 and line.startswith('%'):
+            continue  # an escaped line
+        i = 0
+        while i < len(line):
+            if comment is not None:
+                end = line.find('}', i)
+                if end < 0:
+                    comment.append(line[i:])
+                    break
+                comment.append(line[i:end])
+                if depth == 0:
+                    text = ' '.join(s for s in comment if s).strip()
+                    index = len(game.moves) - 1
+                    if index in game.comments:
+                        text = game.comments[index] + ' ' + text
+                    game.comments[index] = text
+                comment = None
+                i = end + 1
+                continue
+            char = line[i]
+            if char == '{':
+                comment = []
+                i += 1
+            elif char == '(':
+                depth += 1
+                i += 1
+            elif char == ')':
+                depth = max(depth - 1, 0)
+                i += 1
+            elif char.isspace():
+                i += 1
+            else:
+                end = i
+                while end < len(line) and not line[end].isspace() \
+                        and line[end] not in '{}()':
+                    end += 1
+                token = line[i:end]
+                i = end
+                if depth > 0:
+                    continue
+                if token in RESULTS:
+                    game.result = token
+                    yield game
+                    game = Game()
+                    started = False
+                    continue
+                token = token.rstrip('!?')
+                if _MOVE.match(token):
+                    game.moves.append(token)
+                    started = True
+                elif '.' in token:
+                    # a move number, maybe glued to its move like "1.11-15"
+                    move = token.rsplit('.', 1)[1].rstrip('!?')
+                    if _MOVE.match(move):
+                        game.moves.append(move)
+                        started = True
+        if comment is not None:
+            comment.append('')
+    if started and (game.moves or game.tags):
+        yield game
+
+def get_start(game, length = 8, board_class = Board):
+    """
+    Returns the tuple (board, turn) of the position a game starts from: its
+    FEN tag, or else the starting position of main.initialize().
+    """
+    board = board_class(length)
+    fen = game.tags.get('FEN')
+    if fen:
+        return notation.from_fen(fen, length, board)
+    main.initialize(board)
+    return (board, 'black')
+
+def find_move(board, turn, text):
+    """
+    Returns the legal packed move of the given color written as text (e.g.
+    "11-15" or "15x24x31"), or raises ValueError if there is none. A
+    capture only needs its two ends, its other squares must match if they
+    are written.
+    """
+    length = board.get_length()
+    squares = notation.get_tables(length)[0]
+    numbers = [int(n) for n in re.split('[-x]', text)]
+    for n in numbers:
+        if not 1 <= n <= len(squares):
+            raise ValueError("Invalid square in move: " + text)
+    path = [squares[n - 1] for n in numbers]
+    (actions, ttype, terminal) = movegen.get_actions(board, turn)
+    for a in actions:
+        found = movegen.to_path(a, length)
+        if found[0] != path[0] or found[-1] != path[-1]:
+            continue
+        # the written squares must come in the order of the path
+        i = 0
+        for square in found:
+            if i < len(path) and square == path[i]:
+                i += 1
+        if i == len(path):
+            return a
+    raise ValueError("Illegal move for {:s}: {:s}".format(turn, text))
+
+def write_move(move, length = 8):
+    """
+    Returns a packed move written as in PDN, with all the squares of a
+    capture.
+    """
+    numbers = notation.get_tables(length)[1]
+    path = [str(numbers[r * length + c] + 1) \
+                for (r, c) in movegen.to_path(move, length)]
+    return ('x' if movegen.is_capture(move) else '-').join(path)
+
+def replay(game, length = 8, board_class = Board):
+    """
+    Yields the tuple (position, move, result) of every move of a game,
+    where position is the binary record (see notation.encode()) of the
+    position before the packed move, and result is the winner of the game.
+    Raises ValueError at the first illegal move.
+    """
+    (board, turn) = get_start(game, length, board_class)
+    result = game.get_result()
+    for text in game.moves:
+        move = find_move(board, turn, text)
+        yield (notation.encode(board, turn), move, result)
+        board.make_move(move)
+        turn = 'white' if turn == 'black' else 'black'
+
+def iter_positions(games, length = 8, board_class = Board, strict = False):
+    """
+    Yields the (position, move, result) tuples of all the moves of all the
+    given games (see replay()). A game with an illegal move is skipped
+    after the moves before it, unless strict is True, then ValueError is
+    raised.
+    """
+    for game in games:
+        try:
+            for item in replay(game, length, board_class):
+                yield item
+        except ValueError:
+            if strict:
+                raise
+
+def write_game(f, game, comments = None, width = 79):
+    """
+    Writes a game to the file f in PDN: its tags, its moves with their
+    comments (the comments of the game, or the given dictionary from the
+    index of a move to a text) and its result, the lines being at most
+    width characters long (a longer comment makes a longer line).
+    """
+    if comments is None:
+        comments = game.comments
+    tags = dict(game.tags)
+    if game.result != '*' or 'Result' not in tags:
+        tags['Result'] = game.result
+    for (name, value) in tags.items():
+        f.write('[{:s} "{:s}"]\n'.format(name, str(value).replace('"', \
+                                                                  '\\"')))
+    tokens = []
+    if -1 in comments:
+        tokens.append('{' + comments[-1] + '}')
+    # a game from a FEN position may start with a move of white
+    first = 1 if game.tags.get('FEN', 'B')[:1].upper() == 'W' else 0
+    for (i, move) in enumerate(game.moves):
+        if (i + first) % 2 == 0:
+            tokens.append('{:d}.'.format((i + first) // 2 + 1))
+        elif i == 0:
+            tokens.append('1...')
+        tokens.append(move)
+        if i in comments:
+            tokens.append('{' + str(comments[i]).replace('}', ')') + '}')
+    tokens.append(game.result)
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            f.write(line + '\n')
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    f.write(line + '\n\n')
+
+def annotate(games, comment, length = 8, board_class = Board):
+    """
+    Yields the given games with a comment on every move: comment(board,
+    turn, move) returns the text for the packed move played by the color
+    to move on the board (e.g. the score of the engine), or None for no
+    comment. The board must not be changed. A game with an illegal move is
+    yielded with the comments of the moves before it.
+    """
+    for game in games:
+        (board, turn) = get_start(game, length, board_class)
+        comments = {}
+        for (i, text) in enumerate(game.moves):
+            try:
+                move = find_move(board, turn, text)
+            except ValueError:
+                break
+            note = comment(board, turn, move)
+            if note is not None:
+                comments[i] = note
+            board.make_move(move)
+            turn = 'white' if turn == 'black' else 'black'
+        yield Game(game.tags, game.moves, game.result, comments)
+
+def _main():
+    parser = argparse.ArgumentParser(description = "Reads PDN games and" \
+                                     + " counts their positions.")
+    parser.add_argument('path', help = "a PDN file, maybe gzipped, or -")
+    parser.add_argument('--strict', action = 'store_true')
+    args = parser.parse_args()
+    counts = {'black': 0, 'white': 0, 'draw': 0, None: 0}
+    games = 0
+    positions = 0
+    with open_pdn(args.path) as f:
+        for game in read_games(f):
+            games += 1
+            counts[game.get_result()] += 1
+            try:
+                for item in replay(game):
+                    positions += 1
+            except ValueError as err:
+                if args.strict:
+                    raise
+                sys.stderr.write("game {:d}: {:s}\n".format(games, str(err)))
+    print("{:d} games, {:d} positions, results: {:s}".format(games, \
+            positions, str(counts)))
+
+if __name__ == '__main__':
+    _main()
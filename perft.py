@@ -0,0 +1,189 @@
+import sys
+import copy
+import time
+import argparse
+import main
+import movegen
+import bitboard
+from checkers import Board, PIECES
+"""
+This file implements perft: the number of leaf nodes of the game tree to a
+given depth, counted by playing every legal move. It is both a benchmark of
+the move generator (the nodes per second) and a correctness check of it,
+since any missing or extra move changes the counts, which are compared with
+known reference counts.
+
+Three backends generate and play the moves:
+
+    board:      checkers.Board with the packed moves of movegen
+    bitboard:   bitboard.BitBoard with the packed moves of movegen
+    hints:      checkers.Board with main.get_hints() and apply_move() /
+                apply_capture() on a copy of the board, i.e. the string
+                moves of the command line
+
+A capture counts once for every distinct set of captured pieces and end
+square (see movegen), i.e. two jump paths over the same pieces to the same
+square are one move, like the perft counts of English draughts.
+
+The divide mode prints the count below every root move, which finds the
+move where two backends (or a backend and the reference) disagree.
+
+Run "python perft.py --depth 7" to count and time the starting position
+with every backend, or "python perft.py --depth 5 --divide" for the divide
+mode.
+"""
+
+# The reference counts of the 8x8 starting position, black to move, by
+# depth (index 0 is depth 0).
+REFERENCE = (1, 7, 49, 302, 1469, 7361, 36768, 179740, 845931, 3963680, \
+             18391564)
+
+BACKENDS = ('board', 'bitboard', 'hints')
+
+def get_positions(length = 8):
+    """
+    Returns the standard positions of the suite as a list of (name, cells,
+    turn) tuples, where cells is a list of (row, col, code) tuples. Only the
+    starting position has reference counts.
+    """
+    board = Board(length)
+    main.initialize(board)
+    positions = [('start', [(r, c, p.code()) for (r, c, p) \
+                            in board.get_pieces()], 'black')]
+    # a position where the first captures come after two plies
+    for move in (('c2', 'd1'), ('f3', 'e2')):
+        main.apply_move(board, move)
+    positions.append(('exchange', [(r, c, p.code()) for (r, c, p) \
+                                   in board.get_pieces()], 'black'))
+    # kings only: long moves in every direction and multi-jumps
+    positions.append(('kings', [(1, 2, 3), (2, 5, 3), (6, 3, 3), \
+                                (3, 4, 4), (4, 3, 4), (5, 6, 4), \
+                                (3, 2, 4)], 'black'))
+    return positions
+
+def make_board(cells, backend = 'board', length = 8):
+    """
+    Returns a board of the given backend with the pieces of the given list
+    of (row, col, code) tuples.
+    """
+    board = bitboard.BitBoard(length) if backend == 'bitboard' \
+                else Board(length)
+    for (row, col, code) in cells:
+        board.place(row, col, PIECES[code])
+    return board
+
+def perft(board, turn, depth, backend = 'board'):
+    """
+    Returns the number of leaf nodes of the game tree of the given depth
+    below the position. A position where the game is over before the depth
+    is reached has no move, so it contributes 0 (not 1), like in the
+    reference counts.
+    """
+    if depth == 0:
+        return 1
+    other = 'white' if turn == 'black' else 'black'
+    if backend == 'hints':
+        (moves, captures) = main.get_hints(board, turn)
+        if depth == 1:
+            return len(moves) + len(captures)
+        nodes = 0
+        for move in moves:
+            child = copy.deepcopy(board)
+            main.apply_move(child, move)
+            nodes += perft(child, other, depth - 1, backend)
+        for capture in captures:
+            child = copy.deepcopy(board)
+            main.apply_capture(child, capture)
+            nodes += perft(child, other, depth - 1, backend)
+        return nodes
+    actions = movegen.get_actions(board, turn)[0]
+    if depth == 1:
+        return len(actions)
+    nodes = 0
+    for a in actions:
+        undo = board.make_move(a)
+        nodes += perft(board, other, depth - 1, backend)
+        board.unmake_move(undo)
+    return nodes
+
+def divide(board, turn, depth, backend = 'board'):
+    """
+    Returns the list of (move, nodes) tuples of every root move, where move
+    is written with string positions and nodes is the perft count of depth
+    - 1 below it.
+    """
+    length = board.get_length()
+    other = 'white' if turn == 'black' else 'black'
+    result = []
+    if backend == 'hints':
+        (moves, captures) = main.get_hints(board, turn)
+        for action in moves + captures:
+            child = copy.deepcopy(board)
+            if isinstance(action, tuple):
+                main.apply_move(child, action)
+            else:
+                main.apply_capture(child, action)
+            result.append((action, perft(child, other, depth - 1, backend)))
+        return result
+    for a in movegen.get_actions(board, turn)[0]:
+        undo = board.make_move(a)
+        result.append((movegen.to_notation(a, length), \
+                       perft(board, other, depth - 1, backend)))
+        board.unmake_move(undo)
+    return result
+
+def run(board, turn, depth, backend = 'board'):
+    """
+    Returns the tuple (nodes, seconds, nodes per second) of a perft run.
+    """
+    start = time.perf_counter()
+    nodes = perft(board, turn, depth, backend)
+    seconds = time.perf_counter() - start
+    return (nodes, seconds, nodes / seconds if seconds > 0 else 0.0)
+
+def _main():
+    parser = argparse.ArgumentParser(description = "Counts and times the" \
+                                     + " leaf nodes of the move generator.")
+    parser.add_argument('--depth', type = int, default = 6)
+    parser.add_argument('--backend', choices = BACKENDS, action = 'append', \
+                        help = "the backends to compare (all by default)")
+    parser.add_argument('--position', default = 'start', \
+                        help = "one of the positions of the suite, or all")
+    parser.add_argument('--divide', action = 'store_true')
+    args = parser.parse_args()
+    backends = args.backend or list(BACKENDS)
+    failed = False
+    for (name, cells, turn) in get_positions():
+        if args.position not in ('all', name):
+            continue
+        counts = {}
+        for backend in backends:
+            board = make_board(cells, backend)
+            if args.divide:
+                total = 0
+                print("{:s} {:s} divide {:d}:".format(name, backend, \
+                                                      args.depth))
+                for (move, nodes) in divide(board, turn, args.depth, backend):
+                    print("  {:s}: {:d}".format(str(move), nodes))
+                    total += nodes
+                print("  total: {:d}".format(total))
+                counts[backend] = total
+                continue
+            (nodes, seconds, speed) = run(board, turn, args.depth, backend)
+            counts[backend] = nodes
+            print("{:s} {:s} depth {:d}: {:d} nodes in {:.3f} s," \
+                  " {:.0f} nodes/s".format(name, backend, args.depth, nodes, \
+                                           seconds, speed))
+        expected = REFERENCE[args.depth] \
+                       if name == 'start' and args.depth < len(REFERENCE) \
+                       else None
+        if len(set(counts.values())) > 1 \
+                or (expected is not None and \
+                        any(n != expected for n in counts.values())):
+            print("{:s}: MISMATCH {:s} (reference {:s})".format(name, \
+                    str(counts), str(expected)))
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,150 @@
+import copy
+import threading
+import movegen
+import gameai as ai
+import ordering
+import evaluation
+import transposition
+"""
+This file implements pondering: while the human thinks about a move, the
+engine searches in a background thread the positions the human may leave
+it, so it does not start cold when the move is entered.
+
+The replies of the human are searched one after the other, to depth 1,
+then all of them to depth 2, and so on, the predicted reply first: the
+best move stored for the position in the transposition table of the
+engine, i.e. the reply its last search expected. Every round only searches
+the next depth, starting with the best move of the last one, since the
+shallower depths are in the table. The searches fill the same
+transposition table the engine uses for its own moves, and the best move
+of every reply is kept with the depth it was searched to. A reply which
+leaves the engine a single legal move needs no search at all.
+
+The moment the human enters a move, the pondering is stopped (within a
+few hundred nodes, see gameai.SearchContext) and the engine reuses it: if
+the reply was searched as deep as the engine would search it (at least
+min_depth, and as deep as the last search of the engine went in its time
+budget, see get_move()), its move is played at once, otherwise the search
+of the engine starts with a warm table. The input() call of the human
+waits without holding the interpreter lock, so the thread gets the whole
+time the human thinks.
+"""
+
+class Ponderer(object):
+    """
+    This class encapsulates a background search thread over the replies of
+    the human. A pondered move is only played if its search reached at
+    least min_depth.
+    """
+
+    def __init__(self, min_depth = 6, maxdepth = 64):
+        self.min_depth = min_depth
+        self.maxdepth = maxdepth
+        self._thread = None
+        self._stop = threading.Event()
+        self._root = None
+        self._results = {}  # key -> (move, score, depth)
+
+    def start(self, board, turn, table):
+        """
+        Starts pondering the position of the board, where the human plays the
+        given color, with the transposition table of the engine. The board is
+        copied, so the game may go on with it. Pondering the same position
+        again (e.g. after a command which is not a move) goes on from the
+        replies already searched. The entries of the table are aged once,
+        as for one search of the engine, not once by reply.
+        """
+        self.stop()
+        table.new_search()
+        root = transposition.hash_board(board, turn)
+        if root != self._root:
+            self._root = root
+            self._results = {}
+        self._thread = threading.Thread(target = self._run, \
+                            args = (copy.deepcopy(board), turn, table), \
+                            daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the pondering, if it is running, and waits for the thread.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._stop.clear()
+
+    def is_running(self):
+        """
+        Returns True if the thread is still searching.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_move(self, board, turn, depth = None):
+        """
+        Returns the pondered move of the engine for the given color to move,
+        or None if the position was not searched to min_depth, or to the
+        given depth, e.g. the depth the last search of the engine reached
+        in its time budget, if it is deeper. The pondering must be stopped
+        first.
+        """
+        found = self._results.get(transposition.hash_board(board, turn))
+        if found is not None \
+                and found[2] >= max(self.min_depth, depth or 0):
+            return found[0]
+        return None
+
+    def _run(self, board, turn, table):
+        """
+        The body of the thread: deepens the searches of all the replies in
+        turn until it is stopped or maxdepth is reached. Every round only
+        searches the next depth, the shallower ones are in the table.
+        """
+        (actions, ttype, terminal) = movegen.get_actions(board, turn)
+        if terminal:
+            return
+        entry = table.probe(self._root)
+        if entry is not None and entry[4] in actions:
+            actions = [entry[4]] + [a for a in actions if a != entry[4]]
+        other = 'white' if turn == 'black' else 'black'
+        replies = []
+        for a in actions:
+            child = copy.deepcopy(board)
+            child.make_move(a)
+            key = transposition.hash_board(child, other)
+            moves = movegen.get_actions(child, other)[0]
+            if len(moves) == 1:
+                # a forced move needs no search
+                self._results[key] = (moves[0], None, self.maxdepth)
+            elif moves:
+                replies.append((key, child, \
+                                evaluation.IncrementalEvaluator(child)))
+        orderer = ordering.MoveOrderer()
+        for depth in range(1, self.maxdepth + 1):
+            deeper = False
+            for (key, child, evaluator) in replies:
+                if self._stop.is_set():
+                    return
+                found = self._results.get(key)
+                if found is not None and found[2] >= depth:
+                    continue
+                context = ai.SearchContext(table, orderer = orderer, \
+                                           evaluator = evaluator, \
+                                           stop = self._stop)
+                if found is not None:
+                    # the best move of the last depth is searched first
+                    (context.pv, context.follow_pv) = ([found[0]], True)
+                try:
+                    (move, score) = ai.alphabeta_search((child, other, 0), \
+                                                        depth, \
+                                                        context = context)
+                except ai.SearchTimeout:
+                    return  # stopped
+                # without a node cut by the depth, the whole tree is searched
+                completed = depth if context.horizon else self.maxdepth
+                self._results[key] = (move, score, completed)
+                if completed == depth:
+                    deeper = True
+            if not deeper:
+                return  # every reply is solved
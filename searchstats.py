@@ -0,0 +1,133 @@
+import json
+import time
+import movegen
+"""
+This file implements the statistics of one search of gameai: the nodes
+visited, the leaf evaluations, the cutoffs by ply, the transposition table
+hits, the time and the nodes of every depth of an iterative deepening
+search, the deepest ply reached (seldepth) and the principal variation.
+
+A SearchStats is given to the search (see gameai.SearchContext and
+gameai.iterative_deepening()), which fills it. If profile is True, the
+search also times the move generation, the evaluation of the leaves and
+the transitions (making and taking back the moves) separately, and a
+callback can follow the search depth by depth. The statistics are written
+as one JSON line per search, so a log of many searches is easy to load.
+"""
+
+# The names of the profiled parts of the search.
+MOVEGEN, EVALUATE, TRANSITION = 'movegen', 'evaluate', 'transition'
+
+_END = object()
+
+class SearchStats(object):
+    """
+    This class holds the statistics of one search.
+    """
+
+    def __init__(self, profile = False, callback = None):
+        """
+        If profile is True, the search times its parts (see timers). The
+        callback, if any, is called as callback(stats, record) every time a
+        depth is completed, where record is the dictionary of that depth.
+        """
+        self.profile = profile
+        self.callback = callback
+        self.nodes = 0
+        self.evaluations = 0
+        self.cutoffs = {}  # ply -> number of beta cutoffs
+        self.table_probes = 0
+        self.table_hits = 0
+        self.table_cutoffs = 0  # the nodes settled by the table
+        self.seldepth = 0
+        self.depths = []
+        self.move = None
+        self.score = None
+        self.pv = []
+        self.seconds = 0.0
+        self.timers = {}  # name -> [calls, seconds]
+
+    def cutoff(self, ply):
+        """
+        Counts a cutoff at the given ply.
+        """
+        self.cutoffs[ply] = self.cutoffs.get(ply, 0) + 1
+
+    def add_time(self, name, seconds, calls = 1):
+        """
+        Adds the time of calls to a profiled part of the search.
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [calls, seconds]
+        else:
+            timer[0] += calls
+            timer[1] += seconds
+
+    def timed(self, name, iterator):
+        """
+        Yields the items of the iterator, and adds the time spent in it to
+        the given profiled part, e.g. for a lazy move generator.
+        """
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            item = next(iterator, _END)
+            self.add_time(name, clock() - start)
+            if item is _END:
+                return
+            yield item
+
+    def complete_depth(self, depth, seconds, nodes, move, score):
+        """
+        Records a completed depth of an iterative deepening search: its time,
+        the nodes it visited, and its best move and score.
+        """
+        record = {'depth': depth, 'seconds': seconds, 'nodes': nodes, \
+                  'move': move, 'score': score}
+        self.depths.append(record)
+        if self.callback is not None:
+            self.callback(self, record)
+
+    def as_dict(self, length = None):
+        """
+        Returns the statistics as a dictionary. The moves are packed moves,
+        or string positions if the board length is given.
+        """
+        def write(move):
+            if length is None or not isinstance(move, int):
+                return move
+            return movegen.to_notation(move, length)
+        return {'nodes': self.nodes, 'evaluations': self.evaluations, \
+                'cutoffs': {str(ply): n for (ply, n) \
+                                in sorted(self.cutoffs.items())}, \
+                'table_probes': self.table_probes, \
+                'table_hits': self.table_hits, \
+                'table_cutoffs': self.table_cutoffs, \
+                'seldepth': self.seldepth, \
+                'depths': [dict(record, move = write(record['move'])) \
+                               for record in self.depths], \
+                'move': write(self.move), 'score': self.score, \
+                'pv': [write(move) for move in self.pv], \
+                'seconds': self.seconds, \
+                'nodes_per_second': self.nodes / self.seconds \
+                                        if self.seconds > 0 else None, \
+                'timers': {name: {'calls': calls, 'seconds': seconds} \
+                               for (name, (calls, seconds)) \
+                               in self.timers.items()}}
+
+    def to_json(self, length = None, **extra):
+        """
+        Returns the statistics as one line of JSON, with the given extra
+        items (e.g. the color to move).
+        """
+        data = self.as_dict(length)
+        data.update(extra)
+        return json.dumps(data, separators = (',', ':'))
+
+    def write(self, f, length = None, **extra):
+        """
+        Writes the statistics to the file f as one JSON line.
+        """
+        f.write(self.to_json(length, **extra) + '\n')
+        f.flush()
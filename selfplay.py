@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import main
+import movegen
+import gameai as ai
+import transposition
+import searchstats
+from checkers import Board
+"""
+This file implements a headless engine-vs-engine game driver: many games
+are played at the same time by a pool of worker processes, without any
+input() loop, to measure an engine change or to make data for the opening
+book and for training.
+
+An engine plays with a fixed depth, a time budget per move or a node
+budget per move (see Engine). Every game starts with a few random moves,
+drawn from the seed of the game, so the games do not all repeat the same
+line, and the same seed replays the same opening. The two engines swap
+colors from one game to the next.
+
+Every finished game is written as one compact JSON line:
+
+    {"game":0,"seed":7,"black":"A","white":"B","opening":4,
+     "moves":"c2-d3 f1-e2 ... e5xc3xa5","result":"black","plies":61,
+     "nodes":183042,"seconds":4.1}
+
+where a move is written as its squares joined by '-', or by 'x' for a
+capture, and the result is the winning color or 'draw' (also when the game
+reaches the ply limit), decided like in the command line game. At the end
+the aggregate statistics are returned and written to the standard error:
+games per hour, nodes per second, the wins of every engine and the draws.
+
+Run "python selfplay.py --games 100 --depth 4 --against-depth 6" to play
+100 games of a depth 4 engine against a depth 6 engine.
+"""
+
+class Engine(object):
+    """
+    This class encapsulates the settings of a playing engine: a search to
+    a fixed depth, or deeper and deeper within a time (in seconds) or node
+    budget per move. It is sent to the worker processes, so it only keeps
+    plain values.
+    """
+
+    def __init__(self, name, depth = None, seconds = None, max_nodes = None):
+        """
+        At least one of the depth, the time and the node budget must be
+        given.
+        """
+        if depth is None and seconds is None and max_nodes is None:
+            raise ValueError("An engine needs a depth, a time" \
+                             + " or a node budget.")
+        self.name = name
+        self.depth = depth
+        self.seconds = seconds
+        self.max_nodes = max_nodes
+
+    def search(self, board, turn, table):
+        """
+        Returns the tuple (move, nodes) of the best packed move for the given
+        color to move, and the number of nodes searched to find it.
+        """
+        stats = searchstats.SearchStats()
+        (move, score) = ai.iterative_deepening((board, turn, 0), \
+                            self.seconds, self.max_nodes, \
+                            maxdepth = self.depth or 64, table = table, \
+                            stats = stats)
+        return (move, stats.nodes)
+
+def write_move(move, length):
+    """
+    Returns a packed move as a compact string: its squares joined by '-',
+    or by 'x' if it is a capture.
+    """
+    separator = 'x' if movegen.is_capture(move) else '-'
+    return separator.join(movegen.to_notation(move, length))
+
+def play_game(game, seed, black, white, length = 8, opening = 4, \
+              max_plies = 200):
+    """
+    Plays one game of the black engine against the white engine, after the
+    given number of random opening moves drawn from the seed, and returns
+    its record as a dictionary. The game is over, and its result decided,
+    like in the command line game (see main.is_game_finished() and
+    main.get_winner()), and a game longer than max_plies is a draw.
+    """
+    rng = random.Random(seed)
+    board = Board(length)
+    main.initialize(board)
+    engines = {'black': black, 'white': white}
+    tables = {'black': transposition.TranspositionTable(), \
+              'white': transposition.TranspositionTable()}
+    turn = 'black'
+    moves = []
+    nodes = 0
+    start = time.time()
+    result = None
+    while len(moves) < max_plies:
+        # the same rule as the command line game and the server
+        if main.is_game_finished(board):
+            result = main.get_winner(board)
+            break
+        if len(moves) < opening:
+            move = rng.choice(movegen.get_actions(board, turn)[0])
+        else:
+            (move, searched) = engines[turn].search(board, turn, \
+                                                    tables[turn])
+            nodes += searched
+        moves.append(write_move(move, length))
+        board.make_move(move)
+        turn = 'white' if turn == 'black' else 'black'
+    if result is None:
+        result = 'draw'
+    return {'game': game, 'seed': seed, 'black': black.name, \
+            'white': white.name, 'opening': opening, \
+            'moves': ' '.join(moves), 'result': result, \
+            'plies': len(moves), 'nodes': nodes, \
+            'seconds': round(time.time() - start, 3)}
+
+def _play(args):
+    """
+    Plays one game in a worker process.
+    """
+    return play_game(*args)
+
+def run(engines, games, out = None, workers = None, length = 8, \
+        opening = 4, max_plies = 200, seed = 0):
+    """
+    Plays the given number of games between the two engines of the tuple
+    engines, swapping colors every game, on a pool of the given number of
+    worker processes (as many as there are processors by default). The game
+    records are written to the file out as JSON lines as soon as the games
+    end (in the order they end), and the aggregate statistics are returned
+    as a dictionary. Only a few games per worker wait in the pool at a
+    time, so thousands of games run in constant memory. The wins are
+    counted by the names of the engines, so the two names must differ.
+    """
+    (first, second) = engines
+    if first.name == second.name:
+        raise ValueError("The two engines need different names.")
+    stats = {'games': 0, 'plies': 0, 'nodes': 0, 'draws': 0, \
+             'wins': {first.name: 0, second.name: 0}}
+    start = time.time()
+    with ProcessPoolExecutor(workers) as executor:
+        window = 2 * (workers or os.cpu_count() or 1)
+        pending = set()
+        game = 0
+        while game < games or pending:
+            while game < games and len(pending) < window:
+                (black, white) = (first, second) if game % 2 == 0 \
+                                     else (second, first)
+                pending.add(executor.submit(_play, (game, seed + game, \
+                                    black, white, length, opening, \
+                                    max_plies)))
+                game += 1
+            (done, pending) = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                if out is not None:
+                    out.write(json.dumps(record, separators = (',', ':')) \
+                              + '\n')
+                    out.flush()
+                stats['games'] += 1
+                stats['plies'] += record['plies']
+                stats['nodes'] += record['nodes']
+                if record['result'] == 'draw':
+                    stats['draws'] += 1
+                else:
+                    stats['wins'][record[record['result']]] += 1
+    seconds = time.time() - start
+    played = max(stats['games'], 1)
+    stats['seconds'] = round(seconds, 3)
+    stats['games_per_hour'] = round(stats['games'] * 3600.0 / seconds, 1)
+    stats['nodes_per_second'] = round(stats['nodes'] / seconds, 1)
+    stats['win_rates'] = {name: round(wins / played, 4) \
+                              for (name, wins) in stats['wins'].items()}
+    stats['draw_rate'] = round(stats['draws'] / played, 4)
+    return stats
+
+def _main():
+    parser = argparse.ArgumentParser(description = "Plays engine-vs-engine" \
+                                     + " games and writes their records.")
+    parser.add_argument('--games', type = int, default = 100)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--depth', type = int, default = None)
+    parser.add_argument('--seconds', type = float, default = None)
+    parser.add_argument('--nodes', type = int, default = None)
+    parser.add_argument('--against-depth', type = int, default = None)
+    parser.add_argument('--against-seconds', type = float, default = None)
+    parser.add_argument('--against-nodes', type = int, default = None)
+    parser.add_argument('--opening', type = int, default = 4, \
+                        help = "the number of random opening plies")
+    parser.add_argument('--max-plies', type = int, default = 200)
+    parser.add_argument('--length', type = int, default = 8)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--out', default = '-', \
+                        help = "the file of the game records, - for stdout")
+    args = parser.parse_args()
+    if args.depth is None and args.seconds is None and args.nodes is None:
+        args.depth = 4
+    first = Engine('A', args.depth, args.seconds, args.nodes)
+    if args.against_depth is None and args.against_seconds is None \
+            and args.against_nodes is None:
+        second = Engine('B', args.depth, args.seconds, args.nodes)
+    else:
+        second = Engine('B', args.against_depth, args.against_seconds, \
+                        args.against_nodes)
+    out = sys.stdout if args.out == '-' else open(args.out, 'w')
+    try:
+        stats = run((first, second), args.games, out, args.workers, \
+                    args.length, args.opening, args.max_plies, args.seed)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    sys.stderr.write(json.dumps(stats) + '\n')
+
+if __name__ == '__main__':
+    _main()
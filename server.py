@@ -0,0 +1,352 @@
+import os
+import json
+import math
+import asyncio
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import main
+import movegen
+import gameai as ai
+from checkers import Board
+"""
+This file implements a game server: many games are played at the same time
+over TCP, one game per connection, with a line protocol that accepts the
+commands of the command line game (see main.game_play_ai()). The games are
+kept by one asyncio event loop, and the searches of the engine run on a
+bounded pool of worker processes, so one host serves hundreds of games.
+
+Every command is one line, and every answer is one line of JSON, with
+"ok": true or "ok": false and an "error":
+
+    new [black|white] [length]      starts a game where the client plays
+                                    the given color (black by default)
+    move x y                        plays a simple move, e.g. move c2 d3
+    jump x y ...                    plays a capture, e.g. jump e5 c3 a5
+    hints                           lists the moves or the captures
+    apply n                         plays the n-th hint
+    budget seconds                  sets the time budget of the engine
+    go                              lets the engine play, e.g. after its
+                                    search was refused or ran out of time
+    board                           shows the board
+    status                          shows the load of the server
+    pass, exit                      ends the game
+
+After the move of the client the engine replies in the same answer, as
+"reply". A search waits in a bounded queue for a free worker: when the
+queue is full the command is refused with a "busy" error at once, before
+the move of the client is played, instead of letting the queue grow, and
+the client may try again later. Every search gets the time budget of its
+game (capped by the server), counted from the moment a worker starts it,
+and a search which does not finish within its budget and a grace time is
+abandoned with an error.
+
+Run "python server.py --port 8765 --workers 4" and, e.g., "nc localhost
+8765" to play.
+"""
+
+def _search(board, turn, seconds):
+    """
+    Searches the best move in a worker process. Every worker keeps its own
+    transposition tables and move orderers between the searches, one for
+    each color.
+    """
+    (move, score) = ai.iterative_deepening((board, turn, 0), seconds, \
+                                           table = ai.get_table(turn), \
+                                           orderer = ai.get_orderer(turn))
+    return move
+
+class Session(object):
+    """
+    This class encapsulates one game of the server.
+    """
+
+    def __init__(self, number, color = 'black', length = 8, seconds = 1.0):
+        self.number = number
+        self.board = Board(length)
+        main.initialize(self.board)
+        self.color = color
+        self.engine = 'white' if color == 'black' else 'black'
+        self.turn = 'black'
+        self.seconds = seconds
+        self.over = False
+
+    def get_result(self):
+        """
+        Returns the winner ('black', 'white' or 'draw') if the game is over,
+        otherwise None.
+        """
+        if main.is_game_finished(self.board):
+            self.over = True
+            return main.get_winner(self.board)
+        return None
+
+class GameServer(object):
+    """
+    This class encapsulates the server: the games of the connections and
+    the pool of worker processes of the engine.
+    """
+
+    def __init__(self, workers = None, queue = None, seconds = 1.0, \
+                 max_seconds = 10.0, grace = 5.0):
+        """
+        The pool has the given number of worker processes (as many as there
+        are processors by default), and at most queue searches wait for a
+        worker (twice the number of workers by default). The time budget of
+        a game is seconds, and a client may set it up to max_seconds.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.queue = queue if queue is not None else 2 * self.workers
+        self.seconds = seconds
+        self.max_seconds = max_seconds
+        self.grace = grace
+        self._executor = ProcessPoolExecutor(self.workers)
+        self._slots = asyncio.Semaphore(self.workers + self.queue)
+        self._free = asyncio.Semaphore(self.workers)
+        self._numbers = itertools.count(1)
+        self.sessions = {}
+        self.waiting = 0
+        self.searching = 0
+        self.refused = 0
+
+    def check_queue(self):
+        """
+        Raises RuntimeError if the queue of the searches is full. Nothing
+        is awaited between this check and the start of a search, so the
+        search gets its place.
+        """
+        if self._slots.locked():
+            self.refused += 1
+            raise RuntimeError("busy: the engine queue is full," \
+                               + " please try again later.")
+
+    async def search(self, session):
+        """
+        Runs the search of the engine of a game on the pool, and returns its
+        move. Raises RuntimeError if the queue is full or the search does
+        not finish in time. A search waits in the queue until a worker is
+        free, and its time only starts then. A search which is abandoned
+        goes on in its worker, so it keeps its worker and its place in the
+        queue until it is over.
+        """
+        self.check_queue()
+        await self._slots.acquire()
+        self.waiting += 1
+        try:
+            await self._free.acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+        finally:
+            self.waiting -= 1
+        self.searching += 1
+        loop = asyncio.get_running_loop()
+        try:
+            # a worker is free, so the search starts at once
+            future = self._executor.submit(_search, session.board, \
+                                           session.turn, session.seconds)
+        except BaseException:
+            self._release()
+            raise
+        # an abandoned search keeps its place until its worker is free
+        future.add_done_callback(lambda f: self._done(loop))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), \
+                                          session.seconds + self.grace)
+        except asyncio.TimeoutError:
+            raise RuntimeError("The engine ran out of time.")
+
+    def _done(self, loop):
+        """
+        Called by the pool (in another thread) when a search is over,
+        whether it was awaited or abandoned.
+        """
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # the event loop is closed
+
+    def _release(self):
+        """
+        Gives back the worker and the place of a search which is over.
+        """
+        self.searching -= 1
+        self._free.release()
+        self._slots.release()
+
+    async def reply(self, session, answer):
+        """
+        Lets the engine play if it is its turn, and adds its move (and the
+        result if the game is over) to the answer.
+        """
+        result = session.get_result()
+        if result is None and session.turn == session.engine:
+            move = await self.search(session)
+            session.board.make_move(move)
+            answer['reply'] = list(movegen.to_notation(move, \
+                                        session.board.get_length()))
+            session.turn = session.color
+            result = session.get_result()
+        if result is not None:
+            answer['result'] = result
+        return answer
+
+    async def execute(self, session, line):
+        """
+        Executes one command line of a connection, and returns the tuple
+        (session, answer) where answer is a dictionary.
+        """
+        command = [s.strip().lower() for s in line.split()]
+        if not command:
+            raise RuntimeError(main.cmd_error)
+        name = command[0]
+        if name == 'new':
+            color = command[1] if len(command) > 1 else 'black'
+            length = int(command[2]) if len(command) > 2 else 8
+            if color not in ('black', 'white'):
+                raise ValueError("A color must be \'black\' or \'white\'.")
+            if not 4 <= length <= 16 or length % 2:
+                raise ValueError("The length must be even, from 4 to 16.")
+            if color == 'white':
+                self.check_queue()
+            if session is not None:
+                del self.sessions[session.number]
+            session = Session(next(self._numbers), color, length, \
+                              self.seconds)
+            self.sessions[session.number] = session
+            answer = {'ok': True, 'game': session.number, 'color': color}
+            return (session, await self.reply(session, answer))
+        if name == 'status':
+            return (session, {'ok': True, 'games': len(self.sessions), \
+                              'workers': self.workers, \
+                              'searching': self.searching, \
+                              'waiting': self.waiting, \
+                              'queue': self.queue, 'refused': self.refused})
+        if session is None:
+            raise RuntimeError("There is no game, please type \'new\'.")
+        board = session.board
+        if name in ('pass', 'exit'):
+            del self.sessions[session.number]
+            return (None, {'ok': True, 'game': session.number, \
+                           'result': session.engine if name == 'pass' \
+                                         and not session.over else None})
+        if name == 'board':
+            return (session, {'ok': True, 'board': str(board), \
+                              'turn': session.turn, \
+                              'count': main.count_pieces(board)})
+        if name == 'budget' and len(command) == 2:
+            seconds = float(command[1])
+            if not math.isfinite(seconds):
+                raise ValueError("The budget must be a number of seconds.")
+            session.seconds = min(max(seconds, 0.01), self.max_seconds)
+            return (session, {'ok': True, 'seconds': session.seconds})
+        if session.over:
+            raise RuntimeError("The game is over.")
+        if name == 'go':
+            return (session, await self.reply(session, {'ok': True}))
+        (moves, captures) = main.get_hints(board, session.color, True)
+        if name == 'hints':
+            return (session, {'ok': True, 'moves': moves, \
+                              'captures': captures})
+        if session.turn != session.color:
+            raise RuntimeError("It is not your turn.")
+        if name == 'move' and len(command) == 3:
+            if captures:
+                raise RuntimeError(main.hasjump_error)
+            action = (command[1], command[2])
+            if action not in moves:
+                raise RuntimeError(main.move_error)
+        elif name == 'jump' and len(command) >= 3:
+            action = command[1:]
+            if action not in captures:
+                raise RuntimeError(main.jump_error)
+        elif name == 'apply' and len(command) == 2:
+            number = int(command[1])
+            hints = moves or captures
+            if not 1 <= number <= len(hints):
+                raise ValueError(main.hint_error)
+            action = hints[number - 1]
+        else:
+            raise RuntimeError(main.cmd_error)
+        self.check_queue()
+        if isinstance(action, tuple):
+            main.apply_move(board, action)
+        else:
+            main.apply_capture(board, action)
+        session.turn = session.engine
+        answer = {'ok': True, 'played': list(action)}
+        return (session, await self.reply(session, answer))
+
+    async def handle(self, reader, writer):
+        """
+        Serves one connection until the client leaves.
+        """
+        session = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    (session, answer) = await self.execute(session, \
+                                            line.decode('utf-8', 'replace'))
+                except (RuntimeError, ValueError) as err:
+                    answer = {'ok': False, 'error': str(err)}
+                writer.write((json.dumps(answer) + '\n').encode('utf-8'))
+                # waits while the client does not read its answers
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if session is not None:
+                self.sessions.pop(session.number, None)
+            writer.close()
+
+    async def start(self):
+        """
+        Starts all the worker processes of the pool. The pool starts its
+        workers with the first searches otherwise, when connections are
+        open, and a forked worker would keep their sockets open for good.
+        """
+        await asyncio.gather(*[asyncio.wrap_future( \
+                                   self._executor.submit(os.getpid)) \
+                               for i in range(self.workers)])
+
+    async def serve(self, host = '127.0.0.1', port = 8765):
+        """
+        Serves the connections until the task is cancelled.
+        """
+        await self.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        self._executor.shutdown(cancel_futures = True)
+
+def _main():
+    parser = argparse.ArgumentParser(description = "Serves checkers games" \
+                                     + " over a TCP line protocol.")
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8765)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--queue', type = int, default = None, \
+                        help = "the number of searches which may wait")
+    parser.add_argument('--seconds', type = float, default = 1.0, \
+                        help = "the default time budget of a search")
+    parser.add_argument('--max-seconds', type = float, default = 10.0)
+    args = parser.parse_args()
+    server = GameServer(args.workers, args.queue, args.seconds, \
+                        args.max_seconds)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+if __name__ == '__main__':
+    _main()
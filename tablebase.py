@@ -0,0 +1,378 @@
+import sys
+import mmap
+import math
+import array
+import struct
+import bisect
+import itertools
+import main
+import movegen
+import evaluation
+from checkers import Board
+from checkers import PIECES, BLACK_PAWN, WHITE_PAWN, BLACK_KING, WHITE_KING
+"""
+This file implements an endgame tablebase: the exact game value of every
+position with a few pieces left, found offline by retrograde analysis, and
+probed by the tree search through a memory mapped file.
+
+The positions are grouped by their material, i.e. the numbers of black
+pawns, white pawns, black kings and white kings (bp, wp, bk, wk). In one
+group, a position is indexed by the squares of each kind of piece (ranked
+in the combinatorial number system among the dark squares left free by the
+kinds before it) and by the color to move. Every entry is a 16 bit value
+for the color to move:
+
+    0: draw    2 * d + 1: win in d plies    2 * d + 2: loss in d plies
+
+A game is over when a color has no move (see main.is_game_finished()), and
+its result is main.get_winner(). The groups are solved in an order where
+every capture (fewer pieces) and every crowning (fewer pawns) leads to a
+group solved before: the positions which end the game get their value
+first, then a position is won in d plies if a move leads to a position lost
+in d - 1 plies, and lost in d plies if all its moves lead to positions won
+in at most d - 1 plies, for d = 1, 2, ... Whatever is left is a draw, since
+neither color can force the end of the game.
+
+The file starts with a header and a directory of the groups, followed by
+the entries of all the groups:
+
+    header:     b'CKTB', version (uint16), board length (uint16),
+                number of groups (uint32)
+    directory:  bp, wp, bk, wk (uint8 each), offset (uint64),
+                number of entries (uint64)
+    entries:    uint16, little endian
+
+Run "python tablebase.py 3 endgame.tb" to build the tablebase of all the
+positions with up to 3 pieces. Four pieces take much longer.
+"""
+
+MAGIC = b'CKTB'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHI')
+_GROUP = struct.Struct('<BBBBQQ')
+
+DRAW, WIN, LOSS = 0, 1, 2
+
+# the score of a won position in the tree search, less the plies to the win
+WIN_SCORE = 10000.0
+
+def encode(result, distance):
+    """
+    Returns the entry of a result (DRAW, WIN or LOSS) in the given number of
+    plies.
+    """
+    return 0 if result == DRAW else 2 * distance + result
+
+def decode(value):
+    """
+    Returns the tuple (result, distance) of an entry.
+    """
+    if value == 0:
+        return (DRAW, 0)
+    return (WIN if value & 1 else LOSS, (value - 1) // 2)
+
+def get_squares(length):
+    """
+    Returns the dark squares of a board, as (row, col) tuples, row by row.
+    """
+    return [(r, c) for r in range(length) for c in range(length) \
+                if (r + c) % 2 == 1]
+
+def group_size(material, squares):
+    """
+    Returns the number of entries of a group on a board of the given number
+    of dark squares.
+    """
+    size = 2
+    for count in material:
+        size *= math.comb(squares, count)
+        squares -= count
+    return size
+
+def rank(kinds, squares, turn):
+    """
+    Returns the index of a position in its group, given the sorted dark
+    square numbers of every kind of piece (black pawns, white pawns, black
+    kings and white kings), the number of dark squares and the color to
+    move.
+    """
+    index = 0
+    used = []
+    for kind in kinds:
+        r = 0
+        for (i, s) in enumerate(kind):
+            r += math.comb(s - bisect.bisect_left(used, s), i + 1)
+        index = index * math.comb(squares, len(kind)) + r
+        squares -= len(kind)
+        used = sorted(used + kind)
+    return index * 2 + (1 if turn == 'white' else 0)
+
+def unrank(index, material, squares):
+    """
+    The reverse of rank(): returns the tuple (kinds, turn) of an index.
+    """
+    turn = 'white' if index & 1 else 'black'
+    index >>= 1
+    sizes = []
+    left = squares
+    for count in material:
+        sizes.append(math.comb(left, count))
+        left -= count
+    ranks = []
+    for size in reversed(sizes):
+        ranks.append(index % size)
+        index //= size
+    ranks.reverse()
+    kinds = []
+    free = list(range(squares))
+    for (count, r) in zip(material, ranks):
+        relative = []
+        for i in range(count, 0, -1):
+            c = i - 1
+            while math.comb(c + 1, i) <= r:
+                c += 1
+            r -= math.comb(c, i)
+            relative.append(c)
+        kind = sorted([free[c] for c in relative])
+        kinds.append(kind)
+        free = [s for s in free if s not in kind]
+    return (kinds, turn)
+
+def get_materials(pieces):
+    """
+    Returns the materials (bp, wp, bk, wk) of all the groups with 2 up to the
+    given number of pieces and at least one piece of each color, in the
+    order they must be solved.
+    """
+    materials = []
+    for total in range(2, pieces + 1):
+        found = [m for m in itertools.product(range(total + 1), repeat = 4) \
+                     if sum(m) == total and m[0] + m[2] and m[1] + m[3]]
+        found.sort(key = lambda m: (m[0] + m[1], m))
+        materials += found
+    return materials
+
+def get_position(board, squares):
+    """
+    Returns the tuple (material, kinds) of the pieces on a board, where
+    squares maps a (row, col) tuple to its dark square number.
+    """
+    kinds = ([], [], [], [])
+    for (row, col, piece) in board.get_pieces():
+        kinds[piece.code() - 1].append(squares[(row, col)])
+    return (tuple(len(kind) for kind in kinds), kinds)
+
+def terminal_value(board, turn):
+    """
+    Returns the entry of a position where the game is over, or None if it is
+    not over.
+    """
+    if not main.is_game_finished(board):
+        return None
+    winner = main.get_winner(board)
+    if winner == 'draw':
+        return encode(DRAW, 0)
+    return encode(WIN if winner == turn else LOSS, 0)
+
+def solve(material, length, solved, verbose = False):
+    """
+    Solves one group, given the entries of the groups solved before (a
+    dictionary material -> array), and returns its entries as an array.
+    """
+    dark = get_squares(length)
+    squares = {square: i for (i, square) in enumerate(dark)}
+    size = group_size(material, len(dark))
+    values = array.array('H', bytes(2 * size))
+    board = Board(length)
+    # per unsolved position: its index, the indices of its children in this
+    # group, the shortest loss and the longest win among the other children,
+    # and True if all the other children are won
+    pending = []
+    longest = 0
+    for index in range(size):
+        (kinds, turn) = unrank(index, material, len(dark))
+        if any(dark[s][0] == length - 1 for s in kinds[0]) \
+                or any(dark[s][0] == 0 for s in kinds[1]):
+            continue  # a pawn on its king row, it cannot happen
+        for (row, col, piece) in board.get_pieces():
+            board.remove(row, col)
+        for (code, kind) in enumerate(kinds, BLACK_PAWN):
+            for s in kind:
+                board.place(dark[s][0], dark[s][1], PIECES[code])
+        value = terminal_value(board, turn)
+        if value is not None:
+            values[index] = value
+            continue
+        other = 'white' if turn == 'black' else 'black'
+        local = []
+        loss = None
+        win = 0
+        all_won = True
+        for move in movegen.get_actions(board, turn)[0]:
+            undo = board.make_move(move)
+            (child, child_kinds) = get_position(board, squares)
+            if child == material:
+                local.append(rank(child_kinds, len(dark), other))
+            else:
+                value = terminal_value(board, other)
+                if value is None:
+                    value = solved[child][rank(child_kinds, len(dark), other)]
+                (result, distance) = decode(value)
+                if result == WIN:
+                    win = max(win, distance)
+                else:
+                    all_won = False
+                    if result == LOSS:
+                        loss = distance if loss is None \
+                                    else min(loss, distance)
+            board.unmake_move(undo)
+        longest = max(longest, win, loss or 0)
+        pending.append((index, local, loss, win, all_won))
+    distance = 1
+    while pending and distance <= longest + 2:
+        left = []
+        for entry in pending:
+            (index, local, loss, win, all_won) = entry
+            won = loss == distance - 1
+            lost = all_won and win <= distance - 1
+            for child in local:
+                (result, d) = decode(values[child])
+                if result == LOSS and d == distance - 1:
+                    won = True
+                    break
+                if result != WIN or d > distance - 1:
+                    lost = False
+            if won:
+                values[index] = encode(WIN, distance)
+            elif lost:
+                values[index] = encode(LOSS, distance)
+            else:
+                left.append(entry)
+        if len(left) < len(pending):
+            longest = max(longest, distance)
+        pending = left
+        distance += 1
+    if verbose:
+        print("{:s}: {:d} positions, {:d} draws".format(str(material), \
+                                                       size, len(pending)))
+    return values
+
+def build(path, pieces = 3, length = 8, verbose = False):
+    """
+    Builds the tablebase of all the positions with up to the given number of
+    pieces and writes it to the given file.
+    """
+    materials = get_materials(pieces)
+    solved = {}
+    for material in materials:
+        solved[material] = solve(material, length, solved, verbose)
+    offset = _HEADER.size + _GROUP.size * len(materials)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, length, len(materials)))
+        for material in materials:
+            f.write(_GROUP.pack(*(material + (offset, \
+                                              len(solved[material])))))
+            offset += 2 * len(solved[material])
+        for material in materials:
+            values = solved[material]
+            if sys.byteorder != 'little':
+                values = array.array('H', values)
+                values.byteswap()
+            f.write(values.tobytes())
+
+class Tablebase(object):
+    """
+    This class encapsulates a tablebase file opened for probing. The file
+    is memory mapped, so only the pages of the probed entries are read from
+    the disk. It can be used as a context manager, which closes the file at
+    the end.
+    """
+
+    def __init__(self, path):
+        """
+        Opens the tablebase file at the given path.
+        """
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, \
+                              access = mmap.ACCESS_READ)
+        (magic, version, length, count) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Not a tablebase file: " + str(path))
+        self._length = length
+        dark = get_squares(length)
+        self._count = len(dark)
+        self._squares = {square: i for (i, square) in enumerate(dark)}
+        self._groups = {}
+        self.max_pieces = 0
+        for i in range(count):
+            (bp, wp, bk, wk, offset, size) = \
+                _GROUP.unpack_from(self._map, _HEADER.size + i * _GROUP.size)
+            self._groups[(bp, wp, bk, wk)] = (offset, size)
+            self.max_pieces = max(self.max_pieces, bp + wp + bk + wk)
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, board, turn):
+        """
+        Returns the tuple (result, distance) of the position for the color to
+        move, or None if the position is not in the tablebase.
+        """
+        self.probes += 1
+        if board.get_length() != self._length:
+            return None
+        counts = board.get_counts()
+        if counts[BLACK_PAWN] + counts[WHITE_PAWN] + counts[BLACK_KING] \
+                + counts[WHITE_KING] > self.max_pieces:
+            return None
+        (material, kinds) = get_position(board, self._squares)
+        group = self._groups.get(material)
+        if group is None:
+            return None
+        index = rank(kinds, self._count, turn)
+        self.hits += 1
+        return decode(struct.unpack_from('<H', self._map, \
+                                         group[0] + 2 * index)[0])
+
+    def score(self, board, turn, maximizer, ply = 0):
+        """
+        Returns the score of the position for the tree search, from the
+        maximizing color, or None if the position is not in the tablebase.
+        The position is found at the given ply of the search, so a win
+        scores WIN_SCORE less the plies from the root of the search to the
+        end of the game: a quicker win scores higher, wherever the search
+        finds it, and a slower loss scores higher. A draw scores like a
+        balanced position with the same material (see evaluation.balanced()),
+        so it compares with the heuristics of the positions which are not in
+        the tablebase.
+        """
+        found = self.probe(board, turn)
+        if found is None:
+            return None
+        (result, distance) = found
+        if result == DRAW:
+            counts = board.get_counts()
+            return evaluation.balanced(maximizer, counts[BLACK_PAWN], \
+                                       counts[WHITE_PAWN], \
+                                       counts[BLACK_KING], \
+                                       counts[WHITE_KING])
+        score = WIN_SCORE - (ply + distance)
+        return score if (result == WIN) == (turn == maximizer) else -score
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+if __name__ == '__main__':
+    pieces = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    path = sys.argv[2] if len(sys.argv) > 2 else 'endgame.tb'
+    build(path, pieces, verbose = True)
@@ -0,0 +1,67 @@
+import re
+import json
+import unittest
+import main
+import movegen
+import benchmark
+import selfplay
+"""
+This file tests the benchmark of the tree search on its test positions.
+Run "python -m pytest" or "python -m unittest" from the directory of the
+project.
+"""
+
+MOVE = re.compile(r'^[a-h][1-8]([-x][a-h][1-8])+$')
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_positions(self):
+        """
+        The moves of the test positions are legal, and white has a single
+        and a double jump in the tactical position.
+        """
+        for position in benchmark.POSITIONS:
+            for (i, move) in enumerate(position.get('moves', [])):
+                done = dict(position, moves = position['moves'][:i])
+                (board, turn) = benchmark.make_position(done)
+                (moves, captures) = main.get_hints(board, turn)
+                if 'x' in move:
+                    self.assertIn(move.split('x'), captures)
+                else:
+                    self.assertIn(tuple(move.split('-')), moves)
+        tactical = [p for p in benchmark.POSITIONS \
+                        if p['name'] == 'tactical'][0]
+        (board, turn) = benchmark.make_position(tactical)
+        self.assertEqual(turn, 'white')
+        captured = sorted(movegen.count_captured(a) \
+                              for a in movegen.get_actions(board, turn)[0])
+        self.assertEqual(captured, [1, 2])
+
+    def test_run(self):
+        """
+        Every configuration reports every position, a legal move written
+        like in the self-play records, and the searches without pruning
+        heuristics agree on the scores.
+        """
+        results = benchmark.run(depths = (1, 3), minimax_depth = 1)
+        json.dumps(results)
+        self.assertEqual(len(results), len(benchmark.POSITIONS) * 7)
+        scores = {}
+        for result in results:
+            self.assertTrue(MOVE.match(result['move']), result['move'])
+            position = [p for p in benchmark.POSITIONS \
+                            if p['name'] == result['position']][0]
+            (board, turn) = benchmark.make_position(position)
+            legal = [selfplay.write_move(a, 8) \
+                         for a in movegen.get_actions(board, turn)[0]]
+            self.assertIn(result['move'], legal)
+            self.assertGreater(result['nodes'], 0)
+            if result['config'] != 'deepening':
+                scores.setdefault((result['position'], result['depth']), \
+                                  []).append(result['score'])
+        for values in scores.values():
+            for value in values:
+                self.assertAlmostEqual(value, values[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import random
+import unittest
+import main
+import batch
+import gameai
+import movegen
+import transposition
+import searchstats
+from checkers import Board
+"""
+This file tests the tree search of gameai. Run "python -m pytest" or
+"python -m unittest" from the directory of the project.
+"""
+
+def get_start():
+    """
+    Returns the starting position as a search state.
+    """
+    board = Board(8)
+    main.initialize(board)
+    return (board, 'black', 0)
+
+class IterativeDeepeningTest(unittest.TestCase):
+
+    def test_principal_variation(self):
+        """
+        The principal variation of every completed depth is found with a
+        table, and its first move is tried first at the root of the next
+        depth.
+        """
+        state = get_start()
+        (roots, pvs) = ([], [])
+        (search_root, root_variation) = (gameai.search_root, \
+                                         gameai.root_variation)
+
+        def spy_root(state, actions, *args, **kwargs):
+            actions = list(actions)
+            roots.append(actions[0])
+            return search_root(state, actions, *args, **kwargs)
+
+        def spy_variation(*args):
+            pvs.append(root_variation(*args))
+            return pvs[-1]
+
+        (gameai.search_root, gameai.root_variation) = (spy_root, \
+                                                       spy_variation)
+        stats = searchstats.SearchStats()
+        try:
+            (move, score) = gameai.iterative_deepening(state, maxdepth = 3, \
+                                table = transposition.TranspositionTable(), \
+                                stats = stats)
+        finally:
+            (gameai.search_root, gameai.root_variation) = (search_root, \
+                                                           root_variation)
+        self.assertEqual(len(pvs), 3)
+        for (depth, pv) in enumerate(pvs, 1):
+            self.assertTrue(pv)
+            self.assertLessEqual(len(pv), depth)
+        self.assertEqual(len(pvs[1]), 2)
+        self.assertEqual(roots[1], pvs[0][0])
+        self.assertEqual(roots[2], pvs[1][0])
+        self.assertEqual(stats.pv, pvs[-1])
+        self.assertEqual(stats.pv[0], move)
+
+    @unittest.skipUnless(batch.available(), "NumPy is not installed.")
+    def test_batch_equals_scalar(self):
+        """
+        The search scores the children of the frontier nodes in bulk with
+        the same table probes, so it finds the same scores and visits the
+        same nodes as the scalar search.
+        """
+        rng = random.Random(5)
+        for game in range(6):
+            (board, turn, depth) = get_start()
+            for ply in range(rng.randint(4, 60)):
+                actions = movegen.get_actions(board, turn)[0]
+                if not actions:
+                    break
+                board.make_move(rng.choice(actions))
+                turn = 'white' if turn == 'black' else 'black'
+            results = []
+            for use_batch in (False, True):
+                stats = searchstats.SearchStats()
+                table = transposition.TranspositionTable()
+                (move, score) = gameai.iterative_deepening((board, turn, 0), \
+                                    maxdepth = 4, use_batch = use_batch, \
+                                    table = table, stats = stats)
+                results.append((score, stats.nodes, stats.evaluations))
+            self.assertAlmostEqual(results[0][0], results[1][0])
+            self.assertEqual(results[0][1:], results[1][1:])
+
+if __name__ == '__main__':
+    unittest.main()
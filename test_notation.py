@@ -0,0 +1,120 @@
+import random
+import unittest
+import main
+import movegen
+import notation
+import bitboard
+from checkers import Board
+"""
+This file tests the text notation and the binary record of the positions,
+and their bulk conversions to NumPy arrays. Run "python -m pytest" or
+"python -m unittest" from the directory of the project.
+"""
+
+START = 'B:W21,22,23,24,25,26,27,28,29,30,31,32:B1,2,3,4,5,6,7,8,9,10,11,12'
+
+def get_positions(length, count, seed = 0):
+    """
+    Returns the given number of (board, turn) tuples of a board length,
+    reached by random moves from the starting position.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = Board(length)
+        main.initialize(board)
+        turn = 'black'
+        for ply in range(rng.randint(0, 80)):
+            actions = movegen.get_actions(board, turn)[0]
+            if not actions:
+                break
+            board.make_move(rng.choice(actions))
+            turn = 'white' if turn == 'black' else 'black'
+        positions.append((board, turn))
+    return positions
+
+class NotationTest(unittest.TestCase):
+
+    def test_start_fen(self):
+        """
+        The starting position is written like in the English draughts
+        notation, and a range of squares reads like the squares one by one.
+        """
+        board = Board(8)
+        main.initialize(board)
+        self.assertEqual(notation.to_fen(board, 'black'), START)
+        (read, turn) = notation.from_fen('B:W21-32:B1-12')
+        self.assertEqual(turn, 'black')
+        self.assertEqual(read.get_cells(), board.get_cells())
+
+    def test_fen_round_trip(self):
+        """
+        Reading the text notation of a position gives back the position,
+        also on a BitBoard.
+        """
+        for length in (6, 8, 10):
+            for (board, turn) in get_positions(length, 40, length):
+                text = notation.to_fen(board, turn)
+                (read, color) = notation.from_fen(text, length)
+                self.assertEqual(color, turn)
+                self.assertEqual(read.get_cells(), board.get_cells())
+                self.assertEqual(notation.to_fen(read, color), text)
+                (read, color) = notation.from_fen(text, \
+                                    board = bitboard.BitBoard(length))
+                self.assertEqual(read.get_cells(), board.get_cells())
+
+    def test_invalid_fen(self):
+        """
+        A notation without the color to move or with a square off the board
+        is refused.
+        """
+        for text in ('W21:B1', 'X:W21:B1', 'B:W21:B33', 'B:W21:Q1'):
+            with self.assertRaises(ValueError):
+                notation.from_fen(text)
+
+    def test_record_round_trip(self):
+        """
+        The binary record of a position has record_size() bytes, and
+        decoding it gives back the position, one by one or in bulk.
+        """
+        for length in (6, 8, 10):
+            positions = get_positions(length, 40, length)
+            records = [notation.encode(board, turn) \
+                           for (board, turn) in positions]
+            for (record, (board, turn)) in zip(records, positions):
+                self.assertEqual(len(record), notation.record_size(length))
+                (read, color) = notation.decode(record, length)
+                self.assertEqual(color, turn)
+                self.assertEqual(read.get_cells(), board.get_cells())
+            data = notation.encode_many(positions)
+            self.assertEqual(data, b''.join(records))
+            decoded = list(notation.decode_many(data, length))
+            self.assertEqual(len(decoded), len(positions))
+            for ((read, color), (board, turn)) in zip(decoded, positions):
+                self.assertEqual(color, turn)
+                self.assertEqual(read.get_cells(), board.get_cells())
+        self.assertEqual(notation.record_size(8), 13)
+        with self.assertRaises(ValueError):
+            notation.decode(b'\x00' * 12)
+
+    @unittest.skipIf(notation.np is None, "NumPy is not installed.")
+    def test_arrays_round_trip(self):
+        """
+        The arrays of the records hold the piece codes of the boards, and
+        the records of the arrays are the same records.
+        """
+        for length in (6, 8, 10):
+            positions = get_positions(length, 40, length)
+            data = notation.encode_many(positions)
+            (arrays, turns) = notation.to_arrays(data, length)
+            self.assertEqual(arrays.shape, (len(positions), length, length))
+            for (array, color, (board, turn)) in zip(arrays, turns, \
+                                                    positions):
+                self.assertEqual(array.tolist(), board.get_cells())
+                self.assertEqual(color, 0 if turn == 'black' else 1)
+            self.assertEqual(notation.from_arrays(arrays, turns), data)
+            names = [turn for (board, turn) in positions]
+            self.assertEqual(notation.from_arrays(arrays, names), data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import io
+import os
+import gzip
+import random
+import shutil
+import tempfile
+import unittest
+import pdn
+import main
+import movegen
+import notation
+from checkers import Board
+"""
+This file tests the reading, the replaying and the writing of the games in
+PDN. Run "python -m pytest" or "python -m unittest" from the directory of
+the project.
+"""
+
+SAMPLE = """[Event "Sample"]
+[Black "A \\"B\\" C"]
+[Result "1-0"]
+{before the first move} 1. 9-14 {a quiet
+move} 23-19 $1 (22-18 14x23 {a line} (27x18)) 2.10-15! 19x10?
+3. 6x15 26-23 4. 15-19 23x16 1-0
+
+[Event "From a position"]
+[FEN "W:W23,29:B10,11,18"]
+1... 23x7 {two ends of a double jump} 2. 11-15 *
+"""
+
+def play_random(seed, plies = 60):
+    """
+    Returns a game of random moves from the starting position, with the
+    binary records of its positions before every move.
+    """
+    rng = random.Random(seed)
+    board = Board(8)
+    main.initialize(board)
+    turn = 'black'
+    (moves, positions) = ([], [])
+    for ply in range(plies):
+        actions = movegen.get_actions(board, turn)[0]
+        if not actions:
+            break
+        move = rng.choice(actions)
+        positions.append(notation.encode(board, turn))
+        moves.append(pdn.write_move(move))
+        board.make_move(move)
+        turn = 'white' if turn == 'black' else 'black'
+    return (pdn.Game({'Event': 'Random ' + str(seed)}, moves, '1/2-1/2'), \
+            positions)
+
+class ReadTest(unittest.TestCase):
+
+    def test_sample(self):
+        """
+        The tags, moves, comments and results are read, and the variations,
+        move numbers, NAGs and marks are skipped.
+        """
+        (first, second) = list(pdn.read_games(io.StringIO(SAMPLE)))
+        self.assertEqual(first.tags['Event'], 'Sample')
+        self.assertEqual(first.tags['Black'], 'A "B" C')
+        self.assertEqual(first.moves, ['9-14', '23-19', '10-15', '19x10', \
+                                       '6x15', '26-23', '15-19', '23x16'])
+        self.assertEqual(first.comments, {-1: 'before the first move', \
+                                          0: 'a quiet move'})
+        self.assertEqual(first.get_result(), 'black')
+        self.assertEqual(second.moves, ['23x7', '11-15'])
+        self.assertEqual(second.comments, {0: 'two ends of a double jump'})
+        self.assertIsNone(second.get_result())
+        self.assertEqual(len(list(pdn.replay(first))), 8)
+
+    def test_fen_start(self):
+        """
+        A game from a FEN tag starts from its position, with its color to
+        move, and a capture written with its two ends is found.
+        """
+        second = list(pdn.read_games(io.StringIO(SAMPLE)))[1]
+        (board, turn) = pdn.get_start(second)
+        self.assertEqual(turn, 'white')
+        self.assertEqual(notation.to_fen(board, turn), 'W:W23,29:B10,11,18')
+        items = list(pdn.replay(second))
+        self.assertEqual(len(items), 2)
+        self.assertEqual(movegen.count_captured(items[0][1]), 2)
+        self.assertEqual(pdn.write_move(items[0][1]), '23x14x7')
+        (board, turn) = notation.decode(items[1][0])
+        self.assertEqual(notation.to_fen(board, turn), 'B:W7,29:B11')
+
+    def test_illegal_move(self):
+        """
+        A game with an illegal move is skipped after the moves before it,
+        or raises ValueError when strict.
+        """
+        game = pdn.Game(moves = ['9-14', '14-18'])
+        self.assertEqual(len(list(pdn.iter_positions([game]))), 1)
+        with self.assertRaises(ValueError):
+            list(pdn.iter_positions([game], strict = True))
+
+class WriteTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        """
+        A written game reads back to the same tags, moves, comments and
+        result, and replays through the same positions.
+        """
+        games = [play_random(seed) for seed in range(5)]
+        out = io.StringIO()
+        for (game, positions) in games:
+            comments = {i: 'note {:d}'.format(i) \
+                            for i in range(0, len(game.moves), 7)}
+            pdn.write_game(out, game, comments, width = 40)
+        for line in out.getvalue().splitlines():
+            self.assertLessEqual(len(line), 40)
+        read = list(pdn.read_games(io.StringIO(out.getvalue())))
+        self.assertEqual(len(read), len(games))
+        for (game, (original, positions)) in zip(read, games):
+            self.assertEqual(game.tags['Event'], original.tags['Event'])
+            self.assertEqual(game.moves, original.moves)
+            self.assertEqual(game.get_result(), 'draw')
+            self.assertEqual(sorted(game.comments), \
+                             list(range(0, len(game.moves), 7)))
+            self.assertEqual([item[0] for item in pdn.replay(game)], \
+                             positions)
+
+    def test_fen_round_trip(self):
+        """
+        A game from a position with white to move is written with "1..."
+        and reads back the same.
+        """
+        second = list(pdn.read_games(io.StringIO(SAMPLE)))[1]
+        out = io.StringIO()
+        pdn.write_game(out, second)
+        self.assertIn('1... 23x7', out.getvalue())
+        game = next(pdn.read_games(io.StringIO(out.getvalue())))
+        self.assertEqual(game.tags['FEN'], second.tags['FEN'])
+        self.assertEqual(game.moves, second.moves)
+        self.assertEqual(game.comments, second.comments)
+
+    def test_gzip(self):
+        """
+        A gzipped file is read like a plain one.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'games.pdn.gz')
+            with gzip.open(path, 'wt', encoding = 'utf-8') as f:
+                f.write(SAMPLE)
+            with pdn.open_pdn(path) as f:
+                games = list(pdn.read_games(f))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([len(game.moves) for game in games], [8, 2])
+
+    def test_annotate(self):
+        """
+        Every move gets the comment of the given function, which sees the
+        position before the move.
+        """
+        (game, positions) = play_random(7, 20)
+        seen = []
+
+        def comment(board, turn, move):
+            seen.append(notation.encode(board, turn))
+            return pdn.write_move(move)
+
+        annotated = next(pdn.annotate([game], comment))
+        self.assertEqual(seen, positions)
+        self.assertEqual([annotated.comments[i] \
+                              for i in range(len(game.moves))], game.moves)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import io
+import json
+import unittest
+import main
+import gameai
+import movegen
+import searchstats
+import transposition
+from checkers import Board
+"""
+This file tests the statistics of the searches of gameai. Run "python -m
+pytest" or "python -m unittest" from the directory of the project.
+"""
+
+def search(maxdepth = 3, **kwargs):
+    """
+    Searches the position after the first move of black, and returns the
+    tuple (move, score, stats).
+    """
+    board = Board(8)
+    main.initialize(board)
+    board.make_move(movegen.get_actions(board, 'black')[0][0])
+    stats = searchstats.SearchStats(**kwargs)
+    (move, score) = gameai.iterative_deepening((board, 'white', 0), \
+                        maxdepth = maxdepth, \
+                        table = transposition.TranspositionTable(), \
+                        stats = stats)
+    return (move, score, stats)
+
+class SearchStatsTest(unittest.TestCase):
+
+    def test_depths(self):
+        """
+        Every completed depth is recorded and given to the callback, and
+        the nodes of the depths add up to the nodes of the search.
+        """
+        records = []
+        (move, score, stats) = search(callback = lambda s, r: \
+                                                     records.append(r))
+        self.assertEqual([r['depth'] for r in stats.depths], [1, 2, 3])
+        self.assertEqual(records, stats.depths)
+        self.assertEqual(sum(r['nodes'] for r in stats.depths), stats.nodes)
+        self.assertEqual((stats.move, stats.score), (move, score))
+        self.assertEqual(stats.depths[-1]['move'], move)
+        self.assertEqual(stats.pv[0], move)
+        self.assertGreaterEqual(stats.seldepth, 3)
+        self.assertGreater(stats.evaluations, 0)
+        self.assertGreater(stats.table_probes, 0)
+        self.assertTrue(stats.cutoffs)
+        self.assertEqual(stats.timers, {})
+
+    def test_profile(self):
+        """
+        A profiled search times the move generation, the evaluation and
+        the transitions.
+        """
+        stats = search(profile = True)[2]
+        self.assertEqual(set(stats.timers), set([searchstats.MOVEGEN, \
+                                                 searchstats.EVALUATE, \
+                                                 searchstats.TRANSITION]))
+        for (calls, seconds) in stats.timers.values():
+            self.assertGreater(calls, 0)
+            self.assertGreaterEqual(seconds, 0.0)
+
+    def test_json(self):
+        """
+        The statistics are written as one JSON line, with the moves in
+        string positions if the board length is given, and packed moves
+        otherwise.
+        """
+        (move, score, stats) = search()
+        self.assertEqual(stats.as_dict()['move'], move)
+        out = io.StringIO()
+        stats.write(out, 8, turn = 'white')
+        text = out.getvalue()
+        self.assertTrue(text.endswith('\n'))
+        self.assertEqual(text.count('\n'), 1)
+        data = json.loads(text)
+        self.assertEqual(data['turn'], 'white')
+        self.assertEqual(data['move'], list(movegen.to_notation(move, 8)))
+        self.assertEqual(data['pv'][0], data['move'])
+        self.assertEqual(data['nodes'], stats.nodes)
+        self.assertEqual(data['cutoffs'], {str(ply): n for (ply, n) \
+                                               in stats.cutoffs.items()})
+
+    def test_counters(self):
+        """
+        The cutoffs are counted by ply, and the timers add up their calls
+        and their time, also through a timed iterator.
+        """
+        stats = searchstats.SearchStats()
+        for ply in (1, 2, 2):
+            stats.cutoff(ply)
+        self.assertEqual(stats.cutoffs, {1: 1, 2: 2})
+        stats.add_time('part', 0.5)
+        stats.add_time('part', 0.25, 2)
+        self.assertEqual(stats.timers['part'], [3, 0.75])
+        self.assertEqual(list(stats.timed('moves', iter([4, 5]))), [4, 5])
+        # the last call finds the end of the iterator
+        self.assertEqual(stats.timers['moves'][0], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import asyncio
+import unittest
+import main
+import server
+"""
+This file tests the game server: its line protocol and the bounded queue
+of the searches of the engine. Run "python -m pytest" or "python -m
+unittest" from the directory of the project.
+"""
+
+class QueueTest(unittest.TestCase):
+
+    def test_more_searches_than_workers(self):
+        """
+        The searches waiting in the queue get their whole time budget once
+        a worker is free, and the search beyond the queue is refused.
+        """
+        async def run():
+            game_server = server.GameServer(workers = 1, queue = 2, \
+                                            seconds = 0.3, grace = 0.2)
+            try:
+                await game_server.start()
+                return await asyncio.gather(*[game_server.execute(None, \
+                                                  'new white') \
+                                              for i in range(4)], \
+                                            return_exceptions = True)
+            finally:
+                game_server.shutdown()
+
+        results = asyncio.run(run())
+        for result in results[:3]:
+            (session, answer) = result
+            self.assertTrue(answer['ok'])
+            self.assertEqual(len(answer['reply']), 2)
+        self.assertIsInstance(results[3], RuntimeError)
+        self.assertTrue(str(results[3]).startswith('busy'))
+
+class ProtocolTest(unittest.TestCase):
+
+    def talk(self, lines):
+        """
+        Sends the given command lines to a server over TCP, one at a time,
+        and returns the answers as dictionaries.
+        """
+        async def run():
+            game_server = server.GameServer(workers = 1, seconds = 0.05)
+            await game_server.start()
+            listener = await asyncio.start_server(game_server.handle, \
+                                                  '127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                (reader, writer) = await asyncio.open_connection( \
+                                       '127.0.0.1', port)
+                answers = []
+                for line in lines:
+                    writer.write((line + '\n').encode('utf-8'))
+                    await writer.drain()
+                    answers.append(json.loads(await reader.readline()))
+                # the server ends the connection once the client is done
+                writer.write_eof()
+                self.assertEqual(await reader.read(), b'')
+                writer.close()
+                return answers
+            finally:
+                listener.close()
+                await listener.wait_closed()
+                game_server.shutdown()
+
+        return asyncio.run(run())
+
+    def test_game(self):
+        """
+        A client starts a game, asks for the hints and plays them, and the
+        engine replies in the same answer.
+        """
+        answers = self.talk(['hints', 'new black', 'board', 'hints', \
+                             'apply 1', 'hints', 'status', 'pass', 'board'])
+        (before, new, board, hints, applied, again, status, passed, \
+         after) = answers
+        self.assertFalse(before['ok'])
+        self.assertTrue(new['ok'])
+        self.assertEqual(new['color'], 'black')
+        self.assertNotIn('reply', new)
+        self.assertEqual(board['turn'], 'black')
+        self.assertEqual(len(hints['moves']), 7)
+        self.assertEqual(hints['captures'], [])
+        self.assertEqual(applied['played'], hints['moves'][0])
+        self.assertEqual(len(applied['reply']), 2)
+        self.assertTrue(again['moves'] or again['captures'])
+        self.assertEqual(status['games'], 1)
+        self.assertEqual(status['searching'], 0)
+        self.assertEqual(passed['result'], 'white')
+        self.assertFalse(after['ok'])
+
+    def test_engine_first(self):
+        """
+        The engine plays first when the client plays white, and a simple
+        move of the hints is played with "move".
+        """
+        (new, hints) = self.talk(['new white', 'hints'])
+        self.assertEqual(len(new['reply']), 2)
+        (moves, captures) = (hints['moves'], hints['captures'])
+        command = 'jump ' + ' '.join(captures[0]) if captures \
+                      else 'move ' + ' '.join(moves[0])
+        (new, hints, played) = self.talk(['new white', 'hints', command])
+        self.assertTrue(played['ok'])
+        self.assertEqual(played['played'], command.split()[1:])
+        self.assertIn('reply', played)
+
+    def test_errors(self):
+        """
+        The invalid commands are refused with the errors of the command
+        line game, and the game goes on.
+        """
+        answers = self.talk(['new black 7', 'new red', 'new black 6', \
+                             'move a1 a2', 'jump a1 c3 e5', 'apply 99', \
+                             'budget nan', 'budget 100', 'fly', 'board'])
+        self.assertEqual([answer['ok'] for answer in answers], \
+                         [False, False, True, False, False, False, False, \
+                          True, False, True])
+        self.assertEqual(answers[3]['error'], main.move_error)
+        self.assertEqual(answers[4]['error'], main.jump_error)
+        self.assertEqual(answers[5]['error'], main.hint_error)
+        self.assertEqual(answers[7]['seconds'], 10.0)
+        self.assertEqual(answers[8]['error'], main.cmd_error)
+        self.assertEqual(answers[9]['turn'], 'black')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+import main
+import gameai
+import movegen
+import notation
+import evaluation
+import tablebase
+"""
+This file tests the endgame tablebase and its use by the tree search of
+gameai. Run "python -m pytest" or "python -m unittest" from the directory
+of the project.
+"""
+
+class TablebaseSearchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Builds the tablebase of the positions with up to 2 pieces.
+        """
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, 'endgame.tb')
+        tablebase.build(path, 2)
+        cls.tablebase = tablebase.Tablebase(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebase.close()
+        shutil.rmtree(cls.directory)
+
+    def test_draw_score(self):
+        """
+        A draw scores like a balanced position with the same material.
+        """
+        (board, turn) = notation.from_fen('B:WK14:BK23')
+        self.assertEqual(self.tablebase.probe(board, turn)[0], \
+                         tablebase.DRAW)
+        self.assertEqual(self.tablebase.score(board, turn, 'black'), \
+                         evaluation.balanced('black', 0, 0, 1, 1))
+
+    def test_draw_over_worse_line(self):
+        """
+        The black king either takes two pieces, leaving a drawn king
+        against king, or takes one, leaving a king against two pieces,
+        which the heuristics score below a draw but above 0.
+        """
+        (board, turn) = notation.from_fen('B:WK8,K16,23:BK12')
+        context = gameai.SearchContext(tablebase = self.tablebase)
+        (move, score) = gameai.alphabeta_search((board, turn, 0), 2, \
+                                                context = context)
+        self.assertEqual(list(movegen.to_notation(move, 8)), \
+                         ['c8', 'e6', 'g4'])
+        self.assertEqual(score, evaluation.balanced('black', 0, 0, 1, 1))
+        # the line of the single capture, searched without the tablebase
+        single = [a for a in movegen.get_actions(board, turn)[0] \
+                      if movegen.count_captured(a) == 1][0]
+        undo = board.make_move(single)
+        worse = gameai.minvalue((board, 'white', 1), 2)
+        board.unmake_move(undo)
+        self.assertTrue(0 < worse < score)
+
+    def test_win_score_counts_ply(self):
+        """
+        A win scores less, and a loss more, the deeper the search finds it.
+        """
+        (board, turn) = notation.from_fen('B:W30:B25')
+        (result, distance) = self.tablebase.probe(board, turn)
+        self.assertEqual(result, tablebase.WIN)
+        near = self.tablebase.score(board, turn, 'black', 1)
+        far = self.tablebase.score(board, turn, 'black', 5)
+        self.assertEqual(near, tablebase.WIN_SCORE - (1 + distance))
+        self.assertLess(far, near)
+        self.assertEqual(self.tablebase.score(board, turn, 'white', 5), -far)
+
+    def test_converts_win(self):
+        """
+        The engine plays both sides of a won position and the winner wins in
+        as many plies as the tablebase counts.
+        """
+        for fen in ('B:W30:B25', 'B:WK4:BK13'):
+            (board, turn) = notation.from_fen(fen)
+            distance = self.tablebase.probe(board, turn)[1]
+            plies = 0
+            while not main.is_game_finished(board) and plies < 2 * distance:
+                (move, score) = gameai.iterative_deepening((board, turn, 0), \
+                                    maxdepth = 4, tablebase = self.tablebase)
+                board.make_move(move)
+                turn = 'white' if turn == 'black' else 'black'
+                plies += 1
+            self.assertEqual(main.get_winner(board), 'black')
+            self.assertEqual(plies, distance)
+
+if __name__ == '__main__':
+    unittest.main()
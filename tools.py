@@ -1,5 +1,6 @@
 import copy
 import main
+import checkers
 """
 This file contains some basic functions for the checkers game implementation.
 The functions are:
@@ -7,10 +8,60 @@ The functions are:
     b. get_jumps()
     c. get_captures()
     d. search_path()
-    e. choose_color()
+    e. iter_captures()
+    f. choose_color()
 This file also contains two string constants to be used in the main() function.
+The diagonal neighbors of every square are computed once per board length,
+see get_tables().
 """
 
+# The kinds of pieces the neighbor tables are split by.
+BLACK_PAWN, WHITE_PAWN, KING = 0, 1, 2
+
+_tables = {}
+
+def get_tables(length):
+    """
+    Returns the (cached) neighbor tables of a board of the given length, as a
+    tuple (steps, jumps). For the square (row, col) and a kind of piece (see
+    above), steps[row * length + col][kind] is the list of the squares the
+    piece may move to, as (row, col, position) tuples where position is the
+    string position like 'c3', and jumps[row * length + col][kind] is the
+    list of its jumps as (row_mid, col_mid, row, col, position) tuples. A
+    black pawn goes to the bottom diagonals, a white pawn to the top ones
+    and a king to all four, always in the order bottom-left, bottom-right,
+    top-left, top-right. The squares outside of the board are left out.
+    """
+    tables = _tables.get(length)
+    if tables is None:
+        down, up = [(+1, -1), (+1, +1)], [(-1, -1), (-1, +1)]
+        kinds = (down, up, down + up)
+        steps, jumps = [], []
+        for row in range(length):
+            for col in range(length):
+                steps.append([[(row + x, col + y, \
+                                main.deindexify(row + x, col + y)) \
+                               for (x, y) in dirs \
+                               if (0 <= (row + x) < length) \
+                                   and (0 <= (col + y) < length)] \
+                              for dirs in kinds])
+                jumps.append([[(row + x, col + y, row + 2 * x, col + 2 * y, \
+                                main.deindexify(row + 2 * x, col + 2 * y)) \
+                               for (x, y) in dirs \
+                               if (0 <= (row + 2 * x) < length) \
+                                   and (0 <= (col + 2 * y) < length)] \
+                              for dirs in kinds])
+        tables = (steps, jumps)
+        _tables[length] = tables
+    return tables
+
+def piece_kind(piece):
+    """
+    Returns the kind of a piece for the neighbor tables.
+    """
+    return KING if piece.is_king() else \
+                (BLACK_PAWN if piece.is_black() else WHITE_PAWN)
+
 def get_moves(board, row, col, is_sorted = False):
     """
     This function returns moves for a given single piece at row,col position.
@@ -30,22 +81,13 @@ def get_moves(board, row, col, is_sorted = False):
             the final returning list must be sorted. Remember that the list
             is a list of string positions.
     """
-    down, up = [(+1, -1), (+1, +1)], [(-1, -1), (-1, +1)]
     length = board.get_length()
     piece = board.get(row, col)
     if piece:
-        bottom = [main.deindexify(row + x, col + y) for (x, y) in down \
-                      if (0 <= (row + x) < length) \
-                          and (0 <= (col + y) < length) \
-                          and board.is_free(row + x, col + y)]
-        top = [main.deindexify(row + x, col + y) for (x, y) in up \
-                   if (0 <= (row + x) < length) \
-                       and (0 <= (col + y) < length) \
-                       and board.is_free(row + x, col + y)]
-        return (sorted(bottom + top) if piece.is_king() else \
-                (sorted(bottom) if piece.is_black() else sorted(top))) \
-                    if is_sorted else (bottom + top if piece.is_king() else \
-                                       (bottom if piece.is_black() else top))
+        steps = get_tables(length)[0][row * length + col][piece_kind(piece)]
+        moves = [position for (r, c, position) in steps \
+                     if board.is_free(r, c)]
+        return sorted(moves) if is_sorted else moves
     return []
 
 def get_jumps(board, row, col, is_sorted = False):
@@ -72,28 +114,16 @@ def get_jumps(board, row, col, is_sorted = False):
             the final returning list must be sorted. Remember that the list
             is a list of string positions.
     """
-    down, up = [(+1, -1), (+1, +1)], [(-1, -1), (-1, +1)]
     length = board.get_length()
     piece = board.get(row, col)
     if piece:
-        bottom = \
-            [main.deindexify(row + 2 * x, col + 2 * y) for (x, y) in down \
-             if (0 <= (row + 2 * x) < length) \
-                 and (0 <= (col + 2 * y) < length) \
-                 and board.is_free(row + 2 * x, col + 2 * y) \
-                 and (not board.is_free(row + x, col + y)) \
-                 and (board.get(row + x, col + y).color() != piece.color())]
-        top = \
-            [main.deindexify(row + 2 * x, col + 2 * y) for (x, y) in up \
-             if (0 <= (row + 2 * x) < length) \
-                 and (0 <= (col + 2 * y) < length) \
-                 and board.is_free(row + 2 * x, col + 2 * y) \
-                 and (not board.is_free(row + x, col + y)) \
-                 and (board.get(row + x, col + y).color() != piece.color())]
-        return (sorted(bottom + top) if piece.is_king() else \
-                (sorted(bottom) if piece.is_black() else sorted(top))) \
-                    if is_sorted else (bottom + top if piece.is_king() else \
-                                       (bottom if piece.is_black() else top))
+        own = piece.code() & 1  # the codes of a color have the same parity
+        jumps = get_tables(length)[1][row * length + col][piece_kind(piece)]
+        captures = [position for (r_mid, c_mid, r, c, position) in jumps \
+                        if board.is_free(r, c) \
+                            and (not board.is_free(r_mid, c_mid)) \
+                            and (board.get_code(r_mid, c_mid) & 1) != own]
+        return sorted(captures) if is_sorted else captures
     return []
 
 def search_path(board, row, col, path, paths, is_sorted = False):
@@ -106,17 +136,21 @@ def search_path(board, row, col, path, paths, is_sorted = False):
     if not jumps:
         paths.append(path)
     else:
+        # the pieces are immutable, a promotion while searching places the
+        # king instead, and the original piece is placed back once a path is
+        # explored
+        original = board.get(row, col)
         for position in jumps:
             (row_to, col_to) = main.indexify(position)
-            piece = copy.copy(board.get(row, col))
-            board.remove(row, col)
-            board.place(row_to, col_to, piece)
-            if (piece.color() == 'black' \
+            piece = original
+            if (piece.is_black() \
                 and row_to == board.get_length() - 1) \
-                    or (piece.color() == 'white' \
+                    or (piece.is_white() \
                         and row_to == 0) \
                             and (not piece.is_king()):
-                                piece.turn_king()
+                                piece = piece.as_king()
+            board.remove(row, col)
+            board.place(row_to, col_to, piece)
             row_mid = row + 1 if row_to > row else row - 1
             col_mid = col + 1 if col_to > col else col - 1
             capture = board.get(row_mid, col_mid)
@@ -124,20 +158,80 @@ def search_path(board, row, col, path, paths, is_sorted = False):
             search_path(board, row_to, col_to, copy.copy(path), paths)
             board.place(row_mid, col_mid, capture)
             board.remove(row_to, col_to)
-            board.place(row, col, piece)
+            board.place(row, col, original)
             
+def iter_captures(board, row, col, is_sorted = False):
+    """
+    This function yields the capturing paths started at a certain row/col
+    position one by one, in the same order as search_path() finds them, as
+    tuples (end, captured, crowned, trail): the square (row * length + col)
+    the piece ends on, the bit mask of the squares of the captured pieces,
+    True if a pawn is crowned on the way, and the trail of the path to give
+    to get_trail(). Nothing is yielded if the piece has no jump.
+    
+    The search runs on the occupancy masks of the board with a stack, the
+    board is never changed: the jumped pieces are kept in the captured mask,
+    the square the piece left counts as free, and a pawn landing on its
+    king row goes on as a king. The trail is a chain of (square, previous)
+    pairs shared by the paths, only get_trail() builds the full path.
+    """
+    length = board.get_length()
+    code = board.get_code(row, col)
+    if code == checkers.EMPTY:
+        return
+    jumps = get_tables(length)[1]
+    is_black = code & 1
+    pawn = BLACK_PAWN if is_black else WHITE_PAWN
+    last = length - 1 if is_black else 0
+    opponent = board.get_squares('white' if is_black else 'black')
+    occupied = board.get_squares()
+    origin = row * length + col
+    occupied &= ~(1 << origin)
+    stack = [(origin, code >= checkers.BLACK_KING, 0, False, (origin, None), \
+              True)]
+    while stack:
+        (square, is_king, captured, crowned, trail, first) = stack.pop()
+        found = []
+        for (r_mid, c_mid, r, c, position) in \
+                jumps[square][KING if is_king else pawn]:
+            mid = 1 << (r_mid * length + c_mid)
+            land = r * length + c
+            if (opponent & ~captured) & mid \
+                    and not (occupied & ~captured) & (1 << land):
+                found.append((position, land, mid, r))
+        if not found:
+            if captured:
+                yield (square, captured, crowned, trail)
+            continue
+        if first and is_sorted:
+            found.sort()
+        for (position, land, mid, r) in reversed(found):
+            crown = not is_king and r == last
+            stack.append((land, is_king or crown, captured | mid, \
+                          crowned or crown, (land, trail), False))
+
+def get_trail(trail):
+    """
+    Returns the squares of a trail from iter_captures() as a tuple, from the
+    first square to the last one.
+    """
+    path = []
+    while trail is not None:
+        (square, trail) = trail
+        path.append(square)
+    return tuple(reversed(path))
+
 def get_captures(board, row, col, is_sorted = False):
     """
     This function finds all capturing paths started at a certain row/col
-    position on the board. If there is no capture from the given row/col,
-    this function will return an empty list [].
-    """
-    paths = []
-    board_ = copy.copy(board)
-    search_path(board_, row, col, [], paths, is_sorted)
-    if len(paths) == 1 and len(paths[0]) == 1:
-        paths = []
-    return paths
+    position on the board, see iter_captures(). If there is no capture from
+    the given row/col, this function will return an empty list [].
+    """
+    length = board.get_length()
+    return [[main.deindexify(square // length, square % length) \
+                 for square in get_trail(trail)] \
+                for (end, captured, crowned, trail) in \
+                    iter_captures(board, row, col, is_sorted)]
 
 def choose_color():
     """
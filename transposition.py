@@ -0,0 +1,148 @@
+import random
+"""
+This file implements Zobrist hashing of a (board, turn) position and a
+fixed-size transposition table for the tree search in gameai.
+
+A Zobrist key is the XOR of one random 64-bit number per (square, piece)
+pair on the board, and one more random number if white is to move. Making
+a move only changes a few squares, so the key of the next position is
+computed from the key of the current one and the undo token of the move.
+The random numbers come from a fixed seed, so the keys of a position are
+the same from one run (or one process) to another.
+"""
+
+# The bound types of a transposition table entry.
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# The default memory cap of a transposition table, in bytes.
+DEFAULT_MEMORY = 32 * 1024 * 1024
+
+_keys = {}
+
+def get_keys(length):
+    """
+    Returns the (cached) Zobrist keys for a board of the given length as a
+    tuple (squares, turn) where squares[row * length + col][kind] is the key
+    of a piece of that kind on that square, see piece_kind().
+    """
+    keys = _keys.get(length)
+    if keys is None:
+        rng = random.Random(0x636865636b657273 + length)
+        squares = [[rng.getrandbits(64) for kind in range(4)] \
+                        for square in range(length * length)]
+        keys = (squares, rng.getrandbits(64))
+        _keys[length] = keys
+    return keys
+
+def piece_kind(is_black, is_king):
+    """
+    Returns the kind of a piece: 0 and 1 for black and white pawns, 2 and 3
+    for black and white kings.
+    """
+    return (0 if is_black else 1) + (2 if is_king else 0)
+
+def hash_board(board, turn):
+    """
+    Computes the Zobrist key of a board with the given color to move.
+    """
+    length = board.get_length()
+    (squares, white_key) = get_keys(length)
+    key = white_key if turn == 'white' else 0
+    for (row, col, piece) in board.get_pieces():
+        key ^= squares[row * length + col]\
+                [piece_kind(piece.is_black(), piece.is_king())]
+    return key
+
+def update_hash(key, board, undo):
+    """
+    Returns the Zobrist key after the move described by the given undo token
+    (see checkers.Board.make_move) was made from the position with the given
+    key. The side to move changes as well.
+    """
+    length = board.get_length()
+    (squares, white_key) = get_keys(length)
+    (frm, to, piece, promoted, captured) = undo
+    is_black = piece.is_black()
+    was_king = piece.is_king() and not promoted
+    key ^= squares[frm[0] * length + frm[1]][piece_kind(is_black, was_king)]
+    key ^= squares[to[0] * length + to[1]] \
+                [piece_kind(is_black, was_king or promoted)]
+    for (row, col, capture) in captured:
+        key ^= squares[row * length + col] \
+                [piece_kind(capture.is_black(), capture.is_king())]
+    return key ^ white_key
+
+class TranspositionTable(object):
+    """
+    This class encapsulates a fixed-size transposition table. Every entry is
+    a tuple (key, depth, bound, score, move, age) where depth is the remaining
+    search depth below the position, bound tells if the score is EXACT, a
+    LOWER bound or an UPPER bound, and move is the best move found.
+
+    The number of slots is the largest power of two which fits in the given
+    memory cap. A position goes to the slot given by the low bits of its key.
+    When two positions collide, the replacement policy decides:
+        a. 'always': the new entry always replaces the old one.
+        b. 'depth': the new entry replaces the old one only if it is searched
+            at least as deep, or the old one is left from an older search.
+    """
+
+    # estimated size of one entry in bytes (the tuple, the key and the score)
+    ENTRY_SIZE = 192
+
+    def __init__(self, memory = DEFAULT_MEMORY, policy = 'depth'):
+        """
+        Allocates the slots for the given memory cap in bytes.
+        """
+        if policy not in ('always', 'depth'):
+            raise ValueError("The replacement policy must be \'always\'" \
+                             + " or \'depth\'.")
+        slots = 1
+        while slots * 2 * self.ENTRY_SIZE <= memory:
+            slots *= 2
+        self._entries = [None] * slots
+        self._mask = slots - 1
+        self._policy = policy
+        self._age = 0
+        self.probes, self.hits, self.stores = 0, 0, 0
+
+    def __len__(self):
+        """
+        Returns the number of slots.
+        """
+        return len(self._entries)
+
+    def new_search(self):
+        """
+        Marks the start of a new search, the entries of the older searches
+        are then replaced first.
+        """
+        self._age += 1
+
+    def clear(self):
+        """
+        Empties all the slots.
+        """
+        self._entries = [None] * len(self._entries)
+
+    def probe(self, key):
+        """
+        Returns the entry stored for the given key, or None.
+        """
+        self.probes += 1
+        entry = self._entries[key & self._mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """
+        Stores a search result following the replacement policy.
+        """
+        index = key & self._mask
+        old = self._entries[index]
+        if self._policy == 'always' or old is None or old[0] == key \
+                or depth >= old[1] or old[5] != self._age:
+            self._entries[index] = (key, depth, bound, score, move, self._age)
+            self.stores += 1